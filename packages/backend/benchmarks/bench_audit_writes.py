@@ -0,0 +1,75 @@
+"""
+Throughput of MPM upserts into audit.db: a fresh connection and commit per
+row (old mpm_db behaviour), the pooled writer with one transaction per row,
+and the write-behind buffer that stores rows in one executemany transaction
+per flush. Rows/s counts until every row is
+committed; keys repeat, so the buffer also coalesces rewrites of a policy.
+
+    python -m packages.backend.benchmarks.bench_audit_writes --rows 20000 --policies 2000
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+os.environ.setdefault("NEXGUARD_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="nexguard-bench-"), "audit.db"))
+
+from packages.backend.src.storage import AUDIT_DB_PATH, audit as pool
+from packages.backend.src.mpm_db import MPM_COLUMNS
+
+def rows(count: int, policies: int):
+    rng = random.Random(7)
+    for i in range(count):
+        yield (f"{rng.randrange(policies):056d}", "TKN", 5, rng.random() * 100, "neutral", 10, f"t{i}", "[]")
+
+SQL = f"INSERT OR REPLACE INTO mpm_metrics ({', '.join(MPM_COLUMNS)}) VALUES ({', '.join('?' * len(MPM_COLUMNS))})"
+
+def legacy(data) -> int:
+    for row in data:
+        conn = sqlite3.connect(AUDIT_DB_PATH)
+        conn.execute(SQL, row)
+        conn.commit()
+        conn.close()
+    return len(data)
+
+def per_row(data) -> int:
+    for row in data:
+        with pool.writer() as conn:
+            conn.execute(SQL, row)
+    return len(data)
+
+def buffered(data, interval: float, batch_size: int) -> int:
+    buffer = pool.write_behind("mpm_metrics", MPM_COLUMNS, ("policy_id",), batch_size, interval)
+    for row in data:
+        buffer.put(row)
+    buffer.close()
+    return buffer.flushes
+
+def main(count: int, policies: int, batch_size: int, interval_ms: int):
+    pool.migrate()
+    data = list(rows(count, policies))
+    print(f"{'mode':>13} {'rows/s':>9} {'commits':>8}")
+    for mode in ("legacy", "per-row", "write-behind"):
+        with pool.writer() as conn:
+            conn.execute("DELETE FROM mpm_metrics")
+        start = time.perf_counter()
+        if mode == "legacy":
+            commits = legacy(data)
+        elif mode == "per-row":
+            commits = per_row(data)
+        else:
+            commits = buffered(data, interval_ms / 1000, batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>13} {count / elapsed:>9.0f} {commits:>8}")
+    pool.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--policies", type=int, default=2000, help="distinct policy ids the rows are spread over")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--interval-ms", type=int, default=200)
+    args = parser.parse_args()
+    main(args.rows, args.policies, args.batch_size, args.interval_ms)
@@ -0,0 +1,61 @@
+"""
+Requests/sec for xray_engine.fetch_blockfrost: one client per call (old behaviour)
+vs the shared pooled client.
+
+    python -m packages.backend.benchmarks.bench_blockfrost_client --requests 2000 --concurrency 50
+"""
+import time
+import asyncio
+import logging
+import argparse
+from unittest.mock import patch
+
+import httpx
+
+from packages.backend.src import xray_engine, blockfrost_client
+from packages.backend.benchmarks.stub_blockfrost import running_stub
+
+POLICY = "a" * 56
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+async def fetch_unpooled(base_url: str, endpoint: str):
+    # Mirrors the previous implementation: a fresh client (and connection) per call
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{base_url}{endpoint}", headers={"project_id": "bench"})
+        return response.json()
+
+async def run(fetch, total: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await fetch(f"/scripts/{POLICY}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start)
+
+async def main(total: int, concurrency: int, latency_ms: float):
+    with running_stub(latency_ms=latency_ms) as base_url:
+        with patch.object(xray_engine, "BLOCKFROST_URL", base_url), \
+             patch.object(xray_engine, "BLOCKFROST_PROJECT_ID", "bench"):
+            before = await run(lambda ep: fetch_unpooled(base_url, ep), total, concurrency)
+
+            await blockfrost_client.start_client()
+            try:
+                after = await run(xray_engine.fetch_blockfrost, total, concurrency)
+            finally:
+                await blockfrost_client.close_client()
+
+    print(f"requests={total} concurrency={concurrency} latency={latency_ms}ms")
+    print(f"  per-call client : {before:8.1f} req/s")
+    print(f"  pooled client   : {after:8.1f} req/s  ({after / before:.2f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.latency_ms))
@@ -0,0 +1,74 @@
+"""
+Stored size and decode time of a cached bundle: the old path (`result.json()`
+TEXT, then json.loads + BundleAnalysisResult(**data) validation on read)
+against the binary encoding in src/bundle_codec.py (interned addresses,
+index-pair links, zlib, no validation on read), both for the decode alone and
+for a full read of the row from SQLite. No network or stub needed.
+
+    python -m packages.backend.benchmarks.bench_bundle_codec --sizes 20,1000,10000
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+
+os.environ.setdefault("BUNDLE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="nexguard-bench-"), "bundles.db"))
+
+from packages.backend.src import bundle_codec
+from packages.backend.src.bundle_db_sqlite import pool, fetch_bundle, UPSERT_PAYLOAD_SQL
+from packages.backend.src.insider_engine import _score_graph
+from packages.backend.src.models import BundleAnalysisResult
+
+BECH32 = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+def address(rng: random.Random) -> str:
+    # Shelley base addresses are 103 characters
+    return "addr1" + "".join(rng.choice(BECH32) for _ in range(98))
+
+def generated(holders: int, seed: int = 7) -> BundleAnalysisResult:
+    rng = random.Random(seed)
+    addresses = [address(rng) for _ in range(holders)]
+    pool = [address(rng) for _ in range(max(1, holders // 25))]
+    funders = [None if rng.random() < 0.1 else rng.choice(pool) for _ in range(holders)]
+    quantities = [float(10_000_000 // (i + 1)) for i in range(holders)]
+    result = BundleAnalysisResult(policy_id="ab" * 28, nodes=[], links=[])
+    _score_graph(result, addresses, funders, quantities=quantities)
+    return result
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def store(policy_id: str, payload, result: BundleAnalysisResult) -> None:
+    with pool.writer() as conn:
+        conn.execute(UPSERT_PAYLOAD_SQL, (policy_id, payload, result.timestamp.isoformat()))
+
+def main(sizes, repeat: int):
+    print(f"{'holders':>8} {'nodes':>6} {'json size':>10} {'binary size':>12} {'json decode':>12} {'binary decode':>14} "
+          f"{'json read':>10} {'binary read':>12}")
+    for n in sizes:
+        result = generated(n)
+        text, blob = result.json(), bundle_codec.encode(result)
+        assert bundle_codec.decode(blob) == result
+        json_decode = best_of(lambda: BundleAnalysisResult(**json.loads(text)), repeat)
+        binary_decode = best_of(lambda: bundle_codec.decode(blob), repeat)
+        # fetch_bundle reads legacy JSON rows through the old validating path
+        store(f"json-{n}", text, result)
+        store(f"binary-{n}", blob, result)
+        json_read = best_of(lambda: fetch_bundle(f"json-{n}"), repeat)
+        binary_read = best_of(lambda: fetch_bundle(f"binary-{n}"), repeat)
+        print(f"{n:>8} {len(result.nodes):>6} {len(text):>9}B {len(blob):>11}B {json_decode:>10.2f}ms {binary_decode:>12.2f}ms "
+              f"{json_read:>8.2f}ms {binary_read:>10.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="20,1000,10000")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    main([int(s) for s in args.sizes.split(",")], args.repeat)
@@ -0,0 +1,94 @@
+"""
+10k mixed reads/writes against the bundle cache table from concurrent tasks:
+connect-per-call with default journal settings (old behaviour) vs the pooled
+WAL connection manager.
+
+    python -m packages.backend.benchmarks.bench_bundle_db --ops 10000 --tasks 32 --write-ratio 0.2
+"""
+import os
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+_scratch = tempfile.mkdtemp(prefix="nexguard-bench-")
+os.environ["BUNDLE_DB_PATH"] = os.path.join(_scratch, "pooled.db")
+
+from packages.backend.src import bundle_db_sqlite
+from packages.backend.src.models import BundleAnalysisResult, GraphNode
+
+LEGACY_PATH = os.path.join(_scratch, "legacy.db")
+TABLE = bundle_db_sqlite.BUNDLE_TABLE
+
+def legacy_connection():
+    conn = sqlite3.connect(LEGACY_PATH, check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def legacy_init():
+    conn = legacy_connection()
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (policy_id TEXT PRIMARY KEY, payload TEXT NOT NULL, timestamp TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+
+def legacy_fetch(policy_id):
+    conn = legacy_connection()
+    try:
+        row = conn.execute(f"SELECT payload FROM {TABLE} WHERE policy_id = ?", (policy_id,)).fetchone()
+        return row["payload"] if row else None
+    finally:
+        conn.close()
+
+def legacy_upsert(result):
+    conn = legacy_connection()
+    try:
+        conn.execute(f"INSERT OR REPLACE INTO {TABLE} (policy_id, payload, timestamp) VALUES (?, ?, ?)",
+                     (result.policy_id, result.json(), result.timestamp.isoformat()))
+        conn.commit()
+    finally:
+        conn.close()
+
+def make_result(i: int) -> BundleAnalysisResult:
+    nodes = [GraphNode(id=f"addr_{i}_{n}", group="victim", color="#00ff88") for n in range(20)]
+    return BundleAnalysisResult(policy_id=f"policy_{i % 500}", nodes=nodes, links=[], risk_score=i % 100)
+
+async def run(fetch, upsert, ops: int, tasks: int, write_ratio: float) -> float:
+    loop = asyncio.get_running_loop()
+    rng = random.Random(7)
+    plan = [(rng.random() < write_ratio, rng.randrange(1000)) for _ in range(ops)]
+    results = [make_result(i) for i in range(500)]
+    queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    with ThreadPoolExecutor(max_workers=tasks) as executor:
+        async def worker():
+            while not queue.empty():
+                is_write, i = queue.get_nowait()
+                if is_write:
+                    await loop.run_in_executor(executor, upsert, results[i % 500])
+                else:
+                    await loop.run_in_executor(executor, fetch, f"policy_{i % 500}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(tasks)))
+        return ops / (time.perf_counter() - start)
+
+async def main(ops: int, tasks: int, write_ratio: float):
+    legacy_init()
+    before = await run(legacy_fetch, legacy_upsert, ops, tasks, write_ratio)
+    after = await run(bundle_db_sqlite.fetch_bundle, bundle_db_sqlite.upsert_bundle, ops, tasks, write_ratio)
+    print(f"ops={ops} tasks={tasks} write_ratio={write_ratio}")
+    print(f"  connect-per-call : {before:9.1f} ops/s")
+    print(f"  pooled WAL       : {after:9.1f} ops/s  ({after / before:.2f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=10000)
+    parser.add_argument("--tasks", type=int, default=32)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(main(args.ops, args.tasks, args.write_ratio))
@@ -0,0 +1,51 @@
+"""
+Time of the cluster-risk scoring stage (components, supply shares, funder
+HHI/Gini) on generated bundles, plus the full _score_graph call for context.
+No network or stub needed.
+
+    python -m packages.backend.benchmarks.bench_cluster_scoring --sizes 20,1000,10000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+os.environ.setdefault("BUNDLE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="nexguard-bench-"), "bundles.db"))
+
+from packages.backend.src.bundle_scoring import score_clusters
+from packages.backend.src.insider_engine import _build_graph, _score_graph, MASTER_MIN_OUT_DEGREE
+from packages.backend.src.models import BundleAnalysisResult
+
+def generated(holders: int, seed: int = 7):
+    rng = random.Random(seed)
+    addresses = [f"addr_{i}" for i in range(holders)]
+    funders = [None if rng.random() < 0.1 else f"funder_{rng.randrange(max(1, holders // 25))}" for _ in range(holders)]
+    quantities = [float(10_000_000 // (i + 1)) for i in range(holders)]
+    return addresses, funders, quantities
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main(sizes, repeat: int):
+    print(f"{'holders':>8} {'scoring':>10} {'full _score_graph':>18}")
+    for n in sizes:
+        addresses, funders, quantities = generated(n)
+        G = _build_graph(addresses, funders)
+        masters = G.out_degree() >= MASTER_MIN_OUT_DEGREE
+        scoring = best_of(lambda: score_clusters(G, masters, addresses, quantities), repeat)
+        result = BundleAnalysisResult(policy_id="bench", nodes=[], links=[])
+        full = best_of(lambda: _score_graph(result, addresses, funders, quantities=quantities), repeat)
+        print(f"{n:>8} {scoring:>8.2f}ms {full:>16.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="20,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main([int(s) for s in args.sizes.split(",")], args.repeat)
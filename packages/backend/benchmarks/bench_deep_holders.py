@@ -0,0 +1,91 @@
+"""
+Wall time and peak RSS of a deep bundle analysis (paged holders streamed into
+funder tracing) at 1k and 10k holders against the local stub. Each size runs in
+its own subprocess so peak RSS isn't inherited from the previous run.
+
+    python -m packages.backend.benchmarks.bench_deep_holders --sizes 1000,10000 --latency-ms 20
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from unittest.mock import patch
+
+# Scratch DB so the permanent funder index starts empty
+os.environ["BUNDLE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="nexguard-bench-"), "bundles.db")
+
+from packages.backend.src import insider_engine, blockfrost_client
+from packages.backend.benchmarks.stub_blockfrost import running_stub
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger(insider_engine.__name__).setLevel(logging.WARNING)
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+async def one(holders: int, latency_ms: float, rps: float, burst: int, max_in_flight: int) -> dict:
+    blockfrost_client.scheduler.configure(rps, burst, max_in_flight)
+    with running_stub(latency_ms=latency_ms, holders=holders) as base_url:
+        with patch.object(insider_engine, "BLOCKFROST_BASE", base_url), \
+             patch.object(insider_engine, "BLOCKFROST_PROJECT_ID", "bench"):
+            await blockfrost_client.start_client()
+            try:
+                baseline = peak_rss_mb()
+                first_page = None
+                start = time.perf_counter()
+
+                def progress(traced: int):
+                    nonlocal first_page
+                    if first_page is None:
+                        first_page = time.perf_counter() - start
+
+                result = await insider_engine.analyze_bundle_deep(f"deep{holders}", limit=holders, progress=progress)
+                elapsed = time.perf_counter() - start
+            finally:
+                await blockfrost_client.close_client()
+    assert len(result.links) == holders, "stub should resolve every funder"
+    return {
+        "holders": holders,
+        "wall_s": elapsed,
+        "first_page_s": first_page,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - baseline,
+    }
+
+def main(sizes, latency_ms: float, rps: float, burst: int, max_in_flight: int):
+    print(f"latency={latency_ms}ms rps={rps} burst={burst} max_in_flight={max_in_flight}")
+    print(f"{'holders':>8} {'wall':>9} {'1st page':>9} {'peak RSS':>10} {'growth':>9}")
+    for n in sizes:
+        out = subprocess.run(
+            [sys.executable, "-m", "packages.backend.benchmarks.bench_deep_holders", "--one", str(n),
+             "--latency-ms", str(latency_ms), "--rps", str(rps), "--burst", str(burst),
+             "--max-in-flight", str(max_in_flight)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        row = json.loads(out.strip().splitlines()[-1])
+        print(f"{row['holders']:>8} {row['wall_s']:>8.2f}s {row['first_page_s']:>8.2f}s "
+              f"{row['peak_rss_mb']:>8.1f}MB {row['rss_growth_mb']:>7.1f}MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    # Local stub: well above Blockfrost's free-tier limits so the pipeline is what's measured
+    parser.add_argument("--rps", type=float, default=2000)
+    parser.add_argument("--burst", type=int, default=2000)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.one:
+        row = asyncio.run(one(args.one, args.latency_ms, args.rps, args.burst, args.max_in_flight))
+        print(json.dumps(row))
+    else:
+        main([int(s) for s in args.sizes.split(",")], args.latency_ms, args.rps, args.burst, args.max_in_flight)
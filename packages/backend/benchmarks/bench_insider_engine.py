@@ -0,0 +1,58 @@
+"""
+Wall time of insider_engine funder tracing for 20/100/500 holders against the
+latency-injecting stub: sequential (max_in_flight=1) vs the concurrent scheduler.
+
+    python -m packages.backend.benchmarks.bench_insider_engine --latency-ms 50
+    python -m packages.backend.benchmarks.bench_insider_engine --rps 1000 --burst 1000   # paid-plan limits
+"""
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from unittest.mock import patch
+
+# Scratch DB so the permanent funder index starts empty
+os.environ["BUNDLE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="nexguard-bench-"), "bundles.db")
+
+from packages.backend.src import insider_engine, blockfrost_client
+from packages.backend.benchmarks.stub_blockfrost import running_stub
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+async def trace(n: int, rps: float, burst: int, max_in_flight: int) -> float:
+    blockfrost_client.scheduler.configure(rps, burst, max_in_flight)
+    # Fresh addresses per run so nothing is answered by the funder index
+    addresses = [f"addr_bench_{n}_{max_in_flight}_{i}" for i in range(n)]
+    start = time.perf_counter()
+    funders = await insider_engine._trace_funders(blockfrost_client.get_client(), addresses)
+    elapsed = time.perf_counter() - start
+    assert all(funders), "stub should resolve every funder"
+    return elapsed
+
+async def main(sizes, latency_ms: float, rps: float, burst: int, max_in_flight: int):
+    with running_stub(latency_ms=latency_ms) as base_url:
+        with patch.object(insider_engine, "BLOCKFROST_BASE", base_url), \
+             patch.object(insider_engine, "BLOCKFROST_PROJECT_ID", "bench"):
+            await blockfrost_client.start_client()
+            try:
+                print(f"latency={latency_ms}ms rps={rps} burst={burst} max_in_flight={max_in_flight}")
+                print(f"{'holders':>8} {'sequential':>12} {'concurrent':>12} {'speedup':>8}")
+                for n in sizes:
+                    serial = await trace(n, rps, burst, 1)
+                    concurrent = await trace(n, rps, burst, max_in_flight)
+                    print(f"{n:>8} {serial:>11.2f}s {concurrent:>11.2f}s {serial / concurrent:>7.1f}x")
+            finally:
+                await blockfrost_client.close_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="20,100,500")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--rps", type=float, default=blockfrost_client.BLOCKFROST_RPS)
+    parser.add_argument("--burst", type=int, default=blockfrost_client.BLOCKFROST_BURST)
+    parser.add_argument("--max-in-flight", type=int, default=blockfrost_client.BLOCKFROST_MAX_IN_FLIGHT)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    asyncio.run(main(sizes, args.latency_ms, args.rps, args.burst, args.max_in_flight))
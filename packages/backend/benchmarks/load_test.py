@@ -0,0 +1,163 @@
+"""
+End-to-end load test of the FastAPI app (src/main.py) against the local
+Blockfrost stub: no real Blockfrost quota is used. Starts the stub and the app
+in subprocesses (the app is pointed at the stub through BLOCKFROST_URL /
+BLOCKFROST_BASE), drives the routes from N concurrent clients and reports
+throughput and p50/p95/p99 latency per route.
+
+    python -m packages.backend.benchmarks.load_test --concurrency 32 --duration 20
+    python -m packages.backend.benchmarks.load_test --routes xray --policies 5000 --rate-429 0.05
+    python -m packages.backend.benchmarks.load_test --target http://127.0.0.1:8000   # already running app
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from contextlib import ExitStack
+from typing import Dict, List
+
+import httpx
+
+from packages.backend.benchmarks.stub_blockfrost import running_stub, running_app
+
+# name -> (route template reported in the output, path builder)
+ROUTES = {
+    "xray": ("GET /xray/{policy_id}", lambda policy_id: f"/xray/{policy_id}"),
+    "bundle": ("GET /analyze/bundle/{policy_id}", lambda policy_id: f"/analyze/bundle/{policy_id}"),
+}
+
+def policy_ids(count: int, seed: int) -> List[str]:
+    # sha224 hex is 56 chars, the length of a Cardano policy id
+    return [hashlib.sha224(f"load-{seed}-{i}".encode()).hexdigest() for i in range(count)]
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drive(base_url: str, routes: List[str], policies: List[str], concurrency: int, duration: float, seed: int):
+    samples: Dict[str, List[float]] = {name: [] for name in routes}
+    statuses: Dict[str, Dict[str, int]] = {name: {} for name in routes}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(index: int):
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                name = rng.choice(routes)
+                path = ROUTES[name][1](rng.choice(policies))
+                start = time.perf_counter()
+                try:
+                    status = str((await client.get(path)).status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                samples[name].append((time.perf_counter() - start) * 1000)
+                statuses[name][status] = statuses[name].get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return samples, statuses, elapsed
+
+def report(samples, statuses, elapsed: float) -> List[dict]:
+    rows = []
+    for name, latencies in samples.items():
+        ordered = sorted(latencies)
+        rows.append({
+            "route": ROUTES[name][0],
+            "requests": len(ordered),
+            "rps": len(ordered) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(ordered, 0.50),
+            "p95_ms": percentile(ordered, 0.95),
+            "p99_ms": percentile(ordered, 0.99),
+            "statuses": statuses[name],
+        })
+    return rows
+
+def print_table(rows: List[dict], elapsed: float):
+    total = sum(row["requests"] for row in rows)
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+    print(f"{'route':<34} {'reqs':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}  statuses")
+    for row in rows:
+        print(f"{row['route']:<34} {row['requests']:>7} {row['rps']:>8.1f} {row['p50_ms']:>7.1f}ms "
+              f"{row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms  {row['statuses']}")
+
+def app_env(stub_url: str, args) -> Dict[str, str]:
+    scratch = tempfile.mkdtemp(prefix="nexguard-load-")
+    env = {
+        "BLOCKFROST_URL": stub_url,
+        "BLOCKFROST_BASE": stub_url,
+        "BLOCKFROST_PROJECT_ID": "load-test",
+        "BUNDLE_DB_PATH": os.path.join(scratch, "bundles.db"),
+        "NEXGUARD_DB_PATH": os.path.join(scratch, "audit.db"),
+        "WARMUP_ENABLED": "0",
+    }
+    # Blockfrost limits default to the app's own settings; raise them to load the app rather than the limiter
+    for flag, var in (("rps", "BLOCKFROST_RPS"), ("burst", "BLOCKFROST_BURST"), ("max_in_flight", "BLOCKFROST_MAX_IN_FLIGHT")):
+        value = getattr(args, flag)
+        if value is not None:
+            env[var] = str(value)
+    return env
+
+def main(args):
+    routes = [name.strip() for name in args.routes.split(",") if name.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        raise SystemExit(f"unknown routes: {', '.join(sorted(unknown))} (choose from {', '.join(ROUTES)})")
+    policies = policy_ids(args.policies, args.seed)
+
+    with ExitStack() as stack:
+        base_url = args.target
+        stub_url = None
+        if base_url is None:
+            stub_url = stack.enter_context(running_stub(
+                latency_ms=args.latency_ms, holders=args.holders, jitter_ms=args.jitter_ms,
+                error_rate=args.error_rate, rate_429=args.rate_429, retry_after=args.retry_after,
+            ))
+            base_url = stack.enter_context(running_app(
+                "packages.backend.src.main:app", app_env(stub_url, args), "/openapi.json", quiet=not args.app_logs,
+            ))
+        samples, statuses, elapsed = asyncio.run(
+            drive(base_url, routes, policies, args.concurrency, args.duration, args.seed)
+        )
+        upstream = httpx.get(f"{stub_url}/stats").json() if stub_url else None
+        resilience = httpx.get(f"{base_url}/health/blockfrost").json()
+
+    rows = report(samples, statuses, elapsed)
+    if args.json:
+        print(json.dumps({"elapsed_s": elapsed, "routes": rows, "stub": upstream, "blockfrost": resilience}, indent=2))
+        return
+    print(f"concurrency={args.concurrency} policies={args.policies} latency={args.latency_ms}ms "
+          f"jitter={args.jitter_ms}ms error_rate={args.error_rate} rate_429={args.rate_429}")
+    print_table(rows, elapsed)
+    if upstream:
+        print(f"stub: {upstream['requests']} Blockfrost requests, injected {upstream['injected']}")
+    print(f"app: concurrency limit {resilience['concurrency_limit']}, {resilience['throttled']} throttled, "
+          f"{resilience['retries']} retries, breaker {resilience['breaker_state']} (opened {resilience['breaker_opens']}x), "
+          f"{resilience['degraded_served']} degraded")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the backend against the Blockfrost stub")
+    parser.add_argument("--target", help="base URL of an already running app (skips starting stub + app)")
+    parser.add_argument("--routes", default="xray,bundle", help=f"comma-separated, from: {', '.join(ROUTES)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds")
+    parser.add_argument("--policies", type=int, default=200, help="distinct policy ids (fewer = more cache hits)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--holders", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rps", type=float, help="BLOCKFROST_RPS for the app")
+    parser.add_argument("--burst", type=int, help="BLOCKFROST_BURST for the app")
+    parser.add_argument("--max-in-flight", type=int, help="BLOCKFROST_MAX_IN_FLIGHT for the app")
+    parser.add_argument("--app-logs", action="store_true", help="show the app's log output")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    main(parser.parse_args())
@@ -0,0 +1,201 @@
+"""
+Local stub of the Blockfrost endpoints used by the Python engines.
+Responses are deterministic so benchmark runs are comparable.
+
+Run standalone (from the repo root):
+    python -m packages.backend.benchmarks.stub_blockfrost --port 9911
+
+Settings come from env vars so the stub can run in a subprocess:
+    STUB_LATENCY_MS     - added delay per request (default 0)
+    STUB_JITTER_MS      - extra uniform random delay, 0..N ms (default 0)
+    STUB_HOLDERS        - holders returned per asset (default 20)
+    STUB_ERROR_RATE     - fraction of requests answered with a 500 (default 0)
+    STUB_429_RATE       - fraction answered with 429 + Retry-After (default 0)
+    STUB_RETRY_AFTER    - Retry-After seconds sent with injected 429s (default 1)
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import random
+import hashlib
+import argparse
+import subprocess
+from contextlib import contextmanager
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+FUNDER_POOL = 16
+
+def _funder_for(address: str) -> str:
+    # Holders hash into a small pool of funders, so the graph has clusters
+    bucket = int(hashlib.sha1(address.encode()).hexdigest(), 16) % FUNDER_POOL
+    return f"addr_stub_funder_{bucket}"
+
+def create_app(
+    latency_ms: float = 0.0,
+    holders: int = 20,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    rate_429: float = 0.0,
+    retry_after: int = 1,
+    seed: int = 7,
+) -> FastAPI:
+    app = FastAPI(title="Blockfrost Stub")
+    delay = latency_ms / 1000.0
+    jitter = jitter_ms / 1000.0
+    rng = random.Random(seed)
+    app.state.requests = 0
+    app.state.injected = {"500": 0, "429": 0}
+
+    async def _latency():
+        wait = delay + (rng.uniform(0, jitter) if jitter else 0.0)
+        if wait:
+            await asyncio.sleep(wait)
+
+    @app.middleware("http")
+    async def inject_failures(request: Request, call_next):
+        if request.url.path in ("/health", "/stats"):
+            return await call_next(request)
+        app.state.requests += 1
+        roll = rng.random()
+        if roll < rate_429:
+            app.state.injected["429"] += 1
+            # Same body Blockfrost sends when the project is over its limit
+            return JSONResponse(
+                {"status_code": 429, "error": "Project Over Limit", "message": "Usage is over limit."},
+                status_code=429, headers={"Retry-After": str(retry_after)},
+            )
+        if roll < rate_429 + error_rate:
+            app.state.injected["500"] += 1
+            await _latency()
+            return JSONResponse({"status_code": 500, "error": "Internal Server Error", "message": "injected"}, status_code=500)
+        return await call_next(request)
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "injected": app.state.injected}
+
+    @app.get("/health")
+    async def health():
+        return {"is_healthy": True}
+
+    @app.get("/scripts/{script_hash}")
+    async def script(script_hash: str):
+        await _latency()
+        # First hex digit decides the flavour: 0-3 none, 4-9 timelock, a-f plutus
+        head = script_hash[:1].lower()
+        if head in "0123":
+            raise HTTPException(status_code=404, detail="Not Found")
+        script_type = "timelock" if head in "456789" else "plutusV2"
+        return {"script_hash": script_hash, "type": script_type, "serialised_size": 0}
+
+    @app.get("/scripts/{script_hash}/json")
+    async def script_json(script_hash: str):
+        await _latency()
+        return {"json": {"type": "all", "scripts": [{"type": "sig", "keyHash": script_hash[:56]}]}}
+
+    @app.get("/assets/{asset}/addresses")
+    async def asset_addresses(asset: str, count: int = 100, page: int = 1, order: str = "asc"):
+        await _latency()
+        start = (page - 1) * count
+        end = min(start + count, holders)
+        return [
+            {"address": f"addr_stub_{asset[:8]}_{i}", "quantity": str(10_000_000 // (i + 1))}
+            for i in range(start, end)
+        ]
+
+    @app.get("/addresses/{address}/transactions")
+    async def address_transactions(address: str, count: int = 100, page: int = 1, order: str = "asc"):
+        await _latency()
+        return [{"tx_hash": f"tx_{address}", "tx_index": 0, "block_height": 1, "block_time": 1700000000}]
+
+    @app.get("/txs/{tx_hash}/utxos")
+    async def tx_utxos(tx_hash: str):
+        await _latency()
+        address = tx_hash[len("tx_"):]
+        return {
+            "hash": tx_hash,
+            "inputs": [{"address": _funder_for(address), "amount": [], "tx_hash": "tx_genesis"}],
+            "outputs": [{"address": address, "amount": []}],
+        }
+
+    return app
+
+# Uvicorn entrypoint for subprocess runs
+app = create_app(
+    latency_ms=float(os.getenv("STUB_LATENCY_MS", "0")),
+    holders=int(os.getenv("STUB_HOLDERS", "20")),
+    jitter_ms=float(os.getenv("STUB_JITTER_MS", "0")),
+    error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+    rate_429=float(os.getenv("STUB_429_RATE", "0")),
+    retry_after=int(os.getenv("STUB_RETRY_AFTER", "1")),
+)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@contextmanager
+def running_app(target: str, env: dict, ready_path: str, port: int | None = None, quiet: bool = False):
+    """Runs an ASGI app (`module:attr`) under uvicorn in a subprocess and yields its base URL once it answers."""
+    port = port or free_port()
+    output = subprocess.DEVNULL if quiet else None
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ, **env), stdout=output, stderr=output,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                if httpx.get(f"{base_url}{ready_path}", timeout=0.5).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or proc.poll() is not None:
+                raise RuntimeError(f"{target} failed to start")
+            time.sleep(0.1)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+@contextmanager
+def running_stub(
+    latency_ms: float = 0.0,
+    holders: int = 20,
+    port: int | None = None,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    rate_429: float = 0.0,
+    retry_after: int = 1,
+):
+    """Runs the stub in a subprocess and yields its base URL once it answers."""
+    env = {
+        "STUB_LATENCY_MS": str(latency_ms), "STUB_HOLDERS": str(holders), "STUB_JITTER_MS": str(jitter_ms),
+        "STUB_ERROR_RATE": str(error_rate), "STUB_429_RATE": str(rate_429), "STUB_RETRY_AFTER": str(retry_after),
+    }
+    with running_app("packages.backend.benchmarks.stub_blockfrost:app", env, "/health", port) as base_url:
+        yield base_url
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Blockfrost stub")
+    parser.add_argument("--port", type=int, default=9911)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--holders", type=int, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.holders, args.jitter_ms, args.error_rate, args.rate_429, args.retry_after)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
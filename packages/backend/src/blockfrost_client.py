@@ -0,0 +1,355 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .telemetry import registry, blockfrost_requests, blockfrost_request_seconds, endpoint_template
+from .tracing import span, CLIENT
+
+logger = logging.getLogger(__name__)
+
+# One pooled client for the whole app lifetime, shared by xray_engine and insider_engine.
+# Keep-alive connections avoid a TCP/TLS handshake per Blockfrost call.
+BLOCKFROST_MAX_CONNECTIONS = int(os.getenv("BLOCKFROST_MAX_CONNECTIONS", "20"))
+BLOCKFROST_MAX_KEEPALIVE = int(os.getenv("BLOCKFROST_MAX_KEEPALIVE", "20"))
+BLOCKFROST_KEEPALIVE_EXPIRY = float(os.getenv("BLOCKFROST_KEEPALIVE_EXPIRY", "30"))
+BLOCKFROST_HTTP_TIMEOUT = float(os.getenv("BLOCKFROST_HTTP_TIMEOUT", "10"))
+
+# Blockfrost's published limits: 10 req/s per project, with a burst bucket of 500
+# that refills at the same 10 req/s.
+BLOCKFROST_RPS = float(os.getenv("BLOCKFROST_RPS", "10"))
+BLOCKFROST_BURST = int(os.getenv("BLOCKFROST_BURST", "500"))
+BLOCKFROST_MAX_IN_FLIGHT = int(os.getenv("BLOCKFROST_MAX_IN_FLIGHT", "10"))
+# Floor for the adaptive (AIMD) concurrency limit
+BLOCKFROST_MIN_IN_FLIGHT = int(os.getenv("BLOCKFROST_MIN_IN_FLIGHT", "1"))
+
+# Retries for 429 / 5xx / network errors, with jittered exponential backoff
+BLOCKFROST_RETRIES = int(os.getenv("BLOCKFROST_RETRIES", "3"))
+BLOCKFROST_BACKOFF_BASE = float(os.getenv("BLOCKFROST_BACKOFF_BASE", "0.5"))
+BLOCKFROST_BACKOFF_MAX = float(os.getenv("BLOCKFROST_BACKOFF_MAX", "8"))
+# Circuit breaker: open after this many consecutive failed requests, probe again after the reset time
+BLOCKFROST_BREAKER_THRESHOLD = int(os.getenv("BLOCKFROST_BREAKER_THRESHOLD", "5"))
+BLOCKFROST_BREAKER_RESET_SECONDS = float(os.getenv("BLOCKFROST_BREAKER_RESET_SECONDS", "30"))
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _build_client() -> httpx.AsyncClient:
+    # All Blockfrost traffic goes to a single host, so the pool limit is the per-host limit.
+    limits = httpx.Limits(
+        max_connections=BLOCKFROST_MAX_CONNECTIONS,
+        max_keepalive_connections=BLOCKFROST_MAX_KEEPALIVE,
+        keepalive_expiry=BLOCKFROST_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=BLOCKFROST_HTTP_TIMEOUT,
+        http2=http2_available(),
+    )
+
+def _client_usable() -> bool:
+    # Pooled connections belong to the loop that opened them
+    if _client is None or _client.is_closed:
+        return False
+    try:
+        return _client_loop is asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+
+async def start_client() -> httpx.AsyncClient:
+    """Create the shared client. Called from the FastAPI lifespan hook."""
+    global _client, _client_loop
+    if not _client_usable():
+        _client = _build_client()
+        _client_loop = asyncio.get_running_loop()
+        logger.info(f"Blockfrost client started (http2={http2_available()}, max_connections={BLOCKFROST_MAX_CONNECTIONS})")
+    return _client
+
+async def close_client() -> None:
+    """Close the shared client and drop its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the shared client.
+    Created lazily when used outside the app lifespan (scripts, tests).
+    """
+    global _client, _client_loop
+    if not _client_usable():
+        _client = _build_client()
+        try:
+            _client_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            _client_loop = None
+    return _client
+
+class TokenBucket:
+    """Classic token bucket: `capacity` burst, refilled at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Takes a token and returns 0, or returns the seconds to wait for the next one."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+class BlockfrostScheduler:
+    """
+    Bounds Blockfrost traffic: requests start no faster than the token bucket
+    allows, and at most `limit` run at once. `limit` adapts AIMD-style between
+    BLOCKFROST_MIN_IN_FLIGHT and `max_in_flight`: halved on a 429, grown by
+    about one per round of successes. A 429's Retry-After pauses every caller.
+    """
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int, min_in_flight: int = 1):
+        self.configure(rate, burst, max_in_flight, min_in_flight)
+        # Requests started through slot() since startup (budgeting for background work)
+        self.calls = 0
+        self.throttled = 0
+
+    def configure(self, rate: float, burst: int, max_in_flight: int, min_in_flight: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = max(1, min(min_in_flight, max_in_flight))
+        self.limit = float(max_in_flight)
+        self.bucket = TokenBucket(rate, burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._loop = None
+
+    def _bind(self) -> None:
+        # asyncio primitives are tied to one event loop; rebuild them if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._capacity = asyncio.Condition()
+            self._bucket_lock = asyncio.Lock()
+
+    def throttle(self, retry_after: float) -> None:
+        """Called on a 429: pause everyone for `retry_after`, halve the concurrency limit."""
+        now = time.monotonic()
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, now + retry_after)
+        # One decrease per pause window: a burst of 429s from the same overload counts once
+        if now >= self._last_decrease + max(retry_after, 1.0):
+            self.limit = max(float(self.min_in_flight), self.limit / 2)
+            self._last_decrease = now
+            logger.warning(f"Blockfrost 429: concurrency limit now {int(self.limit)}, pausing {retry_after:.1f}s")
+
+    def succeeded(self) -> None:
+        # Additive increase: +1 after roughly `limit` successes
+        self.limit = min(float(self.max_in_flight), self.limit + 1 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        self._bind()
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            while (pause := self.paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+            async with self._bucket_lock:
+                # Waiters queue on the lock, so tokens are handed out in FIFO order
+                while (wait := self.bucket.try_acquire()) > 0:
+                    await asyncio.sleep(wait)
+            self.calls += 1
+            yield
+        finally:
+            async with self._capacity:
+                self.in_flight -= 1
+                self._capacity.notify_all()
+
+scheduler = BlockfrostScheduler(BLOCKFROST_RPS, BLOCKFROST_BURST, BLOCKFROST_MAX_IN_FLIGHT, BLOCKFROST_MIN_IN_FLIGHT)
+
+class BlockfrostUnavailable(Exception):
+    """Blockfrost kept failing (or the circuit is open), so the request was not served."""
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed requests (retries exhausted) and
+    fails fast for `reset_timeout` seconds. Then one probe request is let
+    through: success closes the circuit, failure keeps it open another period.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Let this caller probe; everyone else keeps failing fast until it reports back
+            self.opened_at = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Blockfrost circuit closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.opens += 1
+                logger.error(f"Blockfrost circuit opened after {self.failures} failed requests")
+            self.opened_at = time.monotonic()
+
+breaker = CircuitBreaker(BLOCKFROST_BREAKER_THRESHOLD, BLOCKFROST_BREAKER_RESET_SECONDS)
+retries_total = 0
+
+def _retry_after(response: httpx.Response) -> float:
+    # Blockfrost sends delta-seconds; fall back to the base backoff if absent or unparsable
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return BLOCKFROST_BACKOFF_BASE
+
+def _backoff(attempt: int) -> float:
+    # Exponential with full jitter, so synchronized retries spread out
+    return random.uniform(0, min(BLOCKFROST_BACKOFF_MAX, BLOCKFROST_BACKOFF_BASE * 2 ** attempt))
+
+async def blockfrost_get(
+    url: str,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, Any]] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    retries: int = BLOCKFROST_RETRIES,
+) -> httpx.Response:
+    """
+    GET through the shared scheduler, retrying 429s (after Retry-After), 5xx and
+    network errors with jittered backoff. Returns the first other response
+    (2xx, 404, other 4xx). Raises BlockfrostUnavailable when every attempt
+    failed or the circuit breaker is open.
+    """
+    endpoint = endpoint_template(urlsplit(url).path)
+    with span("blockfrost.get", CLIENT, endpoint=endpoint) as current:
+        return await _get_with_retries(url, headers, params, client or get_client(), retries, endpoint, current)
+
+async def _get_with_retries(url, headers, params, client, retries, endpoint, current) -> httpx.Response:
+    global retries_total
+    if not breaker.allow():
+        current.set("breaker", "open")
+        raise BlockfrostUnavailable("circuit open")
+    latency = blockfrost_request_seconds.labels(endpoint)
+    last_error = "no attempts"
+    waited = 0.0
+    for attempt in range(retries):
+        if attempt:
+            retries_total += 1
+        current.set("attempts", attempt + 1)
+        queued = time.perf_counter()
+        try:
+            # Every attempt waits for a scheduler slot (adaptive in-flight cap, pause, token bucket)
+            async with scheduler.slot():
+                start = time.perf_counter()
+                waited += start - queued
+                current.set("scheduler_wait_ms", round(waited * 1000, 3))
+                try:
+                    response = await client.get(url, headers=headers, params=params)
+                finally:
+                    latency.observe(time.perf_counter() - start)
+        except httpx.RequestError as e:
+            blockfrost_requests.labels(endpoint, "error").inc()
+            last_error = f"{type(e).__name__}: {e}"
+        else:
+            blockfrost_requests.labels(endpoint, str(response.status_code)).inc()
+            current.set("http.status_code", response.status_code)
+            if response.status_code == 429:
+                scheduler.throttle(_retry_after(response))
+                last_error = "429 Too Many Requests"
+            elif response.status_code >= 500:
+                last_error = f"HTTP {response.status_code}"
+            else:
+                scheduler.succeeded()
+                breaker.record_success()
+                return response
+        if attempt < retries - 1:
+            await asyncio.sleep(_backoff(attempt))
+    breaker.record_failure()
+    raise BlockfrostUnavailable(last_error)
+
+def stats() -> Dict[str, Any]:
+    """Scheduler and breaker state, for monitoring."""
+    return {
+        "in_flight": scheduler.in_flight,
+        "concurrency_limit": int(scheduler.limit),
+        "calls": scheduler.calls,
+        "throttled": scheduler.throttled,
+        "retries": retries_total,
+        "paused_for": round(max(0.0, scheduler.paused_until - time.monotonic()), 3),
+        "breaker_state": breaker.state,
+        "breaker_opens": breaker.opens,
+        "breaker_rejected": breaker.rejected,
+    }
+
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+registry.collected("nexguard_blockfrost_in_flight", "Blockfrost requests currently holding a scheduler slot", "gauge", (),
+                   lambda: {(): scheduler.in_flight})
+registry.collected("nexguard_blockfrost_concurrency_limit", "Current adaptive (AIMD) in-flight limit", "gauge", (),
+                   lambda: {(): int(scheduler.limit)})
+registry.collected("nexguard_blockfrost_throttled", "429 responses received", "counter", (),
+                   lambda: {(): scheduler.throttled})
+registry.collected("nexguard_blockfrost_retries", "Blockfrost request retries", "counter", (),
+                   lambda: {(): retries_total})
+registry.collected("nexguard_blockfrost_breaker_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", "gauge", (),
+                   lambda: {(): _BREAKER_STATES[breaker.state]})
+registry.collected("nexguard_blockfrost_breaker_opens", "Times the circuit breaker opened", "counter", (),
+                   lambda: {(): breaker.opens})
+registry.collected("nexguard_blockfrost_breaker_rejected", "Requests failed fast by the open circuit", "counter", (),
+                   lambda: {(): breaker.rejected})
@@ -0,0 +1,179 @@
+"""
+Compact binary encoding of cached BundleAnalysisResult rows.
+
+    header  "NGB" | version u8 | flags u8
+    body    zlib( scalars | string table | column arrays )
+
+Every string (policy id, timestamp, addresses, groups, colors) is interned
+once in a NUL-separated UTF-8 table; nodes, links and clusters are stored
+column-wise as little-endian arrays of string indexes and numbers, so links
+are pairs of u32 instead of two ~100-byte addresses.
+
+Rows carrying this header were written by upsert_bundle from an already
+validated result, so decode() rebuilds the models without re-validating.
+Bump VERSION for any layout change; decode() rejects versions it doesn't know
+(callers treat that as a cache miss).
+"""
+
+import sys
+import zlib
+import struct
+from array import array
+from datetime import datetime
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+from packages.backend.src.models import BundleAnalysisResult, GraphNode, GraphLink, BundleCluster
+
+MAGIC = b"NGB"
+VERSION = 1
+HEADER = struct.Struct("<3sBB")
+# strings length, nodes, links, clusters, risk_score, stale/degraded bits, funder_hhi, funder_gini
+SCALARS = struct.Struct("<IIIIBBdd")
+FLAG_ZLIB = 0x01
+# Random-looking bech32 addresses dominate the body; past level 1 zlib only
+# saves ~4% more and doubles encode time
+ZLIB_LEVEL = 1
+
+_STALE, _DEGRADED = 0x01, 0x02
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# BaseModel's instance slots on the Pydantic versions requirements.txt allows;
+# _trusted only fills them itself when they are exactly these
+PYDANTIC_SLOTS = ("__dict__", "__pydantic_fields_set__", "__pydantic_extra__", "__pydantic_private__")
+
+def _trusted(model):
+    """
+    Builds `model` instances from already-valid values without validation.
+    Sets the instance slots directly: the same state model_construct() leaves
+    behind, without its per-call pass over the field definitions, which
+    makes decoding a 10k-holder bundle slower than validating its JSON.
+    Falls back to model_construct() if BaseModel's slots aren't the known
+    ones; test_bundle_codec checks that both build identical instances.
+    """
+    if tuple(getattr(BaseModel, "__slots__", ())) != PYDANTIC_SLOTS:
+        return model.model_construct
+    new, set_slot = object.__new__, object.__setattr__
+
+    def build(**values):
+        instance = new(model)
+        set_slot(instance, "__dict__", values)
+        set_slot(instance, "__pydantic_fields_set__", set(values))
+        set_slot(instance, "__pydantic_extra__", None)
+        set_slot(instance, "__pydantic_private__", None)
+        return instance
+    return build
+
+_node, _link, _cluster, _result = (_trusted(m) for m in (GraphNode, GraphLink, BundleCluster, BundleAnalysisResult))
+
+def is_encoded(payload) -> bool:
+    return isinstance(payload, (bytes, bytearray, memoryview)) and bytes(payload[:3]) == MAGIC
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column.tobytes()
+
+def _read_column(typecode: str, buffer: memoryview, offset: int, count: int):
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    column.frombytes(buffer[offset:end])
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column, end
+
+class _Interner:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __call__(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+def encode(result: BundleAnalysisResult) -> bytes:
+    intern = _Interner()
+    intern(result.policy_id)
+    intern(result.timestamp.isoformat())
+    nodes, links, clusters = result.nodes, result.links, result.clusters
+
+    columns = [
+        _column("I", [intern(n.id) for n in nodes]),
+        _column("I", [intern(n.group) for n in nodes]),
+        _column("I", [intern(n.color) for n in nodes]),
+        _column("d", [n.val for n in nodes]),
+        _column("i", [n.hop for n in nodes]),
+        _column("I", [intern(l.source) for l in links]),
+        _column("I", [intern(l.target) for l in links]),
+        _column("i", [l.hop for l in links]),
+        _column("I", [intern(c.funder) for c in clusters]),
+        _column("I", [c.holders for c in clusters]),
+        _column("d", [c.supply_share for c in clusters]),
+        _column("I", [c.masters for c in clusters]),
+    ]
+    table = "\0".join(intern.strings).encode("utf-8")
+    bits = (_STALE if result.stale else 0) | (_DEGRADED if result.degraded else 0)
+    body = b"".join([
+        SCALARS.pack(len(table), len(nodes), len(links), len(clusters), result.risk_score, bits,
+                     result.funder_hhi, result.funder_gini),
+        table,
+        *columns,
+    ])
+    return HEADER.pack(MAGIC, VERSION, FLAG_ZLIB) + zlib.compress(body, ZLIB_LEVEL)
+
+def decode(payload: bytes) -> BundleAnalysisResult:
+    """Rebuilds the result without validation; raises ValueError on anything it didn't write."""
+    magic, version, flags = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("not an encoded bundle")
+    if version != VERSION:
+        raise ValueError(f"unsupported bundle encoding version {version}")
+    body = payload[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    buffer = memoryview(body)
+
+    table_len, n_nodes, n_links, n_clusters, risk_score, bits, hhi, gini = SCALARS.unpack_from(buffer)
+    offset = SCALARS.size
+    strings = bytes(buffer[offset:offset + table_len]).decode("utf-8").split("\0")
+    offset += table_len
+
+    node_id, offset = _read_column("I", buffer, offset, n_nodes)
+    node_group, offset = _read_column("I", buffer, offset, n_nodes)
+    node_color, offset = _read_column("I", buffer, offset, n_nodes)
+    node_val, offset = _read_column("d", buffer, offset, n_nodes)
+    node_hop, offset = _read_column("i", buffer, offset, n_nodes)
+    link_source, offset = _read_column("I", buffer, offset, n_links)
+    link_target, offset = _read_column("I", buffer, offset, n_links)
+    link_hop, offset = _read_column("i", buffer, offset, n_links)
+    cluster_funder, offset = _read_column("I", buffer, offset, n_clusters)
+    cluster_holders, offset = _read_column("I", buffer, offset, n_clusters)
+    cluster_share, offset = _read_column("d", buffer, offset, n_clusters)
+    cluster_masters, offset = _read_column("I", buffer, offset, n_clusters)
+    if offset != len(buffer):
+        raise ValueError("truncated or oversized bundle payload")
+
+    s = strings
+    return _result(
+        policy_id=s[0],
+        timestamp=datetime.fromisoformat(s[1]),
+        nodes=[
+            _node(id=s[i], group=s[g], color=s[c], val=v, hop=h)
+            for i, g, c, v, h in zip(node_id, node_group, node_color, node_val, node_hop)
+        ],
+        links=[_link(source=s[a], target=s[b], hop=h) for a, b, h in zip(link_source, link_target, link_hop)],
+        risk_score=risk_score,
+        clusters=[
+            _cluster(funder=s[f], holders=n, supply_share=share, masters=m)
+            for f, n, share, m in zip(cluster_funder, cluster_holders, cluster_share, cluster_masters)
+        ],
+        funder_hhi=hhi,
+        funder_gini=gini,
+        stale=bool(bits & _STALE),
+        degraded=bool(bits & _DEGRADED),
+    )
@@ -1,57 +1,200 @@
 import sqlite3
 import os
 import json
-from datetime import datetime
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from packages.backend.src.models import BundleAnalysisResult
+from packages.backend.src.memory_cache import TTLCache
+from packages.backend.src import bundle_codec
+from packages.backend.src.storage import (
+    bundles as pool, BUNDLE_DB_PATH, BUNDLE_TABLE, XRAY_TABLE, FUNDER_TABLE, SCRIPT_TABLE, SNAPSHOT_TABLE,
+)
+from packages.backend.src.telemetry import track_cache
+from packages.backend.src.tracing import traced
 
-BUNDLE_DB_PATH = os.getenv("BUNDLE_DB_PATH", "./nexguard_bundles.db")
-BUNDLE_TABLE = os.getenv("BUNDLE_TABLE", "bundles")
+logger = logging.getLogger(__name__)
+
+# Cached rows are fresh for CACHE_TTL (24h by default). Past that they may still be
+# served as stale for up to CACHE_MAX_STALE while a background refresh runs.
+CACHE_TTL = timedelta(seconds=int(os.getenv("CACHE_FRESH_SECONDS", str(24 * 3600))))
+CACHE_MAX_STALE = timedelta(seconds=int(os.getenv("CACHE_MAX_STALE_SECONDS", str(24 * 3600))))
+
+FRESH, STALE, EXPIRED = "fresh", "stale", "expired"
+BUNDLE_MEMORY_CACHE_SIZE = int(os.getenv("BUNDLE_MEMORY_CACHE_SIZE", "1024"))
+
+def cache_state(timestamp: datetime) -> str:
+    """Classifies a cached row by the time it was written: FRESH, STALE or EXPIRED."""
+    age = datetime.utcnow() - timestamp
+    if age < CACHE_TTL:
+        return FRESH
+    if age < CACHE_TTL + CACHE_MAX_STALE:
+        return STALE
+    return EXPIRED
+
+# Deserialized BundleAnalysisResult objects, in front of the SQLite table.
+# Kept through the stale window so stale-while-revalidate can serve from memory.
+bundle_cache = TTLCache("bundle", BUNDLE_MEMORY_CACHE_SIZE, CACHE_TTL + CACHE_MAX_STALE)
+track_cache(bundle_cache)
+
+# Built once so every call hits the same entry in the per-connection statement cache
+SELECT_PAYLOAD_SQL = f"SELECT payload FROM {BUNDLE_TABLE} WHERE policy_id = ?"
+SELECT_TIMESTAMP_SQL = f"SELECT timestamp FROM {BUNDLE_TABLE} WHERE policy_id = ?"
+UPSERT_PAYLOAD_SQL = f"""
+    INSERT OR REPLACE INTO {BUNDLE_TABLE} (policy_id, payload, timestamp)
+    VALUES (?, ?, ?)
+"""
+SELECT_XRAY_SQL = f"SELECT payload, timestamp FROM {XRAY_TABLE} WHERE policy_id = ?"
+UPSERT_XRAY_SQL = f"""
+    INSERT OR REPLACE INTO {XRAY_TABLE} (policy_id, payload, timestamp)
+    VALUES (?, ?, ?)
+"""
+UPSERT_FUNDER_SQL = f"""
+    INSERT OR REPLACE INTO {FUNDER_TABLE} (address, first_tx_hash, funder_address, resolved_at)
+    VALUES (?, ?, ?, ?)
+"""
+UPSERT_SCRIPT_SQL = f"""
+    INSERT OR REPLACE INTO {SCRIPT_TABLE} (script_hash, script, script_json, fetched_at)
+    VALUES (?, ?, ?, ?)
+"""
+UPSERT_SNAPSHOT_SQL = f"""
+    INSERT OR REPLACE INTO {SNAPSHOT_TABLE} (policy_id, holders, taken_at, total_supply, supply_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+# Stay under SQLite's bound-parameter limit for IN (...) lookups
+SQLITE_MAX_PARAMS = 900
 
 def get_connection():
+    """A fresh standalone connection, for one-off scripts. Request paths use `pool`."""
     conn = sqlite3.connect(BUNDLE_DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     return conn
 
-def _init_db():
-    conn = get_connection()
-    try:
-        conn.execute(f"""
-            CREATE TABLE IF NOT EXISTS {BUNDLE_TABLE} (
-                policy_id TEXT PRIMARY KEY,
-                payload   TEXT NOT NULL,
-                timestamp TEXT NOT NULL
-            );
-        """)
-        conn.execute(f"""
-            CREATE INDEX IF NOT EXISTS idx_{BUNDLE_TABLE}_timestamp ON {BUNDLE_TABLE}(timestamp);
-        """)
-        conn.commit()
-    finally:
-        conn.close()
-
-# Ensure table + indexes on module import
-_init_db()
-
-def fetch_bundle(policy_id: str) -> dict | None:
-    conn = get_connection()
+@traced("sqlite.fetch_bundle")
+def fetch_bundle(policy_id: str) -> BundleAnalysisResult | None:
+    """
+    The stored bundle, or None. Rows in the binary encoding were validated when
+    written and are rebuilt without validation; older JSON rows are validated.
+    """
+    with pool.reader() as conn:
+        row = conn.execute(SELECT_PAYLOAD_SQL, (policy_id,)).fetchone()
+    if not row:
+        return None
+    payload = row["payload"]
     try:
-        cursor = conn.execute(f"SELECT payload FROM {BUNDLE_TABLE} WHERE policy_id = ?", (policy_id,))
-        row = cursor.fetchone()
-        if row:
-            return json.loads(row["payload"])
+        if bundle_codec.is_encoded(payload):
+            return bundle_codec.decode(payload)
+        return BundleAnalysisResult(**json.loads(payload))
+    except Exception as e:
+        # Unknown encoding version or a corrupt row: treat as a miss, the next analysis overwrites it
+        logger.warning(f"Unreadable cached bundle for {policy_id}: {e}")
         return None
-    finally:
-        conn.close()
 
+@traced("sqlite.fetch_bundle_timestamp")
+def fetch_bundle_timestamp(policy_id: str) -> datetime | None:
+    """When the stored bundle was computed, without reading its payload."""
+    with pool.reader() as conn:
+        row = conn.execute(SELECT_TIMESTAMP_SQL, (policy_id,)).fetchone()
+    return datetime.fromisoformat(row["timestamp"]) if row else None
+
+@traced("sqlite.upsert_bundle")
 def upsert_bundle(result: BundleAnalysisResult) -> None:
-    conn = get_connection()
-    try:
-        payload = result.json()
-        timestamp = result.timestamp.isoformat()
-        conn.execute(f"""
-            INSERT OR REPLACE INTO {BUNDLE_TABLE} (policy_id, payload, timestamp)
-            VALUES (?, ?, ?)
-        """, (result.policy_id, payload, timestamp))
-        conn.commit()
-    finally:
-        conn.close()
+    payload = bundle_codec.encode(result)
+    timestamp = result.timestamp.isoformat()
+    with pool.writer() as conn:
+        conn.execute(UPSERT_PAYLOAD_SQL, (result.policy_id, payload, timestamp))
+    # Write-through so the next read skips SQLite and decoding
+    bundle_cache.set(result.policy_id, result, result.timestamp)
+
+@traced("sqlite.fetch_funders")
+def fetch_funders(addresses: List[str]) -> Dict[str, Optional[str]]:
+    """Known funders for `addresses` (address -> funder_address, which may be None)."""
+    found: Dict[str, Optional[str]] = {}
+    with pool.reader() as conn:
+        for i in range(0, len(addresses), SQLITE_MAX_PARAMS):
+            chunk = addresses[i:i + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT address, funder_address FROM {FUNDER_TABLE} WHERE address IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for row in rows:
+                found[row["address"]] = row["funder_address"]
+    return found
+
+@traced("sqlite.upsert_funders")
+def upsert_funders(rows: List[Tuple[str, Optional[str], Optional[str]]]) -> None:
+    """Stores (address, first_tx_hash, funder_address) resolutions in one transaction."""
+    if not rows:
+        return
+    resolved_at = datetime.utcnow().isoformat()
+    with pool.writer() as conn:
+        conn.executemany(UPSERT_FUNDER_SQL, [(a, tx, f, resolved_at) for a, tx, f in rows])
+
+def _script_row(row) -> dict:
+    return {
+        "script_hash": row["script_hash"],
+        "script": json.loads(row["script"]) if row["script"] else None,
+        "script_json": json.loads(row["script_json"]) if row["script_json"] else None,
+        "fetched_at": row["fetched_at"],
+    }
+
+@traced("sqlite.fetch_script")
+def fetch_script(script_hash: str) -> dict | None:
+    """
+    Stored Blockfrost metadata for a script hash, or None if unknown.
+    Found scripts are returned forever; "not found" answers only while < 24h old.
+    """
+    with pool.reader() as conn:
+        row = conn.execute(f"SELECT * FROM {SCRIPT_TABLE} WHERE script_hash = ?", (script_hash,)).fetchone()
+    if not row:
+        return None
+    if row["script"] is None and datetime.utcnow() - datetime.fromisoformat(row["fetched_at"]) >= CACHE_TTL:
+        return None
+    return _script_row(row)
+
+@traced("sqlite.upsert_script")
+def upsert_script(script_hash: str, script: dict | None, script_json: dict | None) -> None:
+    with pool.writer() as conn:
+        conn.execute(UPSERT_SCRIPT_SQL, (
+            script_hash,
+            json.dumps(script) if script is not None else None,
+            json.dumps(script_json) if script_json is not None else None,
+            datetime.utcnow().isoformat(),
+        ))
+
+@traced("sqlite.fetch_all_scripts")
+def fetch_all_scripts() -> List[dict]:
+    """Every stored script, for re-scoring the catalogue without network calls."""
+    with pool.reader() as conn:
+        rows = conn.execute(f"SELECT * FROM {SCRIPT_TABLE}").fetchall()
+    return [_script_row(row) for row in rows]
+
+class HolderSnapshot(NamedTuple):
+    # holder -> funder, in holder order
+    holders: Dict[str, Optional[str]]
+    # The asset's total quantity, and when it was fetched (None: not yet, or the lookup failed)
+    total_supply: Optional[float] = None
+    supply_at: Optional[datetime] = None
+
+@traced("sqlite.fetch_snapshot")
+def fetch_snapshot(policy_id: str) -> HolderSnapshot | None:
+    """The previous holder snapshot of `policy_id`, or None."""
+    with pool.reader() as conn:
+        row = conn.execute(
+            f"SELECT holders, total_supply, supply_at FROM {SNAPSHOT_TABLE} WHERE policy_id = ?", (policy_id,)
+        ).fetchone()
+    if not row:
+        return None
+    return HolderSnapshot(
+        {address: funder for address, funder in json.loads(row["holders"])},
+        row["total_supply"],
+        datetime.fromisoformat(row["supply_at"]) if row["supply_at"] else None,
+    )
+
+@traced("sqlite.upsert_snapshot")
+def upsert_snapshot(policy_id: str, snapshot: HolderSnapshot) -> None:
+    payload = json.dumps(list(snapshot.holders.items()))
+    supply_at = snapshot.supply_at.isoformat() if snapshot.supply_at else None
+    with pool.writer() as conn:
+        conn.execute(UPSERT_SNAPSHOT_SQL, (policy_id, payload, datetime.utcnow().isoformat(), snapshot.total_supply, supply_at))
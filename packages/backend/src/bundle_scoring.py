@@ -0,0 +1,98 @@
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from packages.backend.src.compact_graph import CompactGraph
+from packages.backend.src.models import BundleCluster
+
+MAX_REPORTED_CLUSTERS = 50
+
+class ClusterScores(NamedTuple):
+    clusters: List[BundleCluster]
+    # Share of the token's supply held by the largest multi-holder cluster
+    # (of the analyzed holders' supply when the total supply is unknown)
+    top_cluster_share: float
+    # Concentration of analyzed supply by direct funder (unfunded holders count alone)
+    funder_hhi: float
+    funder_gini: float
+
+def parse_quantity(holder: dict) -> float:
+    # Blockfrost sends quantities as decimal strings; float keeps shares accurate enough
+    try:
+        return float(holder.get("quantity") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def gini(values: np.ndarray) -> float:
+    """Gini coefficient of non-negative values (0 = equal, -> 1 = one holder has everything)."""
+    n = len(values)
+    total = values.sum()
+    if n == 0 or total <= 0:
+        return 0.0
+    ranked = np.sort(values)
+    # Standard closed form over the ascending ranks
+    return float((2 * np.arange(1, n + 1) - n - 1) @ ranked / (n * total))
+
+def score_clusters(
+    G: CompactGraph,
+    masters: np.ndarray,
+    addresses: List[str],
+    quantities: Optional[List[float]] = None,
+    total_supply: Optional[float] = None,
+) -> ClusterScores:
+    """
+    One vectorized pass over the frozen graph: weakly connected components, each
+    component's holders / supply share / masters, and funder concentration.
+    A cluster is a component holding >= 2 holders. `quantities` are the balances
+    of `addresses`; without them every supply share is 0. Supply shares are of
+    `total_supply` (the asset's quantity) when given, else of the analyzed
+    holders' balances; funder concentration is always among the analyzed holders.
+    """
+    n = len(G)
+    if n == 0:
+        return ClusterScores([], 0.0, 0.0, 0.0)
+
+    holder_ids = G.ids(addresses)
+    is_holder = np.zeros(n, dtype=bool)
+    is_holder[holder_ids] = True
+    supply = np.zeros(n)
+    if quantities is not None:
+        supply[holder_ids] = quantities
+    total = supply.sum()
+
+    components = G.components()
+    k = int(components.max()) + 1
+    holders_per = np.bincount(components, weights=is_holder.astype(float), minlength=k)
+    supply_per = np.bincount(components, weights=supply, minlength=k)
+    masters_per = np.bincount(components, weights=masters.astype(float), minlength=k)
+    # The top holders can't hold more than the whole supply; if they appear to, the figure is off
+    denominator = max(total, total_supply or 0.0)
+    shares = supply_per / denominator if denominator > 0 else np.zeros(k)
+
+    # Lead funder of each component: its node with the highest out-degree (first-seen on ties)
+    out_degree = G.out_degree()
+    order = np.lexsort((np.arange(n), -out_degree, components))
+    first = np.ones(n, dtype=bool)
+    first[1:] = components[order][1:] != components[order][:-1]
+    lead = np.empty(k, dtype=np.int64)
+    lead[components[order][first]] = order[first]
+
+    multi = np.flatnonzero(holders_per >= 2)
+    ranked = multi[np.lexsort((multi, -holders_per[multi], -shares[multi]))][:MAX_REPORTED_CLUSTERS]
+    clusters = [
+        BundleCluster(funder=G.labels[lead[c]], holders=int(holders_per[c]),
+                      supply_share=round(float(shares[c]), 6), masters=int(masters_per[c]))
+        for c in ranked.tolist()
+    ]
+    top_share = float(shares[multi].max()) if len(multi) else 0.0
+
+    # Supply grouped by direct funder: hop-1 edges point funder -> holder
+    direct = (G.edge_hops == 1) & is_holder[G.indices]
+    by_funder = np.bincount(G.sources[direct], weights=supply[G.indices[direct]], minlength=n)
+    funded = np.zeros(n, dtype=bool)
+    funded[G.indices[direct]] = True
+    groups = np.concatenate([by_funder[by_funder > 0], supply[is_holder & ~funded]])
+    groups = groups[groups > 0]
+    hhi = float(((groups / total) ** 2).sum()) if total > 0 else 0.0
+
+    return ClusterScores(clusters, top_share, round(hhi, 6), round(gini(groups), 6))
@@ -1,67 +1,380 @@
 import os
 import asyncio
+import logging
 import time
 import httpx
-import networkx as nx
+from contextlib import aclosing
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, NamedTuple, Tuple, AsyncIterator, Callable
 
 # Import models and db helpers
 # Assuming running from root, so imports should work if sys.path is correct
-from packages.backend.src.models import BundleAnalysisResult, GraphNode, GraphLink
-from packages.backend.src.bundle_db_sqlite import fetch_bundle, upsert_bundle
+from packages.backend.src.models import (
+    BundleAnalysisResult, GraphNode, GraphLink, BundleBatchResult, BundleBatchStats, BundleScore,
+)
+from packages.backend.src.bundle_db_sqlite import (
+    fetch_bundle, fetch_bundle_timestamp, upsert_bundle, bundle_cache, cache_state, STALE, EXPIRED, fetch_funders, upsert_funders,
+    fetch_snapshot, upsert_snapshot, HolderSnapshot, pool,
+)
+from packages.backend.src.blockfrost_client import get_client, blockfrost_get, breaker, BlockfrostUnavailable
+from packages.backend.src.compact_graph import CompactGraph
+from packages.backend.src.bundle_scoring import score_clusters, parse_quantity
+from packages.backend.src.xray_engine import flights, metrics
+from packages.backend.src.telemetry import cache_lookups, track_in_flight, analyses_in_flight
+from packages.backend.src.tracing import span, traced
 
 BLOCKFROST_PROJECT_ID = os.getenv("BLOCKFROST_PROJECT_ID")
 BLOCKFROST_BASE = os.getenv("BLOCKFROST_BASE", "https://cardano-preview.blockfrost.io/api/v0")
 
+# Holders covered by the standard (cached) analysis
+BUNDLE_TOP_HOLDERS = 20
+# Deep mode: page through the holder list instead of taking the top 20
+HOLDERS_PAGE_SIZE = 100  # Blockfrost's maximum `count`
+BUNDLE_DEEP_MAX_HOLDERS = int(os.getenv("BUNDLE_DEEP_MAX_HOLDERS", "10000"))
+# Pages fetched ahead of the tracing stage; bounds memory when tracing is the bottleneck
+BUNDLE_DEEP_PREFETCH_PAGES = int(os.getenv("BUNDLE_DEEP_PREFETCH_PAGES", "2"))
+
+# Multi-hop tracing: how far up the funding chain to walk (1 = direct funders only),
+# and the worst-case Blockfrost calls an analysis may spend beyond the first hop
+BUNDLE_FUNDER_HOPS = int(os.getenv("BUNDLE_FUNDER_HOPS", "1"))
+BUNDLE_HOP_CALL_BUDGET = int(os.getenv("BUNDLE_HOP_CALL_BUDGET", "100"))
+
+# The asset's total supply is stored with the holder snapshot and fetched again only when
+# the holder set changes or the stored figure is older than this (7 days by default)
+BUNDLE_SUPPLY_MAX_AGE = timedelta(seconds=int(os.getenv("BUNDLE_SUPPLY_MAX_AGE_SECONDS", str(7 * 24 * 3600))))
+
+logger = logging.getLogger(__name__)
+
 async def _bf_get(client: httpx.AsyncClient, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
     """
-    Helper to fetch from Blockfrost with retries and exponential backoff.
-    Returns None if all attempts fail.
+    Helper to fetch from Blockfrost through the shared resilience layer
+    (adaptive concurrency, Retry-After, jittered retries, circuit breaker).
+    Returns None if the resource is missing or the request was rejected.
+    Raises BlockfrostUnavailable if all attempts failed (or the circuit is
+    open), so an outage isn't mistaken for an address without funders.
     """
     if not BLOCKFROST_PROJECT_ID:
         return None
 
     url = f"{BLOCKFROST_BASE}{path}"
     headers = {"project_id": BLOCKFROST_PROJECT_ID}
-    
-    retries = 3
-    backoff = 0.5
 
-    for attempt in range(retries):
-        try:
-            resp = await client.get(url, headers=headers, params=params)
-            resp.raise_for_status()
-            return resp.json()
-        except (httpx.RequestError, httpx.HTTPStatusError) as e:
-            # print(f"Attempt {attempt+1} failed for {url}: {e}")
-            if attempt == retries - 1:
-                return None
-            await asyncio.sleep(backoff)
-            backoff *= 2.0
-    return None
+    resp = await blockfrost_get(url, headers, params=params, client=client)
+    if not resp.is_success:
+        return None
+    return resp.json()
+
+async def _total_supply(client: httpx.AsyncClient, policy_id: str) -> Optional[float]:
+    """
+    The asset's total quantity (/assets/{asset}), or None if unavailable. It only
+    refines the supply shares, so a failed lookup doesn't fail the analysis.
+    """
+    try:
+        asset = await _bf_get(client, f"/assets/{policy_id}")
+    except BlockfrostUnavailable as e:
+        logger.info(f"Total supply of {policy_id} unavailable, scoring against the analyzed holders: {e}")
+        return None
+    if not isinstance(asset, dict):
+        return None
+    return parse_quantity(asset) or None
+
+class FunderLookup(NamedTuple):
+    funder: Optional[str]
+    first_tx_hash: Optional[str]
+    calls: int
+    # True when Blockfrost returned the first tx's UTxOs, i.e. the answer is permanent
+    final: bool
+
+async def _resolve_funder(client: httpx.AsyncClient, address: str) -> FunderLookup:
+    """
+    Resolves the funder of `address`: the first input address of its first transaction.
+    """
+    # /addresses/{addr}/transactions?order=asc&count=1 (First tx ever)
+    txs = await _bf_get(client, f"/addresses/{address}/transactions", params={"order": "asc", "count": 1})
+
+    if txs and len(txs) > 0:
+        first_tx_hash = txs[0].get("tx_hash")
+        if first_tx_hash:
+            # Get UTXOs to find input address
+            # /txs/{tx_hash}/utxos
+            utxos = await _bf_get(client, f"/txs/{first_tx_hash}/utxos")
+            if utxos and "inputs" in utxos and len(utxos["inputs"]) > 0:
+                return FunderLookup(utxos["inputs"][0].get("address"), first_tx_hash, 2, True)
+            return FunderLookup(None, first_tx_hash, 2, isinstance(utxos, dict))
+    return FunderLookup(None, None, 1, False)
+
+class FunderMemo:
+    """
+    Funder lookups shared by the analyses of one batch. Each address is resolved
+    at most once; concurrent requests for the same address await the same lookup.
+    Lookups are shielded: an analysis that stops early cancels its wait, not
+    the lookup the other analyses share.
+    """
+
+    def __init__(self):
+        self._lookups: Dict[str, asyncio.Task] = {}
+        self.blockfrost_calls = 0
+        self.calls_saved = 0
+        self.hits = 0
+        self.index_hits = 0
+
+    async def trace(self, client: httpx.AsyncClient, address: str) -> FunderLookup:
+        task = self._lookups.get(address)
+        if task is None:
+            task = asyncio.ensure_future(_resolve_funder(client, address))
+            self._lookups[address] = task
+            lookup = await asyncio.shield(task)
+            self.blockfrost_calls += lookup.calls
+            return lookup
+        self.hits += 1
+        lookup = await asyncio.shield(task)
+        self.calls_saved += lookup.calls
+        return lookup
+
+class GraphEvents:
+    """
+    Graph events of one running analysis, for streams to follow: ("node",
+    address, hop) and ("link", funder, funded, hop), in the order they were
+    found. The log is kept until the analysis ends, so a stream that joins
+    midway replays what it missed before following the rest. `attached` is
+    set once an analysis writes to it; a stream that registered a log after
+    the analysis had finished gets a closed, unattached one.
+    """
+
+    def __init__(self):
+        self.log: List[tuple] = []
+        self.closed = False
+        self.attached = False
+        self._changed = asyncio.Event()
+
+    def node(self, address: str, hop: int) -> None:
+        self._append(("node", address, hop))
+
+    def link(self, funder_address: str, funded: str, hop: int) -> None:
+        self._append(("link", funder_address, funded, hop))
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _append(self, event: tuple) -> None:
+        self.log.append(event)
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[tuple]:
+        sent = 0
+        while True:
+            while sent < len(self.log):
+                yield self.log[sent]
+                sent += 1
+            if self.closed:
+                return
+            await self._changed.wait()
+
+# Events of the cached analyses running now, by policy_id (see stream_bundle)
+_running: Dict[str, GraphEvents] = {}
+
+def _events_for(policy_id: str) -> GraphEvents:
+    events = _running.get(policy_id)
+    if events is None or events.closed:
+        events = _running[policy_id] = GraphEvents()
+    return events
+
+def _release_events(policy_id: str, events: GraphEvents) -> None:
+    events.close()
+    if _running.get(policy_id) is events:
+        del _running[policy_id]
+
+async def _trace_funders(
+    client: httpx.AsyncClient,
+    addresses: List[str],
+    memo: Optional[FunderMemo] = None,
+    events: Optional[GraphEvents] = None,
+) -> List[Optional[str]]:
+    """
+    Returns the funder of each address, in the same order as `addresses`.
+    Known funders come from the permanent address index; the rest are traced
+    concurrently (the Blockfrost scheduler bounds the actual load) and added to it.
+    Each funder -> address link is sent to `events` as soon as it is known.
+    """
+    funders = {}
+    async for address, funder_address in _iter_funders(client, addresses, memo):
+        funders[address] = funder_address
+        if events is not None and funder_address:
+            events.link(funder_address, address, 1)
+    return [funders[address] for address in addresses]
+
+async def _iter_funders(
+    client: httpx.AsyncClient, addresses: List[str], memo: Optional[FunderMemo] = None,
+) -> AsyncIterator[Tuple[str, Optional[str]]]:
+    """
+    Yields (address, funder) for each distinct address as soon as it is known:
+    index hits first, then Blockfrost lookups in completion order. Resolved
+    lookups are written to the index when the iteration ends, also if the
+    consumer stops early (outstanding lookups are then cancelled).
+    """
+    known = await pool.read(fetch_funders, addresses)
+    unknown = list(dict.fromkeys(address for address in addresses if address not in known))
+    if memo is not None:
+        memo.index_hits += len(addresses) - len(unknown)
+    for address, funder in known.items():
+        yield address, funder
+    if not unknown:
+        return
+
+    resolve = memo.trace if memo is not None else _resolve_funder
+
+    async def lookup(address: str) -> Tuple[str, FunderLookup]:
+        return address, await resolve(client, address)
+
+    tasks = [asyncio.ensure_future(lookup(address)) for address in unknown]
+    resolved: List[Tuple[str, FunderLookup]] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            address, result = await next_done
+            resolved.append((address, result))
+            yield address, result.funder
+    finally:
+        for task in tasks:
+            task.cancel()
+        rows = [(address, result.first_tx_hash, result.funder) for address, result in resolved if result.final]
+        if rows:
+            await pool.write(upsert_funders, rows)
+
+async def _trace_upstream(
+    client: httpx.AsyncClient,
+    addresses: List[str],
+    funders: List[Optional[str]],
+    max_hops: int,
+    budget: int,
+    memo: Optional[FunderMemo] = None,
+) -> List[Tuple[str, str, int]]:
+    """
+    Walks funders-of-funders breadth-first from the direct (hop 1) funders, up to
+    `max_hops`. Returns (funder, funded, hop) edges for hops >= 2.
+
+    Each address is expanded once (global visited set, so rings terminate), every
+    frontier is traced concurrently, and indexed funders cost nothing. Addresses
+    not in the index are charged 2 calls against `budget`; once it runs out the
+    rest of the frontier is left unexpanded.
+    """
+    visited = set(addresses)
+    frontier = []
+    for funder_address in funders:
+        if funder_address and funder_address not in visited:
+            visited.add(funder_address)
+            frontier.append(funder_address)
+
+    edges: List[Tuple[str, str, int]] = []
+    for hop in range(2, max_hops + 1):
+        if not frontier:
+            break
+        known = await pool.read(fetch_funders, frontier)
+        affordable = max(0, budget) // 2
+        expand = []
+        for address in frontier:
+            if address in known:
+                expand.append(address)
+            elif affordable > 0:
+                expand.append(address)
+                affordable -= 1
+                budget -= 2
+        if len(expand) < len(frontier):
+            logger.info(f"Funder BFS call budget exhausted at hop {hop}: {len(frontier) - len(expand)} addresses not expanded")
+
+        next_frontier = []
+        for address, funder_address in zip(expand, await _trace_funders(client, expand, memo)):
+            if not funder_address:
+                continue
+            edges.append((funder_address, address, hop))
+            if funder_address not in visited:
+                visited.add(funder_address)
+                next_frontier.append(funder_address)
+        frontier = next_frontier
+    return edges
+
+@traced("bundle.cache_read")
+async def _cached_bundle(policy_id: str) -> Tuple[Optional[BundleAnalysisResult], bool]:
+    """
+    (cached result, is_stale): in-process tier first, then SQLite.
+    Rows older than the fresh + max-stale window count as misses.
+    """
+    entry = bundle_cache.get_entry(policy_id)
+    if entry is not None:
+        cached, written_at = entry
+        state = cache_state(written_at)
+        if state != EXPIRED:
+            cache_lookups.labels("bundle", "memory", "stale" if state == STALE else "hit").inc()
+            return cached, state == STALE
+    cache_lookups.labels("bundle", "memory", "miss").inc()
+
+    cached = await pool.read(fetch_bundle, policy_id)
+    if cached is not None:
+        state = cache_state(cached.timestamp)
+        if state != EXPIRED:
+            # Keep the decoded object for the next reads
+            bundle_cache.set(policy_id, cached, cached.timestamp)
+            cache_lookups.labels("bundle", "sqlite", "stale" if state == STALE else "hit").inc()
+            return cached, state == STALE
+    cache_lookups.labels("bundle", "sqlite", "miss").inc()
+    return None, False
+
+async def cached_at(policy_id: str) -> Optional[datetime]:
+    """When the cached bundle for `policy_id` was computed, or None (for the warm-up scheduler)."""
+    entry = bundle_cache.peek(policy_id)
+    if entry is not None:
+        return entry[1]
+    return await pool.read(fetch_bundle_timestamp, policy_id)
+
+def _serve_stale(cached: BundleAnalysisResult, refresh) -> BundleAnalysisResult:
+    """Starts one background refresh for the policy and returns the stale copy, flagged."""
+    if not breaker.is_open:
+        flights.start(("bundle", cached.policy_id), refresh)
+    metrics.stale_served += 1
+    return cached.model_copy(update={"stale": True})
+
+async def _degraded_bundle(policy_id: str) -> BundleAnalysisResult:
+    """
+    Served while the Blockfrost circuit is open: the last stored bundle whatever
+    its age (flagged stale), else an empty result. Both are flagged `degraded`.
+    """
+    metrics.degraded += 1
+    cached = await pool.read(fetch_bundle, policy_id)
+    if cached is not None:
+        return cached.model_copy(update={"stale": True, "degraded": True})
+    return BundleAnalysisResult(policy_id=policy_id, nodes=[], links=[], degraded=True)
 
 async def analyze_bundle(policy_id: str) -> BundleAnalysisResult:
     """
     Analyzes a token bundle to identify insider trading clusters.
-    Uses SQLite cache if available and fresh (< 24h).
+    Uses the cache if fresh (< 24h); a stale row is returned immediately
+    (flagged `stale`) while a refresh runs in the background.
     """
-    # 1. Check Cache
-    cached_data = fetch_bundle(policy_id)
-    if cached_data:
-        # Check timestamp
-        try:
-            ts_str = cached_data.get("timestamp")
-            if ts_str:
-                cached_ts = datetime.fromisoformat(ts_str)
-                if datetime.utcnow() - cached_ts < timedelta(hours=24):
-                    # Cache hit and fresh
-                    # Reconstruct object from dict
-                    return BundleAnalysisResult(**cached_data)
-        except Exception:
-            pass # Ignore cache errors, proceed to fetch
-
-    # 2. Initialize Result (Default Empty)
+    with span("analyze_bundle", policy_id=policy_id) as current:
+        # 1. Check Cache
+        cached, stale = await _cached_bundle(policy_id)
+        if cached is not None:
+            current.set("cache", "stale" if stale else "hit")
+            if stale:
+                return _serve_stale(cached, lambda: _analyze_uncached(policy_id))
+            return cached
+
+        # 2. Blockfrost unhealthy: fail fast instead of waiting on retries
+        if breaker.is_open and BLOCKFROST_PROJECT_ID:
+            current.set("degraded", True)
+            return await _degraded_bundle(policy_id)
+
+        # 3. Coalesce concurrent misses for the same policy into one analysis
+        current.set("cache", "miss")
+        return await flights.do(("bundle", policy_id), lambda: _analyze_uncached(policy_id))
+
+@track_in_flight("bundle")
+async def _analyze_uncached(policy_id: str, memo: Optional[FunderMemo] = None) -> BundleAnalysisResult:
+    # Initialize Result (Default Empty)
     result = BundleAnalysisResult(
         policy_id=policy_id,
         nodes=[],
@@ -74,85 +387,514 @@ async def analyze_bundle(policy_id: str) -> BundleAnalysisResult:
         # Graceful exit if no key
         return result
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        # 3. Fetch Top Holders
-        # /assets/{policy_id}/addresses?count=20&order=desc
-        holders_data = await _bf_get(client, f"/assets/{policy_id}/addresses", params={"count": 20, "order": "desc"})
-        
-        if not holders_data:
+    # Shared pooled client (keep-alive across analyses), closed by the app lifespan
+    client = get_client()
+    # A stream may have registered them already, while this analysis was starting
+    events = _events_for(policy_id)
+    events.attached = True
+    # Registered until the result is stored, so streams joining meanwhile still follow this log
+    try:
+        try:
+            graph = await _trace_bundle(client, policy_id, memo, events)
+        except BlockfrostUnavailable as e:
+            # A lookup failed, so the graph would be missing edges: serve the last stored
+            # bundle (or an empty one) flagged degraded, and leave the cache as it is
+            logger.warning(f"Bundle analysis of {policy_id} incomplete, Blockfrost unavailable: {e}")
+            return await _degraded_bundle(policy_id)
+        if graph is None:
             return result
 
-        G = nx.DiGraph()
+        with span("bundle.score_graph", holders=len(graph[0])):
+            _score_graph(result, *graph)
+
+        # 7. Persist
+        await pool.write(upsert_bundle, result)
+
+        return result
+    finally:
+        _release_events(policy_id, events)
+
+async def _trace_bundle(
+    client: httpx.AsyncClient,
+    policy_id: str,
+    memo: Optional[FunderMemo] = None,
+    events: Optional[GraphEvents] = None,
+):
+    """
+    Holders, their funders and the rest of _score_graph's arguments for
+    `policy_id`, or None if it has no holders. Raises BlockfrostUnavailable
+    if any lookup failed. Nodes and links are sent to `events` as found.
+    """
+    snapshot = await pool.read(fetch_snapshot, policy_id)
+    previous = snapshot.holders if snapshot is not None else {}
+    total_supply = snapshot.total_supply if snapshot is not None else None
+    supply_at = snapshot.supply_at if snapshot is not None else None
+    # Cluster supply shares are of the whole supply, not of the top 20's balances
+    supply_due = supply_at is None or datetime.utcnow() - supply_at >= BUNDLE_SUPPLY_MAX_AGE
+
+    # 3. Fetch Top Holders
+    # /assets/{policy_id}/addresses?count=20&order=desc
+    holders_call = _bf_get(client, f"/assets/{policy_id}/addresses", params={"count": 20, "order": "desc"})
+    supply = None
+    if supply_due:
+        holders_data, supply = await asyncio.gather(holders_call, _total_supply(client, policy_id))
+    else:
+        holders_data = await holders_call
+    if memo is not None:
+        memo.blockfrost_calls += 2 if supply_due else 1
+
+    if not holders_data:
+        return None
+
+    addresses = [holder.get("address") for holder in holders_data if holder.get("address")]
+    quantities = [parse_quantity(holder) for holder in holders_data if holder.get("address")]
+
+    # Holders changed (mints and burns move them too): fetch the supply alongside the tracing
+    refetch = None
+    if not supply_due and set(addresses) != set(previous):
+        refetch = asyncio.ensure_future(_total_supply(client, policy_id))
+        if memo is not None:
+            memo.blockfrost_calls += 1
+    try:
+        funders, upstream = await _trace_holders(client, addresses, previous, memo, events)
+        if refetch is not None:
+            supply = await refetch
+    finally:
+        if refetch is not None:
+            refetch.cancel()
+    # A failed lookup keeps the stored figure, and is retried on the next refresh
+    if supply is not None:
+        total_supply, supply_at = supply, datetime.utcnow()
+    await pool.write(upsert_snapshot, policy_id, HolderSnapshot(dict(zip(addresses, funders)), total_supply, supply_at))
+
+    return addresses, funders, upstream, quantities, total_supply
+
+async def _trace_holders(
+    client: httpx.AsyncClient,
+    addresses: List[str],
+    previous: Dict[str, Optional[str]],
+    memo: Optional[FunderMemo] = None,
+    events: Optional[GraphEvents] = None,
+):
+    """(funders, upstream) of the holders, reusing the funders `previous` knows."""
+    # 4. Find Funders: diff against the previous holder snapshot, so only holders that
+    #    appeared since (or whose funder is still unknown) are traced; departed ones drop out
+    to_trace = [address for address in addresses if not previous.get(address)]
+    if events is not None:
+        for address in addresses:
+            events.node(address, 0)
+        for address in addresses:
+            if previous.get(address):
+                events.link(previous[address], address, 1)
+    # Concurrently, bounded by the Blockfrost scheduler
+    resolved = {}
+    if to_trace:
+        with span("bundle.trace_funders", addresses=len(to_trace), known=len(addresses) - len(to_trace)):
+            resolved = dict(zip(to_trace, await _trace_funders(client, to_trace, memo, events)))
+    funders = [previous.get(address) or resolved.get(address) for address in addresses]
+
+    # 5. Optionally follow the funding chain further up (sybil rings behind intermediaries)
+    upstream = []
+    if BUNDLE_FUNDER_HOPS > 1:
+        with span("bundle.trace_upstream", hops=BUNDLE_FUNDER_HOPS):
+            upstream = await _trace_upstream(client, addresses, funders, BUNDLE_FUNDER_HOPS, BUNDLE_HOP_CALL_BUDGET, memo)
+        if events is not None:
+            for funder_address, funded, hop in upstream:
+                events.link(funder_address, funded, hop)
+
+    return funders, upstream
+
+MASTER_MIN_OUT_DEGREE = 4  # funded more than 3 of the addresses in the graph
+MASTER_COLOR = "#ff0055"
+# Without the asset's total supply, cluster shares are of the analyzed holders only, where
+# any two top holders sharing a funder (an exchange hot wallet, say) can make up 100%:
+# that part of the score is capped at two masters' worth
+ANALYZED_SHARE_MAX_RISK = 40
+VICTIM_COLOR = "#00ff88"
+
+def _build_graph(
+    addresses: List[str],
+    funders: List[Optional[str]],
+    upstream: List[Tuple[str, str, int]] = (),
+) -> CompactGraph:
+    # Build the graph in holder order so node/edge order matches a sequential walk
+    G = CompactGraph()
+    for address, funder_address in zip(addresses, funders):
+        # Holder node, then edge Funder -> Holder
+        G.add_node(address, hop=0)
+        if funder_address:
+            G.add_edge(funder_address, address, hop=1)
+    for funder_address, funded, hop in upstream:
+        G.add_edge(funder_address, funded, hop=hop)
+    return G.freeze()
+
+def _score_graph(
+    result: BundleAnalysisResult,
+    addresses: List[str],
+    funders: List[Optional[str]],
+    upstream: List[Tuple[str, str, int]] = (),
+    quantities: Optional[List[float]] = None,
+    total_supply: Optional[float] = None,
+) -> None:
+    """
+    Builds the funder -> holder graph (plus any multi-hop `upstream` edges)
+    and fills in nodes, links, clusters and risk_score. `quantities` are the
+    holders' balances and `total_supply` the asset's quantity, used for the
+    supply-weighted part of the score.
+    """
+    G = _build_graph(addresses, funders, upstream)
+    _fill_result(result, G, *_risk(G, addresses, quantities, total_supply))
+
+def _fill_result(result: BundleAnalysisResult, G: CompactGraph, masters, scores, risk_score: int) -> None:
+    result.nodes = [
+        GraphNode(id=label, group="master" if is_master else "victim",
+                  color=MASTER_COLOR if is_master else VICTIM_COLOR, hop=hop)
+        for label, is_master, hop in zip(G.labels, masters.tolist(), G.node_hops.tolist())
+    ]
+    result.links = [GraphLink(source=source, target=target, hop=hop) for source, target, hop in G.edges()]
+    result.clusters = scores.clusters
+    result.funder_hhi = scores.funder_hhi
+    result.funder_gini = scores.funder_gini
+    result.risk_score = risk_score
+    result.timestamp = datetime.utcnow()
+
+def _risk(
+    G: CompactGraph,
+    addresses: List[str],
+    quantities: Optional[List[float]] = None,
+    total_supply: Optional[float] = None,
+):
+    """(master mask, cluster scores, risk_score) for a frozen funder graph."""
+    # A node that funded > 3 others is a master (it may be a holder too)
+    masters = G.out_degree() >= MASTER_MIN_OUT_DEGREE
+    scores = score_clusters(G, masters, addresses, quantities, total_supply)
+    # risk_score: 20 per master, or the supply share (%) of the largest funded cluster if higher
+    share_risk = round(100 * scores.top_cluster_share)
+    if total_supply is None:
+        share_risk = min(share_risk, ANALYZED_SHARE_MAX_RISK)
+    risk_score = min(100, max(int(masters.sum()) * 20, share_risk))
+    return masters, scores, risk_score
+
+def _score_graph_nx(
+    result: BundleAnalysisResult,
+    addresses: List[str],
+    funders: List[Optional[str]],
+    upstream: List[Tuple[str, str, int]] = (),
+) -> None:
+    """
+    The original networkx implementation of _score_graph, kept as the
+    reference the compact graph is tested against.
+    """
+    import networkx as nx
+
+    # Build the graph in holder order so node/edge order matches a sequential walk
+    G = nx.DiGraph()
+    for address, funder_address in zip(addresses, funders):
+        # Add holder node
+        G.add_node(address, type="holder", hop=0)
+        if funder_address:
+            # Add edge Funder -> Holder
+            G.add_edge(funder_address, address, hop=1)
+            G.nodes[funder_address].setdefault("hop", 1)
+    for funder_address, funded, hop in upstream:
+        G.add_edge(funder_address, funded, hop=hop)
+        G.nodes[funder_address].setdefault("hop", hop)
+
+    # 5. Analyze Graph
+    nodes_list = []
+    links_list = []
+    masters_count = 0
+
+    # Calculate degrees
+    out_degrees = dict(G.out_degree())
+    
+    for node in G.nodes():
+        # Determine group and color
+        # If out_degree > 3: group "master", color #ff0055
+        # Else group "victim", color #00ff88
+        
+        # Note: A node might be both a funder and a holder. 
+        # Logic implies if it funded > 3 others, it's a master.
         
-        # Process holders concurrently? Or sequential for simplicity/rate-limits?
-        # Sequential is safer for rate limits unless we have a paid plan.
-        # Let's do sequential for safety as per requirements implication.
+        degree = out_degrees.get(node, 0)
+        if degree > 3:
+            group = "master"
+            color = "#ff0055"
+            masters_count += 1
+        else:
+            group = "victim"
+            color = "#00ff88"
         
+        nodes_list.append(GraphNode(id=node, group=group, color=color, hop=G.nodes[node].get("hop", 0)))
+
+    for source, target, hop in G.edges(data="hop"):
+        links_list.append(GraphLink(source=source, target=target, hop=hop))
+
+    # 6. Calculate Risk Score
+    # risk_score: min(100, masters_count * 20)
+    risk_score = min(100, masters_count * 20)
+
+    # Update Result
+    result.nodes = nodes_list
+    result.links = links_list
+    result.risk_score = risk_score
+    result.timestamp = datetime.utcnow()
+
+async def iter_holders(client: httpx.AsyncClient, policy_id: str, limit: int) -> AsyncIterator[List[Tuple[str, float]]]:
+    """
+    Yields (address, quantity) holders one page at a time, largest first, until
+    `limit` holders or the last page. Addresses that move between pages while
+    paging are yielded once.
+    """
+    seen = set()
+    page = 1
+    while len(seen) < limit:
+        holders_data = await _bf_get(
+            client, f"/assets/{policy_id}/addresses",
+            params={"count": HOLDERS_PAGE_SIZE, "page": page, "order": "desc"},
+        )
+        if not holders_data:
+            return
+        holders = []
         for holder in holders_data:
             address = holder.get("address")
-            if not address:
-                continue
-                
-            # Add holder node
-            G.add_node(address, type="holder")
-
-            # 4. Find Funder
-            # /addresses/{addr}/transactions?order=asc&count=1 (First tx ever)
-            txs = await _bf_get(client, f"/addresses/{address}/transactions", params={"order": "asc", "count": 1})
-            
-            if txs and len(txs) > 0:
-                first_tx_hash = txs[0].get("tx_hash")
-                if first_tx_hash:
-                    # Get UTXOs to find input address
-                    # /txs/{tx_hash}/utxos
-                    utxos = await _bf_get(client, f"/txs/{first_tx_hash}/utxos")
-                    if utxos and "inputs" in utxos and len(utxos["inputs"]) > 0:
-                        funder_address = utxos["inputs"][0].get("address")
-                        if funder_address:
-                            # Add edge Funder -> Holder
-                            G.add_edge(funder_address, address)
-
-        # 5. Analyze Graph
-        nodes_list = []
-        links_list = []
-        masters_count = 0
-
-        # Calculate degrees
-        out_degrees = dict(G.out_degree())
-        
-        for node in G.nodes():
-            # Determine group and color
-            # If out_degree > 3: group "master", color #ff0055
-            # Else group "victim", color #00ff88
-            
-            # Note: A node might be both a funder and a holder. 
-            # Logic implies if it funded > 3 others, it's a master.
-            
-            degree = out_degrees.get(node, 0)
-            if degree > 3:
-                group = "master"
-                color = "#ff0055"
-                masters_count += 1
-            else:
-                group = "victim"
-                color = "#00ff88"
-            
-            nodes_list.append(GraphNode(id=node, group=group, color=color))
-
-        for source, target in G.edges():
-            links_list.append(GraphLink(source=source, target=target))
-
-        # 6. Calculate Risk Score
-        # risk_score: min(100, masters_count * 20)
-        risk_score = min(100, masters_count * 20)
-
-        # Update Result
-        result.nodes = nodes_list
-        result.links = links_list
-        result.risk_score = risk_score
-        result.timestamp = datetime.utcnow()
+            if address and address not in seen and len(seen) < limit:
+                seen.add(address)
+                holders.append((address, parse_quantity(holder)))
+        if holders:
+            yield holders
+        if len(holders_data) < HOLDERS_PAGE_SIZE:
+            return
+        page += 1
 
-        # 7. Persist
-        upsert_bundle(result)
+async def _prefetched_pages(client: httpx.AsyncClient, policy_id: str, limit: int) -> AsyncIterator[List[Tuple[str, float]]]:
+    """
+    iter_holders with a background fetcher: page N+1 is requested while the
+    consumer traces page N (at most BUNDLE_DEEP_PREFETCH_PAGES buffered).
+    """
+    pages: asyncio.Queue = asyncio.Queue(maxsize=BUNDLE_DEEP_PREFETCH_PAGES)
 
+    async def fetch_pages():
+        try:
+            async for page in iter_holders(client, policy_id, limit):
+                await pages.put(page)
+        except asyncio.CancelledError:
+            raise
+        except BlockfrostUnavailable as e:
+            # Raised in the consumer: the holder list is incomplete
+            await pages.put(e)
+            return
+        except Exception as e:
+            logger.error(f"Holder paging failed for {policy_id}: {e}")
+        await pages.put(None)
+
+    fetcher = asyncio.create_task(fetch_pages())
+    try:
+        while (page := await pages.get()) is not None:
+            if isinstance(page, BlockfrostUnavailable):
+                raise page
+            yield page
+    finally:
+        fetcher.cancel()
+
+@track_in_flight("bundle_deep")
+async def analyze_bundle_deep(
+    policy_id: str,
+    limit: int = BUNDLE_DEEP_MAX_HOLDERS,
+    progress: Optional[Callable[[int], None]] = None,
+    events: Optional[GraphEvents] = None,
+) -> BundleAnalysisResult:
+    """
+    Like analyze_bundle, but over the top `limit` holders instead of 20.
+    Holder pages stream into funder tracing as they arrive (at most
+    BUNDLE_DEEP_PREFETCH_PAGES buffered); only address/funder pairs are kept.
+    `progress` is called with the number of holders traced after each page,
+    and `events` (closed at the end) gets nodes and links as they are found.
+    Deep results are not cached; repeat runs are served by the funder index.
+    If Blockfrost fails midway, what was traced so far is scored and flagged
+    `degraded`.
+    """
+    result = BundleAnalysisResult(
+        policy_id=policy_id,
+        nodes=[],
+        links=[],
+        risk_score=0,
+        timestamp=datetime.utcnow()
+    )
+
+    if not BLOCKFROST_PROJECT_ID:
+        if events is not None:
+            events.close()
+        return result
+
+    client = get_client()
+    addresses: List[str] = []
+    quantities: List[float] = []
+    funders: List[Optional[str]] = []
+    # Fetched while the holder pages are traced
+    supply = asyncio.ensure_future(_total_supply(client, policy_id))
+    total_supply = None
+    try:
+        async for page in _prefetched_pages(client, policy_id, limit):
+            page_addresses = [address for address, _ in page]
+            if events is not None:
+                for address in page_addresses:
+                    events.node(address, 0)
+            funders.extend(await _trace_funders(client, page_addresses, events=events))
+            addresses.extend(page_addresses)
+            quantities.extend(quantity for _, quantity in page)
+            logger.info(f"Deep bundle analysis {policy_id}: {len(addresses)} holders traced")
+            if progress is not None:
+                progress(len(addresses))
+        total_supply = await supply
+    except BlockfrostUnavailable as e:
+        logger.warning(f"Deep bundle analysis of {policy_id} incomplete, Blockfrost unavailable: {e}")
+        metrics.degraded += 1
+        result.degraded = True
+    finally:
+        supply.cancel()
+        if events is not None:
+            events.close()
+
+    _score_graph(result, addresses, funders, quantities=quantities, total_supply=total_supply)
     return result
+
+def _stream_node(seen: set, address: str, hop: int):
+    if address not in seen:
+        seen.add(address)
+        yield "node", GraphNode(id=address, group="victim", color=VICTIM_COLOR, hop=hop)
+
+def _stream_edge(seen: set, funder_address: str, funded: str, hop: int):
+    yield from _stream_node(seen, funder_address, hop)
+    yield "link", GraphLink(source=funder_address, target=funded, hop=hop)
+
+def _score_event(result: BundleAnalysisResult, cached: bool):
+    return "score", BundleScore(
+        policy_id=result.policy_id,
+        risk_score=result.risk_score,
+        timestamp=result.timestamp,
+        masters=[node.id for node in result.nodes if node.group == "master"],
+        clusters=result.clusters,
+        funder_hhi=result.funder_hhi,
+        funder_gini=result.funder_gini,
+        holders=sum(1 for node in result.nodes if node.hop == 0),
+        nodes=len(result.nodes),
+        links=len(result.links),
+        cached=cached,
+        stale=result.stale,
+        degraded=result.degraded,
+    )
+
+def _graph_events(result: BundleAnalysisResult):
+    for node in result.nodes:
+        yield "node", node
+    for link in result.links:
+        yield "link", link
+
+def _replay(result: BundleAnalysisResult, cached: bool):
+    yield from _graph_events(result)
+    yield _score_event(result, cached)
+
+async def stream_bundle(policy_id: str, limit: int = BUNDLE_TOP_HOLDERS) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    The bundle analysis as a stream of ("node", GraphNode) and ("link", GraphLink)
+    events followed by one ("score", BundleScore). Holders are sent a page at a
+    time and each funder link as soon as its lookup resolves, so the first
+    events arrive after a single holders call. Masters are only known once the
+    graph is complete; their nodes are sent again (group "master") just before
+    the score, and a later node event replaces an earlier one with the same id.
+
+    With the default limit the analysis is the cached one: a cached result is
+    replayed (stale rows refresh in the background), otherwise the stream
+    follows the coalesced analysis of the policy, the one /analyze/bundle,
+    refreshes and other streams share. Larger limits follow an
+    analyze_bundle_deep run of their own, which is not cached.
+    """
+    cacheable = limit == BUNDLE_TOP_HOLDERS
+    if cacheable:
+        cached, stale = await _cached_bundle(policy_id)
+        if cached is not None:
+            if stale:
+                cached = _serve_stale(cached, lambda: _analyze_uncached(policy_id))
+            for event in _replay(cached, cached=True):
+                yield event
+            return
+    if not BLOCKFROST_PROJECT_ID:
+        for event in _replay(BundleAnalysisResult(policy_id=policy_id, nodes=[], links=[]), cached=False):
+            yield event
+        return
+    if breaker.is_open:
+        degraded = await _degraded_bundle(policy_id) if cacheable else \
+            BundleAnalysisResult(policy_id=policy_id, nodes=[], links=[], degraded=True)
+        for event in _replay(degraded, cached=False):
+            yield event
+        return
+
+    if cacheable:
+        analysis = flights.join(("bundle", policy_id), lambda: _analyze_uncached(policy_id))
+        # The analysis picks up the same object once it runs (or already has)
+        events = _events_for(policy_id)
+        # Also ends the stream if the analysis fails (or had finished) before it gets to them
+        analysis.add_done_callback(lambda _: _release_events(policy_id, events))
+    else:
+        events = GraphEvents()
+        events.attached = True
+        analysis = asyncio.ensure_future(analyze_bundle_deep(policy_id, limit, events=events))
+
+    # Not the decorator: the gauge has to cover the consumer's pace too
+    in_flight = analyses_in_flight.labels("bundle_stream")
+    in_flight.inc()
+    try:
+        seen: set = set()
+        async with aclosing(events.follow()) as found:
+            async for kind, *event in found:
+                for out in (_stream_node(seen, *event) if kind == "node" else _stream_edge(seen, *event)):
+                    yield out
+        # Shielded: a cached analysis may have other callers
+        result = await asyncio.shield(analysis)
+    finally:
+        if not cacheable:
+            analysis.cancel()
+        in_flight.dec()
+
+    if not events.attached:
+        # Joined as the analysis returned, after it let go of its log: send its graph instead
+        for event in _graph_events(result):
+            yield event
+    elif not result.degraded:
+        for node in result.nodes:
+            if node.group == "master":
+                yield "node", node
+    yield _score_event(result, cached=False)
+
+async def analyze_bundles(policy_ids: List[str]) -> BundleBatchResult:
+    """
+    Analyzes several policies together. Holders shared between policies (common
+    with tokens from the same deployer) have their funder resolved only once.
+    """
+    policy_ids = list(dict.fromkeys(policy_ids))
+    memo = FunderMemo()
+    cached_count = 0
+
+    async def one(policy_id: str) -> BundleAnalysisResult:
+        nonlocal cached_count
+        cached, stale = await _cached_bundle(policy_id)
+        if cached is not None:
+            cached_count += 1
+            if stale:
+                return _serve_stale(cached, lambda: _analyze_uncached(policy_id, memo))
+            return cached
+        if breaker.is_open and BLOCKFROST_PROJECT_ID:
+            return await _degraded_bundle(policy_id)
+        return await flights.do(("bundle", policy_id), lambda: _analyze_uncached(policy_id, memo))
+
+    results = await asyncio.gather(*(one(policy_id) for policy_id in policy_ids))
+    stats = BundleBatchStats(
+        policies=len(policy_ids),
+        cached=cached_count,
+        blockfrost_calls=memo.blockfrost_calls,
+        calls_saved=memo.calls_saved,
+        shared_addresses=memo.hits,
+        indexed_addresses=memo.index_hits,
+    )
+    return BundleBatchResult(results=list(results), stats=stats)
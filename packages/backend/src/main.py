@@ -1,6 +1,9 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-import os, time
+from fastapi.responses import StreamingResponse, Response
+import os, json, logging
+from typing import Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -8,13 +11,44 @@ from dotenv import load_dotenv
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
 load_dotenv(env_path)
 
-from .models import BundleRequest, BundleAnalysisResult
-from .insider_engine import analyze_bundle
+from .models import BundleRequest, BundleAnalysisResult, XrayBatchRequest, BundleBatchRequest, BundleBatchResult
+from .insider_engine import (
+    analyze_bundle, analyze_bundles, analyze_bundle_deep, stream_bundle, BUNDLE_DEEP_MAX_HOLDERS, BUNDLE_TOP_HOLDERS,
+)
 from . import mpm_routes
 from .masumi_naughty import routes as masumi_naughty_routes
-from .xray_engine import analyze_policy
+from .xray_engine import analyze_policy, analyze_policies, metrics
+from . import blockfrost_client, storage
+from .warmup import warmup, WARMUP_ENABLED, XRAY, BUNDLE
+from .telemetry import registry, MetricsMiddleware, CONTENT_TYPE
+from . import tracing
+from .tracing import TracingMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema migrations for both databases, once, before serving
+    storage.migrate()
+    # One pooled Blockfrost client for the app lifetime (shared by xray + insider engines)
+    await blockfrost_client.start_client()
+    # Keeps hot policies cached ahead of expiry
+    if WARMUP_ENABLED:
+        warmup.start()
+    try:
+        yield
+    finally:
+        await warmup.stop()
+        await blockfrost_client.close_client()
+        # Finish queued writes before exit
+        storage.close()
+        if tracing.exporter is not None:
+            tracing.exporter.close()
+
+logger = logging.getLogger(__name__)
+
+XRAY_BATCH_MAX = int(os.getenv("XRAY_BATCH_MAX", "500"))
+BUNDLE_BATCH_MAX = int(os.getenv("BUNDLE_BATCH_MAX", "50"))
 
-app = FastAPI(title="NexGuard Bundle Inspector", version="0.2")
+app = FastAPI(title="NexGuard Bundle Inspector", version="0.2", lifespan=lifespan)
 
 origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
 app.add_middleware(
@@ -25,22 +59,124 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request span trees: Server-Timing, `?trace=1`, OTLP/JSON file export
+app.add_middleware(TracingMiddleware)
+# Per-route latency histograms, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(mpm_routes.router)
 app.include_router(masumi_naughty_routes.router)
 
 @app.get("/analyze/bundle/{policy_id}", response_model=BundleAnalysisResult)
 async def analyze_bundle_route(policy_id: str):
-    start = time.time()
     try:
         BundleRequest(policy_id=policy_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    warmup.record(BUNDLE, policy_id)
     try:
         result = await analyze_bundle(policy_id)
         return result
     except Exception:
         raise HTTPException(status_code=500, detail="bundle analysis failed")
 
+@app.get("/analyze/bundle/{policy_id}/deep", response_model=BundleAnalysisResult)
+async def analyze_bundle_deep_route(policy_id: str, limit: int = Query(1000, ge=1, le=BUNDLE_DEEP_MAX_HOLDERS)):
+    try:
+        BundleRequest(policy_id=policy_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await analyze_bundle_deep(policy_id, limit)
+    except Exception:
+        raise HTTPException(status_code=500, detail="bundle analysis failed")
+
+@app.get("/analyze/bundle/{policy_id}/stream")
+async def analyze_bundle_stream_route(
+    request: Request,
+    policy_id: str,
+    limit: int = Query(BUNDLE_TOP_HOLDERS, ge=1, le=BUNDLE_DEEP_MAX_HOLDERS),
+    format: Optional[str] = Query(None, pattern="^(ndjson|sse)$"),
+):
+    """
+    Streams the analysis as it runs: `node` and `link` events as holders and
+    funders are found, then a final `score` event (or `error`). NDJSON lines of
+    {"event", "data"} by default; Server-Sent Events with `format=sse` or
+    `Accept: text/event-stream`.
+    """
+    try:
+        BundleRequest(policy_id=policy_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit == BUNDLE_TOP_HOLDERS:
+        warmup.record(BUNDLE, policy_id)
+    sse = format == "sse" or (format is None and "text/event-stream" in request.headers.get("accept", ""))
+
+    def frame(event: str, data: str) -> str:
+        if sse:
+            return f"event: {event}\ndata: {data}\n\n"
+        return f'{{"event":"{event}","data":{data}}}\n'
+
+    async def events():
+        try:
+            async for event, model in stream_bundle(policy_id, limit):
+                yield frame(event, model.model_dump_json())
+        except Exception:
+            logger.exception(f"Streamed bundle analysis failed for {policy_id}")
+            yield frame("error", json.dumps({"detail": "bundle analysis failed"}))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Keep reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/analyze/bundle/batch", response_model=BundleBatchResult)
+async def analyze_bundle_batch_route(req: BundleBatchRequest):
+    if not req.policy_ids:
+        raise HTTPException(status_code=400, detail="policy_ids must not be empty")
+    if len(req.policy_ids) > BUNDLE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"at most {BUNDLE_BATCH_MAX} policy_ids per batch")
+    try:
+        for policy_id in req.policy_ids:
+            BundleRequest(policy_id=policy_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for policy_id in req.policy_ids:
+        warmup.record(BUNDLE, policy_id)
+    try:
+        return await analyze_bundles(req.policy_ids)
+    except Exception:
+        raise HTTPException(status_code=500, detail="bundle analysis failed")
+
 @app.get("/xray/{policy_id}")
 async def xray(policy_id: str):
+    warmup.record(XRAY, policy_id)
     return await analyze_policy(policy_id)
+
+@app.post("/xray/batch")
+async def xray_batch(req: XrayBatchRequest):
+    """Streams one NDJSON line per policy as each analysis finishes."""
+    if not req.policy_ids:
+        raise HTTPException(status_code=400, detail="policy_ids must not be empty")
+    if len(req.policy_ids) > XRAY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"at most {XRAY_BATCH_MAX} policy_ids per batch")
+    for policy_id in req.policy_ids:
+        warmup.record(XRAY, policy_id)
+
+    async def lines():
+        async for result in analyze_policies(req.policy_ids):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/health/blockfrost")
+async def blockfrost_health():
+    """Blockfrost resilience state: adaptive concurrency limit, 429 pauses, circuit breaker."""
+    return dict(blockfrost_client.stats(), degraded_served=metrics.degraded, stale_served=metrics.stale_served)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, Blockfrost, cache, SQLite and in-flight metrics."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
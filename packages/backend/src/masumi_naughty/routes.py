@@ -31,6 +31,7 @@ async def analyze_endpoint(req: AnalyzeRequest, key: str = Depends(verify_key)):
     return result
 
 from .db import fetch_naughty_wallet, update_onchain_tx
+from ..storage import audit as pool
 
 @router.get("/{wallet}")
 async def get_naughty_wallet(wallet: str, policy_id: Optional[str] = None):
@@ -46,7 +47,7 @@ async def get_naughty_wallet(wallet: str, policy_id: Optional[str] = None):
     if not policy_id:
         policy_id = "000policy" # Fallback for demo simplicity matching the curl example
         
-    rec = fetch_naughty_wallet(wallet, policy_id)
+    rec = await pool.read(fetch_naughty_wallet, wallet, policy_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Record not found")
     return rec
@@ -58,7 +59,7 @@ class ConfirmTxRequest(BaseModel):
 
 @router.post("/confirm-tx")
 async def confirm_tx_endpoint(req: ConfirmTxRequest, key: str = Depends(verify_key)):
-    success = update_onchain_tx(req.wallet, req.policy_id, req.tx_hash)
+    success = await pool.write(update_onchain_tx, req.wallet, req.policy_id, req.tx_hash)
     if not success:
         raise HTTPException(status_code=404, detail="Record not found to update")
     return {"status": "updated", "tx_hash": req.tx_hash}
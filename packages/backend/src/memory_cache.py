@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache sitting in front of a SQLite cache table.
+    Entries expire `ttl` after the timestamp of the row they mirror, so the
+    in-memory tier never serves anything the SQLite freshness rule would reject.
+    Values are stored as-is (already deserialized); callers must not mutate them.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: timedelta):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Sync DB helpers can be called from worker threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, datetime]]:
+        """Returns (value, timestamp of the mirrored row), so callers can judge staleness."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, timestamp, value = entry
+            if datetime.utcnow() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, timestamp
+
+    def peek(self, key: Hashable) -> Optional[Tuple[Any, datetime]]:
+        """Like get_entry, but leaves LRU order and hit/miss counters alone (for background jobs)."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or datetime.utcnow() >= entry[0]:
+            return None
+        return entry[2], entry[1]
+
+    def set(self, key: Hashable, value: Any, timestamp: Optional[datetime] = None) -> None:
+        """Stores `value`; `timestamp` is when the underlying row was written (default: now)."""
+        timestamp = timestamp or datetime.utcnow()
+        expires_at = timestamp + self.ttl
+        if self.maxsize <= 0 or datetime.utcnow() >= expires_at:
+            return
+        with self._lock:
+            self._data[key] = (expires_at, timestamp, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -23,10 +23,23 @@ class GraphNode(BaseModel):
     group: str
     color: str
     val: float = Field(default=1.0)
+    # Funding hops from the nearest holder: 0 = holder, 1 = direct funder, 2 = funder's funder...
+    hop: int = 0
 
 class GraphLink(BaseModel):
     source: str
     target: str
+    # Hop of the funding edge (1 = funder -> holder)
+    hop: int = 1
+
+class BundleCluster(BaseModel):
+    # Highest out-degree address in the cluster (usually the common funder)
+    funder: str
+    holders: int
+    # Share of the token's supply held by this cluster (0..1); of the analyzed
+    # holders' supply when the total supply could not be fetched
+    supply_share: float = 0.0
+    masters: int = 0
 
 class BundleAnalysisResult(BaseModel):
     policy_id: str
@@ -34,6 +47,32 @@ class BundleAnalysisResult(BaseModel):
     links: List[GraphLink]
     risk_score: int = Field(0, ge=0, le=100)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Connected clusters of >= 2 holders, largest supply share first
+    clusters: List[BundleCluster] = []
+    # Concentration of analyzed supply by direct funder
+    funder_hhi: float = 0.0
+    funder_gini: float = 0.0
+    # Served from an expired cache row while a background refresh runs
+    stale: bool = False
+    # Blockfrost circuit open: last cached row (any age) or an empty placeholder
+    degraded: bool = False
+
+class BundleScore(BaseModel):
+    """Final event of a streamed bundle analysis: everything but the node/link lists."""
+    policy_id: str
+    risk_score: int = Field(0, ge=0, le=100)
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Ids of master nodes (their node events were re-sent with group "master")
+    masters: List[str] = []
+    clusters: List[BundleCluster] = []
+    funder_hhi: float = 0.0
+    funder_gini: float = 0.0
+    holders: int = 0
+    nodes: int = 0
+    links: int = 0
+    cached: bool = False
+    stale: bool = False
+    degraded: bool = False
 
 class PolicyAnalysisResult(BaseModel):
     policy_id: str
@@ -44,3 +83,21 @@ class PolicyAnalysisResult(BaseModel):
     explanation: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     cached: bool = False
+
+class XrayBatchRequest(BaseModel):
+    policy_ids: List[str]
+
+class BundleBatchRequest(BaseModel):
+    policy_ids: List[str]
+
+class BundleBatchStats(BaseModel):
+    policies: int
+    cached: int
+    blockfrost_calls: int
+    calls_saved: int
+    shared_addresses: int
+    indexed_addresses: int = 0
+
+class BundleBatchResult(BaseModel):
+    results: List[BundleAnalysisResult]
+    stats: BundleBatchStats
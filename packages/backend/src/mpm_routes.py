@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from .mpm_db import fetch_mpm, upsert_mpm
+from .storage import audit as pool
 from .services.mpm_agent import analyze_mpm_for_token
 from .services.social_scraper import fetch_social_metrics
 
@@ -7,7 +8,7 @@ router = APIRouter(prefix="/api/mpm", tags=["mpm"])
 
 @router.get("/{policy_id}")
 async def get_mpm(policy_id: str):
-    rec = fetch_mpm(policy_id)
+    rec = await pool.read(fetch_mpm, policy_id)
     if not rec:
         raise HTTPException(status_code=404, detail="MPM not found")
     return rec
@@ -36,5 +37,6 @@ async def refresh_mpm(policy_id: str):
         "sampleSize": analysis["sampleSize"],
         "breakdown": recent_mentions, # Add breakdown data
     }
+    # Only buffers the row (write-behind), so no database I/O on the event loop
     upsert_mpm(record)
     return record
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    computation, everyone else arriving while it runs awaits the same result.
+    Keys are dropped once the computation finishes, so this is not a cache.
+    """
+
+    def __init__(self, metrics: Any = None):
+        self.metrics = metrics
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        task = self._calls.get(key)
+        return task is not None and not task.done()
+
+    def running(self) -> List[Hashable]:
+        """Keys whose computation is still running."""
+        return [key for key, task in list(self._calls.items()) if not task.done()]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Shield so one caller disconnecting doesn't cancel the work for the others
+        return await asyncio.shield(self.join(key, fn))
+
+    def join(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """
+        The running computation for `key`, or a new one started from `fn`, without
+        awaiting it: for callers that follow its progress before taking the result.
+        Callers must not cancel the task, other callers may be awaiting it.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            if self.metrics is not None:
+                self.metrics.coalesced_hits += 1
+            return task
+        task = loop.create_task(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Starts `fn` in the background unless a computation for `key` is already
+        running. Returns True if it started one. Used for background refreshes.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return False
+        # Run in an empty context: a background refresh outlives the request that
+        # triggered it and must not attach to its trace
+        task = contextvars.Context().run(loop.create_task, fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        task.add_done_callback(lambda t: self._log_failure(key, t))
+        return True
+
+    @staticmethod
+    def _log_failure(key: Hashable, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background refresh failed for {key}: {task.exception()}")
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
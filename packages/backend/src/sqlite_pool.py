@@ -0,0 +1,476 @@
+import os
+import queue
+import asyncio
+import sqlite3
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from contextlib import contextmanager
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from .telemetry import sqlite_seconds
+
+logger = logging.getLogger(__name__)
+
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Per-connection prepared statement cache (sqlite3's default is 128)
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+# Most queued writes committed together by the writer thread
+SQLITE_WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH", "64"))
+
+T = TypeVar("T")
+_STOP = object()
+
+# One schema step: SQL statements run in order, or a function given the writer connection
+Migration = Union[Sequence[str], Callable[[sqlite3.Connection], None]]
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections for one database file:
+    a single writer connection (serialized by a lock) and a bounded pool of
+    read-only reader connections. The file runs in WAL mode, so readers never
+    block on the writer. Connections live for the process lifetime, which keeps
+    sqlite3's per-connection statement cache warm across requests.
+
+    From async code, `read(fn, ...)` and `write(fn, ...)` run a blocking helper
+    off the event loop: reads on a thread pool sized to the reader connections,
+    writes on a single writer thread. The writer thread commits whatever has
+    queued up behind the previous commit as one transaction (group commit);
+    each write runs in its own savepoint, so one failing write doesn't undo the
+    others in its batch.
+
+    `migrations` are applied when the writer connection is first opened, so
+    once per process and before any reader exists; see `_migrate`.
+    """
+
+    def __init__(self, path: str, readers: int = 4, name: str | None = None, migrations: Sequence[Migration] = ()):
+        self.path = path
+        self.migrations = list(migrations)
+        self.schema_version: int | None = None
+        self.max_readers = max(1, readers)
+        self.name = name or Path(path).stem
+        self._write_seconds = sqlite_seconds.labels(self.name, "write")
+        self._read_seconds = sqlite_seconds.labels(self.name, "read")
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.Lock()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._writes: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._write_thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+        # Set on the writer thread while it holds a batch open
+        self._batch = threading.local()
+        self.batches = 0
+        self.batched_writes = 0
+        self._buffers: List["WriteBehind"] = []
+
+    def _configure(self, conn: sqlite3.Connection) -> sqlite3.Connection:
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # NORMAL is durable across application crashes in WAL mode; only an OS crash can lose the last commits
+        conn.execute("PRAGMA synchronous = NORMAL")
+        self._configure(conn)
+        try:
+            self._migrate(conn)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """
+        Brings the file's schema to len(migrations). The applied count is kept in
+        `PRAGMA user_version`; pending steps run in one IMMEDIATE transaction, so
+        concurrent processes apply them once and a failing step leaves the file
+        at its previous version.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for step in self.migrations[version:]:
+                if callable(step):
+                    step(conn)
+                else:
+                    for statement in step:
+                        conn.execute(statement)
+            if version < len(self.migrations):
+                # PRAGMA doesn't take bound parameters
+                conn.execute(f"PRAGMA user_version = {len(self.migrations)}")
+                logger.info(f"Migrated {self.name} schema from version {version} to {len(self.migrations)}")
+            elif version > len(self.migrations):
+                logger.warning(f"{self.name} schema is at version {version}, newer than this code ({len(self.migrations)})")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self.schema_version = max(version, len(self.migrations))
+
+    def migrate(self) -> int:
+        """Opens the writer (applying pending migrations) and returns the schema version."""
+        with self.writer():
+            pass
+        return self.schema_version
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        if self.path == ":memory:":
+            raise sqlite3.OperationalError("in-memory databases have no separate readers")
+        uri = Path(self.path).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+        return self._configure(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Exclusive access to the writer; commits on success, rolls back on error."""
+        batch = getattr(self._batch, "conn", None)
+        if batch is not None:
+            # Inside a write() batch: the batch commits, this only scopes a savepoint
+            batch.execute("SAVEPOINT write_job")
+            try:
+                yield batch
+            except BaseException:
+                batch.execute("ROLLBACK TO write_job")
+                raise
+            finally:
+                batch.execute("RELEASE write_job")
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect_writer()
+            start = time.perf_counter()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                self._write_seconds.observe(time.perf_counter() - start)
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a read-only connection, opening one lazily up to `max_readers`."""
+        if self.path == ":memory:":
+            with self.writer() as conn:
+                yield conn
+            return
+        conn = self._checkout_reader()
+        start = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            self._read_seconds.observe(time.perf_counter() - start)
+            # Don't hand a connection back mid-transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._readers_lock:
+            if len(self._all_readers) < self.max_readers:
+                # The writer creates the file (and switches it to WAL) before any reader opens it
+                if self._writer is None:
+                    with self.writer():
+                        pass
+                conn = self._connect_reader()
+                self._all_readers.append(conn)
+                return conn
+        return self._readers.get()
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        """Runs the blocking read helper `fn(*args)` on a reader thread."""
+        if self._executor is None:
+            with self._thread_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_readers, thread_name_prefix=f"sqlite-{self.name}-read")
+        # Copied context: spans opened by `fn` attach to the caller's trace
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, ctx.run, fn, *args)
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Queues the blocking write helper `fn(*args)` for the writer thread and
+        returns its result once the batch it ran in has committed. `fn` uses
+        `writer()` as usual.
+        """
+        self._ensure_write_thread()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._writes.put((fn, args, contextvars.copy_context(), loop, future))
+        return await future
+
+    def _ensure_write_thread(self) -> None:
+        if self._write_thread is not None and self._write_thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._write_thread is None or not self._write_thread.is_alive():
+                self._write_thread = threading.Thread(
+                    target=self._write_loop, name=f"sqlite-{self.name}-write", daemon=True,
+                )
+                self._write_thread.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            job = self._writes.get()
+            if job is _STOP:
+                return
+            batch = [job]
+            stop = False
+            while len(batch) < SQLITE_WRITE_BATCH:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                batch.append(job)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch) -> None:
+        outcomes = []
+        try:
+            with self.writer() as conn:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                self._batch.conn = conn
+                try:
+                    for fn, args, ctx, _, _ in batch:
+                        try:
+                            outcomes.append((True, ctx.run(fn, *args)))
+                        except Exception as e:
+                            outcomes.append((False, e))
+                finally:
+                    self._batch.conn = None
+        except Exception as e:
+            # The commit itself failed: nothing in the batch was stored
+            outcomes = [(False, e)] * len(batch)
+        self.batches += 1
+        self.batched_writes += len(batch)
+        for (_, _, _, loop, future), (ok, value) in zip(batch, outcomes):
+            try:
+                loop.call_soon_threadsafe(_settle, future, ok, value)
+            except RuntimeError:
+                pass  # the caller's loop has closed
+
+    def write_behind(self, table: str, columns: Sequence[str], key: Sequence[str],
+                     batch_size: int, interval: float) -> "WriteBehind":
+        """A WriteBehind buffer for `table`, flushed by close()."""
+        buffer = WriteBehind(self, table, columns, key, batch_size, interval)
+        self._buffers.append(buffer)
+        return buffer
+
+    def close(self) -> None:
+        """Finishes queued and buffered writes, then closes every connection."""
+        for buffer in self._buffers:
+            buffer.close()
+        with self._thread_lock:
+            thread, self._write_thread = self._write_thread, None
+            executor, self._executor = self._executor, None
+        if thread is not None and thread.is_alive():
+            self._writes.put(_STOP)
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._readers_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+            self._readers = queue.LifoQueue()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+def _settle(future: asyncio.Future, ok: bool, value: Any) -> None:
+    # The awaiting task may have been cancelled meanwhile
+    if future.done():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+class WriteBehind:
+    """
+    Buffers `INSERT OR REPLACE` rows for one table and stores them with a
+    single executemany transaction per flush, instead of one transaction per
+    row. A background thread flushes once `batch_size` rows are pending or
+    `interval` seconds after the oldest pending row; a newer row for the same
+    key replaces the pending one. `get` and `rows` serve rows that aren't
+    stored yet, so readers see their own writes, and `update` changes a row
+    that is still buffered. Rows still pending when the process dies are lost,
+    so `close()` (via ConnectionPool.close) must run on shutdown. With an
+    `interval` <= 0 the flusher stores rows as soon as they arrive; `put`
+    itself never writes, so it is safe to call on the event loop.
+
+    Lock order is the buffer's flush lock, then the pool's writer lock; never
+    `flush()` from a `ConnectionPool.write` job, which already holds the latter.
+    """
+
+    def __init__(self, pool: ConnectionPool, table: str, columns: Sequence[str], key: Sequence[str],
+                 batch_size: int, interval: float):
+        self.pool = pool
+        self.table = table
+        self.columns = tuple(columns)
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.sql = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' * len(self.columns))})"
+        )
+        self._key = [self.columns.index(column) for column in key]
+        self._pending: Dict[tuple, tuple] = {}
+        # Taken out of _pending by a flush that hasn't committed yet
+        self._flushing: Dict[tuple, tuple] = {}
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.flushes = 0
+        self.rows_written = 0
+
+    def put(self, row: Sequence[Any]) -> None:
+        row = tuple(row)
+        with self._cond:
+            self._pending[tuple(row[i] for i in self._key)] = row
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._cond.notify()
+        self._ensure_thread()
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        """The unstored row for `key` as a column -> value dict, or None."""
+        with self._cond:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._flushing.get(key)
+        return dict(zip(self.columns, row)) if row is not None else None
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Every unstored row as a column -> value dict, newest per key."""
+        with self._cond:
+            rows = {**self._flushing, **self._pending}
+        return [dict(zip(self.columns, row)) for row in rows.values()]
+
+    def update(self, key: Tuple[Any, ...], changes: Dict[str, Any]) -> bool:
+        """
+        Applies `changes` (column -> value) to the unstored row for `key`.
+        Returns False when no such row is buffered. A row an in-progress flush
+        is storing is queued again with the changes, so they land after it.
+        """
+        with self._cond:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._flushing.get(key)
+            if row is None:
+                return False
+            row = list(row)
+            for column, value in changes.items():
+                row[self.columns.index(column)] = value
+            self._pending[key] = tuple(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._cond.notify()
+        self._ensure_thread()
+        return True
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending) + len(self._flushing)
+
+    def flush(self) -> int:
+        """Stores every pending row now, on the calling thread. Returns the number written."""
+        if getattr(self.pool._batch, "conn", None) is not None:
+            raise RuntimeError(f"flushing {self.table} inside a write batch would deadlock with the flusher")
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending, self._oldest = self._pending, {}, None
+                self._flushing = batch
+            if not batch:
+                return 0
+            try:
+                self._write(list(batch.values()))
+            except BaseException:
+                # Keep them for the next flush (rows put meanwhile are newer and win)
+                with self._cond:
+                    for key, row in batch.items():
+                        self._pending.setdefault(key, row)
+                    self._oldest = self._oldest or time.monotonic()
+                raise
+            finally:
+                with self._cond:
+                    self._flushing = {}
+            return len(batch)
+
+    def _write(self, rows: List[tuple]) -> None:
+        with self.pool.writer() as conn:
+            conn.executemany(self.sql, rows)
+        self.flushes += 1
+        self.rows_written += len(rows)
+
+    def _due(self) -> bool:
+        return bool(self._pending) and (
+            len(self._pending) >= self.batch_size or self.interval <= 0
+            or time.monotonic() - self._oldest >= self.interval
+        )
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"sqlite-{self.pool.name}-{self.table}-flush", daemon=True,
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping and not self._due():
+                    timeout = None if self._oldest is None else max(0.0, self._oldest + self.interval - time.monotonic())
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Flushing {self.table} failed, retrying: {e}")
+                time.sleep(max(self.interval, 1.0))
+
+    def close(self) -> None:
+        """Stops the flusher thread and stores whatever is pending."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._stopping = False
+            self._thread = None
+        self.flush()
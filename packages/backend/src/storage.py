@@ -0,0 +1,154 @@
+"""
+The backend's two SQLite databases, their schemas and their connection pools.
+
+    bundles   nexguard_bundles.db   engine caches: bundles, xray results, funder
+                                    index, script store, holder snapshots
+    audit     audit.db              MPM metrics and naughty-wallet decisions
+                                    (shared with the Node app, see db.js)
+
+Schemas are versioned lists of migrations (sqlite_pool.Migration), applied
+once per process when a pool opens its writer; `migrate()` does that for both
+at startup so a broken schema fails the boot rather than the first request.
+Append new steps, never edit applied ones. Table names are read from the
+environment, but only when a file is first created: renaming a table of an
+existing file needs a migration.
+"""
+
+import os
+import sqlite3
+import logging
+from typing import Dict, List
+
+from .sqlite_pool import ConnectionPool, Migration
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_DB_PATH = os.getenv("BUNDLE_DB_PATH", "./nexguard_bundles.db")
+BUNDLE_DB_READERS = int(os.getenv("BUNDLE_DB_READERS", "4"))
+BUNDLE_TABLE = os.getenv("BUNDLE_TABLE", "bundles")
+# xray results used to share BUNDLE_TABLE, keyed on the same policy_id, so the two engines
+# overwrote each other's rows; they get their own table
+XRAY_TABLE = os.getenv("XRAY_TABLE", "xray_results")
+FUNDER_TABLE = os.getenv("FUNDER_TABLE", "address_funders")
+SCRIPT_TABLE = os.getenv("SCRIPT_TABLE", "scripts")
+SNAPSHOT_TABLE = os.getenv("SNAPSHOT_TABLE", "holder_snapshots")
+
+# audit.db, shared with the Node app (db.js resolves it to packages/backend/audit.db)
+AUDIT_DB_PATH = os.getenv("NEXGUARD_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audit.db"))
+AUDIT_DB_READERS = int(os.getenv("AUDIT_DB_READERS", "2"))
+# MPM / naughty-wallet upserts are buffered and stored in one transaction per flush:
+# after this many rows or this long after the oldest pending one (0 = as soon as the flusher thread gets to them)
+AUDIT_WRITE_BATCH = int(os.getenv("AUDIT_WRITE_BATCH", "500"))
+AUDIT_WRITE_INTERVAL_MS = int(os.getenv("AUDIT_WRITE_INTERVAL_MS", "200"))
+
+BUNDLE_MIGRATIONS: List[Migration] = [
+    # 1: the schema as created by the old per-import _init_db (IF NOT EXISTS, so existing files just get versioned)
+    [
+        f"""
+        CREATE TABLE IF NOT EXISTS {BUNDLE_TABLE} (
+            policy_id TEXT PRIMARY KEY,
+            payload   TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{BUNDLE_TABLE}_timestamp ON {BUNDLE_TABLE}(timestamp)",
+        f"""
+        CREATE TABLE IF NOT EXISTS {XRAY_TABLE} (
+            policy_id TEXT PRIMARY KEY,
+            payload   TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+        """,
+        # Permanent: an address's first transaction (and so its funder) never changes once on-chain
+        f"""
+        CREATE TABLE IF NOT EXISTS {FUNDER_TABLE} (
+            address        TEXT PRIMARY KEY,
+            first_tx_hash  TEXT,
+            funder_address TEXT,
+            resolved_at    TEXT NOT NULL
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{FUNDER_TABLE}_funder ON {FUNDER_TABLE}(funder_address)",
+        # Script metadata is content-addressed by its hash, so found scripts never expire.
+        # script IS NULL records a 404, which can change once the script lands on-chain.
+        f"""
+        CREATE TABLE IF NOT EXISTS {SCRIPT_TABLE} (
+            script_hash TEXT PRIMARY KEY,
+            script      TEXT,
+            script_json TEXT,
+            fetched_at  TEXT NOT NULL
+        )
+        """,
+        # Last holder set per policy with each holder's funder (the bundle graph's edges),
+        # so a refresh only traces holders that appeared since
+        f"""
+        CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+            policy_id TEXT PRIMARY KEY,
+            holders   TEXT NOT NULL,
+            taken_at  TEXT NOT NULL
+        )
+        """,
+    ],
+    # 2: the asset's total supply, kept with the holder snapshot and refreshed less often than it
+    [
+        f"ALTER TABLE {SNAPSHOT_TABLE} ADD COLUMN total_supply REAL",
+        f"ALTER TABLE {SNAPSHOT_TABLE} ADD COLUMN supply_at TEXT",
+    ],
+]
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _add_mpm_breakdown(conn: sqlite3.Connection) -> None:
+    # db.js creates mpm_metrics without it, so the table may predate this step either way
+    if "breakdown" not in _columns(conn, "mpm_metrics"):
+        conn.execute("ALTER TABLE mpm_metrics ADD COLUMN breakdown TEXT")
+
+AUDIT_MIGRATIONS: List[Migration] = [
+    # 1: tables of the Python routes (the Node app owns the rest of audit.db)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS mpm_metrics (
+          policy_id    TEXT PRIMARY KEY,
+          token_symbol TEXT,
+          window_min   INTEGER NOT NULL,
+          mpm          REAL NOT NULL,
+          sentiment    TEXT NOT NULL,
+          sample_size  INTEGER NOT NULL,
+          last_updated TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS naughty_wallets (
+          wallet       TEXT NOT NULL,
+          policy_id    TEXT NOT NULL,
+          classification TEXT,
+          sass_score   INTEGER,
+          evidence     TEXT,
+          decision_hash TEXT,
+          onchain_tx   TEXT,
+          timestamp    TEXT,
+          PRIMARY KEY (wallet, policy_id)
+        )
+        """,
+    ],
+    # 2: per-mention MPM breakdown (JSON)
+    _add_mpm_breakdown,
+]
+
+# Long-lived writer + read-only reader connections (WAL) per database
+bundles = ConnectionPool(BUNDLE_DB_PATH, readers=BUNDLE_DB_READERS, name="bundles", migrations=BUNDLE_MIGRATIONS)
+audit = ConnectionPool(AUDIT_DB_PATH, readers=AUDIT_DB_READERS, name="audit", migrations=AUDIT_MIGRATIONS)
+
+POOLS = (bundles, audit)
+
+def migrate() -> Dict[str, int]:
+    """Applies pending migrations to every database; returns name -> schema version."""
+    versions = {pool.name: pool.migrate() for pool in POOLS}
+    logger.info(f"Storage ready: {versions}")
+    return versions
+
+def close() -> None:
+    """Finishes queued writes and closes every connection (they reopen on next use)."""
+    for pool in POOLS:
+        pool.close()
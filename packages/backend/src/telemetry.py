@@ -0,0 +1,319 @@
+import re
+import time
+import math
+import functools
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers a memory-cache hit (~50us) through a deep analysis (minutes)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class _Metric:
+    """
+    One metric family. Children (one per label-value tuple) are created on first
+    use and then cached, so a hot-path update is a dict lookup plus a short
+    locked add. The lock makes updates from the SQLite worker threads safe.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: _HistogramValue):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}"
+
+class Collected(_Metric):
+    """
+    Read at scrape time from `collect()`, which returns {label values: value}.
+    For state that already lives elsewhere (cache counters, scheduler state):
+    nothing is added to the path that updates it.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        suffix = "_total" if self.kind == "counter" else ""
+        for values, value in self.collect().items():
+            yield f"{self.name}{suffix}{_format_labels(self.labelnames, values)} {_format_value(float(value))}"
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collected(self, name: str, documentation: str, kind: str, labelnames: Sequence[str], collect) -> Collected:
+        return self.register(Collected(name, documentation, kind, labelnames, collect))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken collector must not take the whole scrape down
+                lines.append(f"# {metric.name} collection failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- Metrics updated on hot paths -------------------------------------------
+
+http_request_seconds = registry.histogram(
+    "nexguard_http_request_seconds", "HTTP request latency by route template, until the last body chunk",
+    ("method", "route", "status"),
+)
+blockfrost_requests = registry.counter(
+    "nexguard_blockfrost_requests", "Blockfrost HTTP attempts by endpoint template and status",
+    ("endpoint", "status"),
+)
+blockfrost_request_seconds = registry.histogram(
+    "nexguard_blockfrost_request_seconds", "Blockfrost HTTP attempt latency by endpoint template (excludes scheduler waits)",
+    ("endpoint",),
+)
+cache_lookups = registry.counter(
+    "nexguard_cache_lookups", "Result cache lookups by engine, tier (memory, sqlite) and result (hit, stale, miss)",
+    ("engine", "tier", "result"),
+)
+sqlite_seconds = registry.histogram(
+    "nexguard_sqlite_seconds", "Time holding a pooled SQLite connection (queries + commit) by database and mode",
+    ("db", "mode"),
+)
+analyses_in_flight = registry.gauge(
+    "nexguard_analyses_in_flight", "Analyses currently running, by engine (deep bundle analyses are not coalesced)",
+    ("engine",),
+)
+
+# Hex ids (policy ids, tx hashes), bech32 addresses / stake keys / asset fingerprints
+_ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F]{16,}|(?:addr|stake|asset)[a-z_]*1[0-9a-z]{6,})(?=/|\?|$)")
+
+def endpoint_template(path: str) -> str:
+    """`/scripts/<hash>/json` -> `/scripts/{id}/json`, keeping label cardinality bounded."""
+    return _ID_SEGMENT.sub("/{id}", path)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording `nexguard_http_request_seconds`. Labelled with the
+    matched route template (not the raw path), so policy ids don't become series.
+    Streaming responses are timed until their final chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.labels(scope["method"], template, status).observe(time.perf_counter() - start)
+
+def track_in_flight(engine: str):
+    """Decorator: counts running calls of an async analysis in `nexguard_analyses_in_flight`."""
+    def decorate(fn):
+        gauge = analyses_in_flight.labels(engine)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            gauge.inc()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                gauge.dec()
+        return wrapper
+    return decorate
+
+# --- Read at scrape time ----------------------------------------------------
+
+_ttl_caches: List = []
+
+def track_cache(cache) -> None:
+    """Adds a memory_cache.TTLCache to the `nexguard_memory_cache_*` metrics."""
+    _ttl_caches.append(cache)
+
+def _cache_stat(field: str):
+    return lambda: {(cache.name,): cache.stats()[field] for cache in _ttl_caches}
+
+registry.collected("nexguard_memory_cache_entries", "Entries held in each in-process cache", "gauge", ("cache",), _cache_stat("size"))
+registry.collected("nexguard_memory_cache_evictions", "LRU evictions from each in-process cache", "counter", ("cache",), _cache_stat("evictions"))
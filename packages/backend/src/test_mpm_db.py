@@ -1,5 +1,10 @@
-import mpm_db
-import datetime
+import os
+import sys
+
+# Run from anywhere: import the backend as a package from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from packages.backend.src import mpm_db, storage
 
 def test_mpm_flow():
     print("Testing MPM DB Flow...")
@@ -30,4 +35,7 @@ def test_mpm_flow():
         print("Failed! Record not found.")
 
 if __name__ == "__main__":
+    storage.migrate()
     test_mpm_flow()
+    # Store the buffered upsert before exit
+    storage.close()
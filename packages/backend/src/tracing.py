@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import random
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+# Adds a Server-Timing header (per-stage totals) to every traced response
+TRACE_SERVER_TIMING = os.getenv("TRACE_SERVER_TIMING", "0") == "1"
+# Lets `?trace=1` return the span tree in the JSON body (and a Server-Timing header).
+# Off by default: the tree shows internals (Blockfrost endpoints, cache tiers, timings)
+TRACE_DEBUG_PARAM = os.getenv("TRACE_DEBUG_PARAM", "0") == "1"
+# Append finished traces to this file as OTLP/JSON (one ExportTraceServiceRequest per line)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_EXPORT_SAMPLE = float(os.getenv("TRACE_EXPORT_SAMPLE", "1.0"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "nexguard-backend")
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent", "kind", "start_ns", "end_ns", "attributes", "error", "children")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: int = INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+        if parent is not None:
+            # list.append is atomic, so spans finished on worker threads are safe to attach
+            parent.children.append(self)
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def tree(self, origin_ns: Optional[int] = None) -> Dict[str, Any]:
+        """Nested dict for the debug response: offsets and durations in ms."""
+        origin_ns = self.start_ns if origin_ns is None else origin_ns
+        node: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start_ns - origin_ns) / 1e6, 3),
+            "duration_ms": round(self.duration_ms, 3),
+        }
+        if self.attributes:
+            node["attributes"] = self.attributes
+        if self.error:
+            node["error"] = self.error
+        if self.children:
+            node["children"] = [child.tree(origin_ns) for child in sorted(self.children, key=lambda c: c.start_ns)]
+        return node
+
+_current: ContextVar[Optional[Span]] = ContextVar("nexguard_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+class _NoopSpan:
+    """Stands in when no trace is active, so instrumented code needn't check."""
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes):
+    """
+    Child span of the current one. Outside a traced request this is a no-op
+    (one ContextVar lookup), so instrumentation can stay on hot paths.
+    Tasks created inside inherit the span through their copied context.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield _NOOP
+        return
+    current = Span(name, parent, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current.reset(token)
+
+def traced(name: Optional[str] = None):
+    """Decorator form of `span` for sync and async functions."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def root_span(name: str, **attributes):
+    """Starts a new trace (used by the middleware, and by tests/benchmarks)."""
+    root = Span(name, None, SERVER, attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.end_ns = time.time_ns()
+        _current.reset(token)
+
+def server_timing(root: Span) -> str:
+    """`Server-Timing` value: total time per span name, in first-seen order."""
+    totals: Dict[str, List[float]] = {}
+    for s in root.walk():
+        entry = totals.setdefault(s.name, [0.0, 0])
+        entry[0] += s.duration_ms
+        entry[1] += 1
+    parts = []
+    for name, (duration, count) in totals.items():
+        metric = "".join(ch if ch.isalnum() or ch in "._-" else "_" for ch in name)
+        part = f"{metric};dur={duration:.2f}"
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON encodes 64-bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(root: Span) -> Dict[str, Any]:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in root.walk():
+        otlp: Dict[str, Any] = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns if s.end_ns is not None else s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+        }
+        if s.parent is not None:
+            otlp["parentSpanId"] = s.parent.span_id
+        spans.append(otlp)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+class FileExporter:
+    """Appends one OTLP/JSON line per trace, the format read by the OpenTelemetry Collector's otlpjsonfile receiver."""
+
+    def __init__(self, path: str, sample: float = 1.0):
+        self.path = path
+        self.sample = sample
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, root: Span) -> None:
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return
+        line = json.dumps(to_otlp(root), separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+exporter: Optional[FileExporter] = FileExporter(TRACE_EXPORT_PATH, TRACE_EXPORT_SAMPLE) if TRACE_EXPORT_PATH else None
+
+def _debug_requested(scope) -> bool:
+    if not TRACE_DEBUG_PARAM or not scope.get("query_string"):
+        return False
+    flags = parse_qs(scope["query_string"].decode("latin-1")).get("trace", [])
+    return any(flag in ("1", "true") for flag in flags)
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a root span per request when something will use
+    it: the Server-Timing header, a `?trace=1` debug request, or the file
+    exporter. Otherwise requests run untraced and every span() is a no-op.
+    With `?trace=1`, JSON object responses get the span tree under `_trace`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        debug = _debug_requested(scope)
+        if not (debug or TRACE_SERVER_TIMING or exporter is not None):
+            await self.app(scope, receive, send)
+            return
+
+        buffered: List[Dict[str, Any]] = []
+
+        with root_span(f"{scope['method']} {scope['path']}", **{"http.method": scope["method"]}) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set("http.status_code", message["status"])
+                    _name_root(root, scope)
+                    if debug:
+                        # Held until the body is complete so the tree can be added to it
+                        buffered.append(message)
+                        return
+                    if TRACE_SERVER_TIMING:
+                        message = _with_header(message, b"server-timing", server_timing(root))
+                elif debug and message["type"] == "http.response.body":
+                    buffered.append(message)
+                    if message.get("more_body"):
+                        return
+                    start, body = buffered[0], b"".join(m.get("body", b"") for m in buffered[1:])
+                    await _send_debug(send, root, start, body)
+                    return
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                _name_root(root, scope)
+
+        if exporter is not None:
+            exporter.export(root)
+
+def _name_root(root: Span, scope) -> None:
+    # Routing has run by now; name the trace by route template rather than raw path
+    route = scope.get("route")
+    if route is not None:
+        root.name = f"{scope['method']} {route.path}"
+        root.set("http.route", route.path)
+
+def _with_header(message, name: bytes, value: str):
+    headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != name]
+    headers.append((name, value.encode("latin-1")))
+    return dict(message, headers=headers)
+
+async def _send_debug(send, root: Span, start, body: bytes) -> None:
+    # The handler has finished, so everything but the root is closed
+    root.end_ns = time.time_ns()
+    content_type = dict(start.get("headers", [])).get(b"content-type", b"")
+    if content_type.startswith(b"application/json"):
+        try:
+            payload = json.loads(body)
+            if isinstance(payload, dict):
+                payload["_trace"] = root.tree()
+                body = json.dumps(payload, default=str).encode()
+        except ValueError:
+            pass
+    start = _with_header(start, b"content-length", str(len(body)))
+    start = _with_header(start, b"server-timing", server_timing(root))
+    await send(start)
+    await send({"type": "http.response.body", "body": body, "more_body": False})
@@ -5,20 +5,21 @@ import sys
 import json
 from fastapi.testclient import TestClient
 
-# Add src to path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add the repo root to path; the backend modules import each other as a package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
 
-from mpm_db import upsert_mpm, fetch_mpm, init_db
-from services.mpm_agent import analyze_mpm_for_token
-from services.social_scraper import fetch_social_metrics
-from main import app
+from packages.backend.src import storage
+from packages.backend.src.mpm_db import upsert_mpm, fetch_mpm
+from packages.backend.src.services.mpm_agent import analyze_mpm_for_token
+from packages.backend.src.services.social_scraper import fetch_social_metrics
+from packages.backend.src.main import app
 
 # --- Sprint 1: DB Tests ---
 def test_sprint_1_db():
     print("\n--- Sprint 1: Database Tests ---")
     
     # Ensure DB exists
-    init_db()
+    storage.migrate()
     
     # 1.1 Table Creation
     DB_PATH = os.getenv("NEXGUARD_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audit.db"))
@@ -0,0 +1,164 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from . import xray_engine, insider_engine
+from .blockfrost_client import scheduler
+from .bundle_db_sqlite import CACHE_TTL
+from .mpm_db import fetch_top_mpm
+from .storage import audit
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_INTERVAL_SECONDS = float(os.getenv("WARMUP_INTERVAL_SECONDS", "60"))
+# Blockfrost calls the warm-up may spend per rolling minute (user traffic is not limited by this)
+WARMUP_CALLS_PER_MINUTE = int(os.getenv("WARMUP_CALLS_PER_MINUTE", "120"))
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "50"))
+# Refresh once a cached result is this far into its fresh window (0.8 = after ~19h of 24h)
+WARMUP_REFRESH_AFTER = float(os.getenv("WARMUP_REFRESH_AFTER", "0.8"))
+WARMUP_HALF_LIFE_SECONDS = float(os.getenv("WARMUP_HALF_LIFE_SECONDS", "3600"))
+# Priority added per unit of mpm_metrics.mpm (mentions per minute)
+WARMUP_MPM_WEIGHT = float(os.getenv("WARMUP_MPM_WEIGHT", "0.5"))
+WARMUP_MAX_TRACKED = int(os.getenv("WARMUP_MAX_TRACKED", "10000"))
+
+XRAY, BUNDLE = "xray", "bundle"
+ENGINES = (XRAY, BUNDLE)
+
+def _xray_refresh(policy_id: str):
+    return xray_engine.flights.do((XRAY, policy_id), lambda: xray_engine._analyze_uncached(policy_id))
+
+def _bundle_refresh(policy_id: str):
+    # Same flight key as analyze_bundle, so a user request arriving mid-refresh joins it
+    return insider_engine.flights.do((BUNDLE, policy_id), lambda: insider_engine._analyze_uncached(policy_id))
+
+class WarmupScheduler:
+    """
+    Keeps the results of hot policies cached by refreshing them before they go
+    stale. Heat is an exponentially decayed request count per (engine, policy)
+    plus a boost from the policy's MPM; the top WARMUP_TOP_N are refreshed each
+    round, within a rolling per-minute Blockfrost call budget.
+    """
+
+    def __init__(
+        self,
+        calls_per_minute: int = WARMUP_CALLS_PER_MINUTE,
+        interval: float = WARMUP_INTERVAL_SECONDS,
+        top_n: int = WARMUP_TOP_N,
+        refresh_after: float = WARMUP_REFRESH_AFTER,
+        half_life: float = WARMUP_HALF_LIFE_SECONDS,
+    ):
+        self.calls_per_minute = calls_per_minute
+        self.interval = interval
+        self.top_n = top_n
+        self.refresh_after = refresh_after
+        self.half_life = half_life
+        # (engine, policy_id) -> (decayed request count, when it was last updated)
+        self._heat: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.skipped_budget = 0
+        self.cached_at: Dict[str, Callable[[str], Awaitable[Optional[datetime]]]] = {
+            XRAY: xray_engine.cached_at, BUNDLE: insider_engine.cached_at,
+        }
+        self.refreshers: Dict[str, Callable] = {XRAY: _xray_refresh, BUNDLE: _bundle_refresh}
+
+    def _decayed(self, heat: float, since: float, now: float) -> float:
+        return heat * 0.5 ** ((now - since) / self.half_life)
+
+    def record(self, engine: str, policy_id: str) -> None:
+        """Counts a user request; called from the routes."""
+        now = time.monotonic()
+        key = (engine, policy_id)
+        heat, since = self._heat.get(key, (0.0, now))
+        self._heat[key] = (self._decayed(heat, since, now) + 1.0, now)
+        if len(self._heat) > WARMUP_MAX_TRACKED:
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        # Drop the coldest half
+        ranked = sorted(self._heat.items(), key=lambda item: self._decayed(*item[1], now))
+        for key, _ in ranked[: len(ranked) // 2]:
+            del self._heat[key]
+
+    async def queue(self) -> List[Tuple[float, str, str]]:
+        """The top_n (priority, engine, policy_id), hottest first."""
+        now = time.monotonic()
+        priorities: Dict[Tuple[str, str], float] = {
+            key: self._decayed(heat, since, now) for key, (heat, since) in self._heat.items()
+        }
+        try:
+            trending = await audit.read(fetch_top_mpm, self.top_n)
+        except Exception as e:
+            logger.error(f"Warm-up could not read MPM metrics: {e}")
+            trending = []
+        for policy_id, mpm in trending:
+            for engine in ENGINES:
+                key = (engine, policy_id)
+                priorities[key] = priorities.get(key, 0.0) + WARMUP_MPM_WEIGHT * (mpm or 0.0)
+        top = heapq.nlargest(self.top_n, ((p, engine, pid) for (engine, pid), p in priorities.items() if p > 0))
+        return top
+
+    async def _needs_refresh(self, engine: str, policy_id: str) -> bool:
+        written_at = await self.cached_at[engine](policy_id)
+        if written_at is None:
+            return True
+        return datetime.utcnow() - written_at >= CACHE_TTL * self.refresh_after
+
+    def _budget_left(self, now: float) -> int:
+        while self._spent and now - self._spent[0][0] >= 60:
+            self._spent.popleft()
+        return self.calls_per_minute - sum(calls for _, calls in self._spent)
+
+    async def run_once(self) -> int:
+        """One round over the queue. Returns how many results were refreshed."""
+        if not xray_engine.BLOCKFROST_PROJECT_ID:
+            return 0
+        refreshed = 0
+        for _, engine, policy_id in await self.queue():
+            if not await self._needs_refresh(engine, policy_id):
+                continue
+            if self._budget_left(time.monotonic()) <= 0:
+                self.skipped_budget += 1
+                logger.info("Warm-up call budget exhausted for this minute")
+                break
+            before = scheduler.calls
+            try:
+                await self.refreshers[engine](policy_id)
+                refreshed += 1
+            except Exception as e:
+                logger.error(f"Warm-up refresh failed for {engine} {policy_id}: {e}")
+            # Charged with every call started meanwhile, so concurrent user traffic
+            # makes the warm-up back off rather than overspend
+            self._spent.append((time.monotonic(), scheduler.calls - before))
+        self.refreshed += refreshed
+        return refreshed
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Warm-up round failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+warmup = WarmupScheduler()
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# Keep tests away from the checked-in SQLite files: point every DB at a scratch dir
+# before any engine module is imported.
+_scratch = tempfile.mkdtemp(prefix="nexguard-tests-")
+os.environ.setdefault("BUNDLE_DB_PATH", os.path.join(_scratch, "nexguard_bundles.db"))
+os.environ.setdefault("NEXGUARD_DB_PATH", os.path.join(_scratch, "audit.db"))
+
+import pytest
+
+@pytest.fixture(autouse=True)
+def _isolated_caches():
+    """Every test starts with empty in-memory tiers, funder index, script store and snapshots."""
+    from packages.backend.src import bundle_db_sqlite, xray_engine, storage
+
+    # Writes queued by a previous test (whose loop may be gone) land before the cleanup, not after
+    storage.close()
+    bundle_db_sqlite.bundle_cache.clear()
+    xray_engine.xray_cache.clear()
+    with bundle_db_sqlite.pool.writer() as conn:
+        conn.execute(f"DELETE FROM {bundle_db_sqlite.FUNDER_TABLE}")
+        conn.execute(f"DELETE FROM {bundle_db_sqlite.SCRIPT_TABLE}")
+        conn.execute(f"DELETE FROM {bundle_db_sqlite.SNAPSHOT_TABLE}")
+    yield
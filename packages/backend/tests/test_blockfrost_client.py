@@ -0,0 +1,94 @@
+import pytest
+import asyncio
+import time
+import httpx
+from unittest.mock import patch
+from packages.backend.src import blockfrost_client
+from packages.backend.src.blockfrost_client import (
+    BlockfrostScheduler, TokenBucket, CircuitBreaker, BlockfrostUnavailable, blockfrost_get,
+)
+
+def _mock_client(responses):
+    # Serves the given (status, headers) in order, then 200s
+    seen = []
+
+    def handler(request):
+        seen.append(time.monotonic())
+        status, headers = responses.pop(0) if responses else (200, {})
+        return httpx.Response(status, headers=headers, json={"ok": status == 200})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), seen
+
+@pytest.mark.asyncio
+async def test_scheduler_caps_in_flight_requests():
+    scheduler = BlockfrostScheduler(rate=1000, burst=1000, max_in_flight=3)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with scheduler.slot():
+            peak = max(peak, scheduler.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(20)))
+    assert peak == 3
+    assert scheduler.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_scheduler_respects_rate_after_burst():
+    # Burst of 5, then 50 req/s: 10 calls need ~5 refills -> ~0.1s
+    scheduler = BlockfrostScheduler(rate=50, burst=5, max_in_flight=10)
+
+    async def call():
+        async with scheduler.slot():
+            pass
+
+    start = time.monotonic()
+    await asyncio.gather(*(call() for _ in range(10)))
+    assert time.monotonic() - start >= 0.08
+
+def test_token_bucket_reports_wait_time_when_empty():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.try_acquire() == 0.0
+    assert 0 < bucket.try_acquire() <= 0.1
+
+@pytest.mark.asyncio
+async def test_429_honors_retry_after_and_halves_concurrency():
+    scheduler = BlockfrostScheduler(rate=1000, burst=1000, max_in_flight=8)
+    client, seen = _mock_client([(429, {"Retry-After": "0.2"})])
+    with patch.object(blockfrost_client, "scheduler", scheduler), \
+         patch.object(blockfrost_client, "breaker", CircuitBreaker(threshold=5, reset_timeout=30)), \
+         patch.object(blockfrost_client, "BLOCKFROST_BACKOFF_BASE", 0.001):
+        response = await blockfrost_get("https://bf.test/x", {}, client=client)
+
+    assert response.status_code == 200
+    assert seen[1] - seen[0] >= 0.19
+    assert scheduler.throttled == 1
+    assert int(scheduler.limit) == 4
+    # Successes grow the limit back additively, never past the cap
+    for _ in range(100):
+        scheduler.succeeded()
+    assert scheduler.limit == 8
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_failures_and_fails_fast():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.1)
+    client, seen = _mock_client([(500, {})] * 4)
+    with patch.object(blockfrost_client, "scheduler", BlockfrostScheduler(rate=1000, burst=1000, max_in_flight=4)), \
+         patch.object(blockfrost_client, "breaker", breaker), \
+         patch.object(blockfrost_client, "BLOCKFROST_BACKOFF_BASE", 0.001):
+        for _ in range(2):
+            with pytest.raises(BlockfrostUnavailable):
+                await blockfrost_get("https://bf.test/x", {}, client=client, retries=2)
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(BlockfrostUnavailable):
+            await blockfrost_get("https://bf.test/x", {}, client=client)
+        assert len(seen) == 4
+
+        # After the reset timeout one probe goes through and closes the circuit
+        await asyncio.sleep(0.12)
+        response = await blockfrost_get("https://bf.test/x", {}, client=client)
+
+    assert response.status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opens == 1 and breaker.rejected == 1
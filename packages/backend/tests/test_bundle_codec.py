@@ -0,0 +1,62 @@
+from datetime import datetime
+from packages.backend.src import bundle_codec
+from packages.backend.src.bundle_db_sqlite import (
+    pool, fetch_bundle, upsert_bundle, fetch_bundle_timestamp, UPSERT_PAYLOAD_SQL, SELECT_PAYLOAD_SQL,
+)
+from packages.backend.src.models import BundleAnalysisResult, GraphNode, GraphLink, BundleCluster
+
+def _bundle(holders: int, policy_id: str = "codec_policy") -> BundleAnalysisResult:
+    funders = [f"addr1funder{i % 7:090d}" for i in range(holders)]
+    nodes = [GraphNode(id=f"addr1holder{i:090d}", group="victim", color="#00ff88", val=1.5, hop=0) for i in range(holders)]
+    nodes += [GraphNode(id=f, group="master", color="#ff0055", val=3.0, hop=1) for f in sorted(set(funders))]
+    links = [GraphLink(source=f, target=f"addr1holder{i:090d}", hop=1) for i, f in enumerate(funders)]
+    return BundleAnalysisResult(
+        policy_id=policy_id, nodes=nodes, links=links, risk_score=40,
+        timestamp=datetime(2026, 1, 2, 3, 4, 5, 678901),
+        clusters=[BundleCluster(funder=funders[0], holders=holders // 7, supply_share=0.25, masters=1)],
+        funder_hhi=0.1428, funder_gini=0.31,
+    )
+
+def test_round_trip_preserves_every_field():
+    original = _bundle(50)
+    decoded = bundle_codec.decode(bundle_codec.encode(original))
+    assert decoded == original
+    assert decoded.nodes[-1].hop == 1 and decoded.links[3].target == original.links[3].target
+    assert bundle_codec.decode(bundle_codec.encode(original.copy(update={"stale": True}))).stale
+
+def test_encoding_is_much_smaller_than_json():
+    result = _bundle(1000)
+    assert len(bundle_codec.encode(result)) * 5 < len(result.json())
+
+def test_legacy_json_rows_are_still_read_and_unknown_versions_are_misses():
+    legacy = _bundle(5, "legacy_policy")
+    future = bytearray(bundle_codec.encode(_bundle(5, "future_policy")))
+    future[3] = bundle_codec.VERSION + 1
+    with pool.writer() as conn:
+        conn.execute(UPSERT_PAYLOAD_SQL, ("legacy_policy", legacy.json(), legacy.timestamp.isoformat()))
+        conn.execute(UPSERT_PAYLOAD_SQL, ("future_policy", bytes(future), legacy.timestamp.isoformat()))
+
+    assert fetch_bundle("legacy_policy") == legacy
+    assert fetch_bundle("future_policy") is None
+    assert fetch_bundle_timestamp("future_policy") == legacy.timestamp
+
+def test_upsert_stores_binary_payload():
+    result = _bundle(20, "binary_policy")
+    upsert_bundle(result)
+    with pool.reader() as conn:
+        payload = conn.execute(SELECT_PAYLOAD_SQL, ("binary_policy",)).fetchone()[0]
+    assert bundle_codec.is_encoded(payload)
+    assert fetch_bundle("binary_policy") == result
+
+def test_trusted_construction_matches_model_construct():
+    # Fails when a Pydantic release changes BaseModel's instance state: bundle_codec
+    # then falls back to model_construct, and PYDANTIC_SLOTS / _trusted need a look
+    from pydantic import BaseModel
+    assert BaseModel.__slots__ == bundle_codec.PYDANTIC_SLOTS
+
+    values = {"id": "addr", "group": "victim", "color": "#00ff88", "val": 1.0, "hop": 0}
+    built, constructed = bundle_codec._node(**values), GraphNode.model_construct(**values)
+    for slot in bundle_codec.PYDANTIC_SLOTS:
+        assert getattr(built, slot) == getattr(constructed, slot)
+    assert built == constructed and built.model_dump() == values
+    assert built.model_copy(update={"hop": 2}).hop == 2
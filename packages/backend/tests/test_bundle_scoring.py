@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from packages.backend.src.bundle_scoring import gini, score_clusters
+from packages.backend.src.insider_engine import _build_graph, _score_graph
+from packages.backend.src.models import BundleAnalysisResult
+
+ADDRESSES = [f"h{i}" for i in range(6)]
+QUANTITIES = [50, 20, 10, 10, 5, 5]
+FUNDERS = ["F1", "F1", "F2", "F2", "F2", None]
+
+def test_clusters_supply_shares_and_concentration():
+    G = _build_graph(ADDRESSES, FUNDERS)
+    scores = score_clusters(G, np.zeros(len(G), dtype=bool), ADDRESSES, QUANTITIES)
+
+    assert [(c.funder, c.holders, c.supply_share) for c in scores.clusters] == [("F1", 2, 0.7), ("F2", 3, 0.25)]
+    assert scores.top_cluster_share == pytest.approx(0.7)
+    # Supply by funder: F1 70, F2 25, unfunded h5 5
+    assert scores.funder_hhi == pytest.approx(0.49 + 0.0625 + 0.0025)
+    assert scores.funder_gini == pytest.approx(130 / 300, abs=1e-6)
+
+def test_supply_shares_are_of_the_total_supply():
+    G = _build_graph(ADDRESSES, FUNDERS)
+    scores = score_clusters(G, np.zeros(len(G), dtype=bool), ADDRESSES, QUANTITIES, total_supply=1000)
+    assert [c.supply_share for c in scores.clusters] == [0.07, 0.025]
+    # Concentration stays among the analyzed holders
+    assert scores.funder_hhi == pytest.approx(0.49 + 0.0625 + 0.0025)
+
+    # A total below what the analyzed holders hold is ignored
+    low = score_clusters(G, np.zeros(len(G), dtype=bool), ADDRESSES, QUANTITIES, total_supply=10)
+    assert low.top_cluster_share == pytest.approx(0.7)
+
+def test_supply_heavy_cluster_raises_risk_without_masters():
+    result = BundleAnalysisResult(policy_id="policy_supply", nodes=[], links=[])
+    _score_graph(result, ADDRESSES, FUNDERS, quantities=QUANTITIES, total_supply=100)
+    assert all(n.group == "victim" for n in result.nodes)
+    assert result.risk_score == 70
+
+    # Total supply unknown: the share of the analyzed holders counts for at most 40
+    _score_graph(result, ADDRESSES, FUNDERS, quantities=QUANTITIES)
+    assert result.risk_score == 40
+
+    # Without balances only the master rule applies, as before
+    _score_graph(result, ADDRESSES, FUNDERS)
+    assert result.risk_score == 0
+    assert [c.supply_share for c in result.clusters] == [0.0, 0.0]
+
+def test_gini_bounds():
+    assert gini(np.array([])) == 0.0
+    assert gini(np.array([5.0, 5.0, 5.0])) == pytest.approx(0.0)
+    assert gini(np.array([0.0, 0.0, 0.0, 9.0])) == pytest.approx(0.75)
@@ -0,0 +1,160 @@
+import json
+import asyncio
+import threading
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from packages.backend.src.insider_engine import stream_bundle
+from packages.backend.src.main import app
+
+POLICY = "ef" * 28
+
+def _blockfrost(request):
+    path = request.url.path
+    if path.endswith("/addresses"):
+        return httpx.Response(200, json=[{"address": f"addr_{i}", "quantity": "10"} for i in range(4)])
+    if path.endswith("/transactions"):
+        return httpx.Response(200, json=[{"tx_hash": "tx_gen"}])
+    if path.endswith("/utxos"):
+        return httpx.Response(200, json={"inputs": [{"address": "master_addr"}]})
+    if "/assets/" in path:
+        return httpx.Response(200, json={"quantity": "40"})
+    return httpx.Response(404)
+
+def _patched(handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return (patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"),
+            patch("packages.backend.src.insider_engine.get_client", return_value=client))
+
+def _ndjson(resp):
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+def test_stream_sends_holders_then_links_then_masters_and_score():
+    key, client_patch = _patched(_blockfrost)
+    with key, client_patch:
+        with TestClient(app) as client:
+            live = client.get(f"/analyze/bundle/{POLICY}/stream")
+            replay = client.get(f"/analyze/bundle/{POLICY}/stream")
+            stored = client.get(f"/analyze/bundle/{POLICY}")
+
+    assert live.headers["content-type"].startswith("application/x-ndjson")
+    events = _ndjson(live)
+    kinds = [e["event"] for e in events]
+    assert kinds[:4] == ["node"] * 4 and {e["data"]["id"] for e in events[:4]} == {f"addr_{i}" for i in range(4)}
+    assert kinds.count("link") == 4
+    # The master is first sent when its first link appears, then again once it is known to be one
+    master_events = [e["data"] for e in events if e["event"] == "node" and e["data"]["id"] == "master_addr"]
+    assert [m["group"] for m in master_events] == ["victim", "master"]
+    score = events[-1]
+    assert score["event"] == "score"
+    assert score["data"]["risk_score"] == 100 and score["data"]["masters"] == ["master_addr"]
+    assert score["data"]["holders"] == 4 and score["data"]["links"] == 4 and not score["data"]["cached"]
+
+    # The streamed analysis filled the cache
+    replayed = _ndjson(replay)
+    assert replayed[-1]["data"]["cached"] and replayed[-1]["data"]["risk_score"] == 100
+    assert len(stored.json()["nodes"]) == 5
+
+def test_sse_format_and_errors_as_events():
+    key, client_patch = _patched(_blockfrost)
+    with key, client_patch, \
+         patch("packages.backend.src.insider_engine._risk", side_effect=RuntimeError("boom")):
+        with TestClient(app) as client:
+            resp = client.get(f"/analyze/bundle/{'01' * 28}/stream", headers={"Accept": "text/event-stream"})
+            bad = client.get("/analyze/bundle/short/stream")
+
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    frames = resp.text.strip().split("\n\n")
+    assert frames[0].startswith("event: node\ndata: {")
+    assert frames[-1] == 'event: error\ndata: {"detail": "bundle analysis failed"}'
+    assert bad.status_code == 400
+
+@pytest.mark.asyncio
+async def test_first_events_arrive_before_funder_tracing_finishes():
+    released = asyncio.Event()
+
+    async def slow_utxos(request):
+        if request.url.path.endswith("/utxos"):
+            await released.wait()
+        return _blockfrost(request)
+
+    key, client_patch = _patched(slow_utxos)
+    with key, client_patch:
+        stream = stream_bundle("slow_policy", limit=50)
+        first = [await stream.__anext__() for _ in range(4)]
+        assert all(kind == "node" and node.hop == 0 for kind, node in first)
+        released.set()
+        rest = [event async for event in stream]
+
+    assert rest[-1][0] == "score" and rest[-1][1].masters == ["master_addr"]
+
+@pytest.mark.asyncio
+async def test_streams_and_requests_for_one_token_share_one_analysis():
+    from packages.backend.src.insider_engine import analyze_bundle
+    from packages.backend.src.xray_engine import metrics
+    calls = []
+    released = asyncio.Event()
+
+    async def counted(request):
+        calls.append(request.url.path)
+        if request.url.path.endswith("/utxos"):
+            await released.wait()
+        return _blockfrost(request)
+
+    async def consume():
+        return [event async for event in stream_bundle("shared_policy")]
+
+    async def until(condition):
+        while not condition():
+            await asyncio.sleep(0.001)
+
+    key, client_patch = _patched(counted)
+    with key, client_patch:
+        first = asyncio.ensure_future(consume())
+        await until(lambda: any(path.endswith("/utxos") for path in calls))
+        # Join midway: the events found so far are replayed
+        joined = metrics.coalesced_hits
+        both = asyncio.gather(consume(), analyze_bundle("shared_policy"))
+        await until(lambda: metrics.coalesced_hits == joined + 2)
+        released.set()
+        late, result = await both
+        early = await first
+
+    # One fan-out: holders + supply, then 2 calls per holder
+    assert len(calls) == 2 + 2 * 4
+    for events in (early, late):
+        assert [kind for kind, _ in events].count("link") == 4
+        assert events[-1][1].risk_score == result.risk_score == 100
+    assert [(kind, e.model_dump_json()) for kind, e in early] == [(kind, e.model_dump_json()) for kind, e in late]
+
+@pytest.mark.asyncio
+async def test_stream_joining_while_the_result_is_stored_gets_the_whole_graph():
+    from packages.backend.src import insider_engine
+    loop = asyncio.get_running_loop()
+    storing = asyncio.Event()
+    stored = threading.Event()
+    upsert = insider_engine.upsert_bundle
+
+    def slow_upsert(result):
+        # Runs on the writer thread: hold the persist until the late stream has joined
+        loop.call_soon_threadsafe(storing.set)
+        stored.wait(5)
+        upsert(result)
+
+    async def consume():
+        return [event async for event in stream_bundle("late_policy")]
+
+    key, client_patch = _patched(_blockfrost)
+    with key, client_patch, patch.object(insider_engine, "upsert_bundle", slow_upsert):
+        request = asyncio.ensure_future(insider_engine.analyze_bundle("late_policy"))
+        await storing.wait()
+        late = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        stored.set()
+        result = await request
+        events = await late
+
+    assert [kind for kind, _ in events].count("link") == 4 == events[-1][1].links
+    assert {e.id for kind, e in events if kind == "node"} == {f"addr_{i}" for i in range(4)} | {"master_addr"}
+    assert events[-1][1].risk_score == result.risk_score == 100
@@ -0,0 +1,89 @@
+import os
+import random
+
+import networkx as nx
+import pytest
+
+from packages.backend.src.compact_graph import CompactGraph
+from packages.backend.src.insider_engine import _build_graph, _score_graph, _score_graph_nx
+from packages.backend.src.models import BundleAnalysisResult
+
+# The 1M-edge equivalence run takes a while; opt in with NEXGUARD_LARGE_GRAPH_TESTS=1
+LARGE = os.getenv("NEXGUARD_LARGE_GRAPH_TESTS") == "1"
+
+def generated(holders: int, funder_pool: int, seed: int, upstream_edges: int = 0):
+    """Holder/funder lists shaped like real bundles: clustered funders, some holders funding others."""
+    rng = random.Random(seed)
+    addresses = [f"addr_{i}" for i in range(holders)]
+    funders = []
+    for i in range(holders):
+        roll = rng.random()
+        if roll < 0.1:
+            funders.append(None)
+        elif roll < 0.2:
+            funders.append(f"addr_{rng.randrange(holders)}")  # funded by another holder
+        else:
+            funders.append(f"funder_{rng.randrange(funder_pool)}")
+    upstream = [
+        (f"funder_{rng.randrange(funder_pool)}", f"funder_{rng.randrange(funder_pool)}", rng.randint(2, 4))
+        for _ in range(upstream_edges)
+    ]
+    return addresses, funders, upstream
+
+def empty_result() -> BundleAnalysisResult:
+    return BundleAnalysisResult(policy_id="policy_gen", nodes=[], links=[])
+
+def reference_graph(addresses, funders, upstream) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for address, funder in zip(addresses, funders):
+        G.add_node(address)
+        if funder:
+            G.add_edge(funder, address, hop=1)
+    for funder, funded, hop in upstream:
+        G.add_edge(funder, funded, hop=hop)
+    return G
+
+@pytest.mark.parametrize("holders,funder_pool,upstream_edges", [(0, 1, 0), (20, 4, 0), (500, 30, 50), (5000, 200, 2000)])
+def test_scoring_matches_networkx(holders, funder_pool, upstream_edges):
+    addresses, funders, upstream = generated(holders, funder_pool, seed=holders, upstream_edges=upstream_edges)
+    compact, reference = empty_result(), empty_result()
+    _score_graph(compact, addresses, funders, upstream)
+    _score_graph_nx(reference, addresses, funders, upstream)
+
+    assert [(n.id, n.group, n.color, n.hop) for n in compact.nodes] == [(n.id, n.group, n.color, n.hop) for n in reference.nodes]
+    assert [(l.source, l.target, l.hop) for l in compact.links] == [(l.source, l.target, l.hop) for l in reference.links]
+    assert compact.risk_score == reference.risk_score
+
+def test_duplicate_edges_keep_position_and_take_newest_hop():
+    G = CompactGraph()
+    G.add_edge("a", "b", hop=1)
+    G.add_edge("a", "c", hop=1)
+    G.add_edge("a", "b", hop=3)
+    assert G.edges() == [("a", "b", 3), ("a", "c", 1)]
+    assert G.out_degree().tolist() == [2, 0, 0]
+    assert G.in_degree().tolist() == [0, 1, 1]
+
+@pytest.mark.parametrize("edges", [
+    20_000,
+    pytest.param(1_000_000, marks=pytest.mark.skipif(not LARGE, reason="set NEXGUARD_LARGE_GRAPH_TESTS=1")),
+])
+def test_degrees_and_components_match_networkx(edges):
+    addresses, funders, upstream = generated(edges, funder_pool=edges // 50, seed=7, upstream_edges=edges // 20)
+    G = _build_graph(addresses, funders, upstream)
+    R = reference_graph(addresses, funders, upstream)
+
+    assert G.labels == list(R.nodes())
+    assert G.edges() == list(R.edges(data="hop"))
+    assert G.out_degree().tolist() == [d for _, d in R.out_degree()]
+    assert G.in_degree().tolist() == [d for _, d in R.in_degree()]
+
+    ids = {label: i for i, label in enumerate(G.labels)}
+    components = G.components()
+    expected = sorted(sorted(ids[label] for label in c) for c in nx.weakly_connected_components(R))
+    found = {}
+    for node_id, component in enumerate(components.tolist()):
+        found.setdefault(component, []).append(node_id)
+    assert sorted(found.values()) == expected
+    # Numbered in order of each component's first node
+    assert [members[0] for _, members in sorted(found.items())] == sorted(c[0] for c in expected)
+    assert G.component_sizes().sum() == len(G)
@@ -1,8 +1,11 @@
 import pytest
 import asyncio
+import random
 from unittest.mock import patch, MagicMock
-from packages.backend.src.insider_engine import analyze_bundle
+from packages.backend.src.insider_engine import analyze_bundle, analyze_bundles, _analyze_uncached
 from packages.backend.src.models import BundleAnalysisResult
+from packages.backend.src.xray_engine import metrics
+from packages.backend.src.bundle_db_sqlite import fetch_funders
 
 # Mock data
 MOCK_HOLDERS = [
@@ -61,3 +64,451 @@ async def test_insider_engine_graceful_fail():
                  result = await analyze_bundle("policy_fail")
                  assert result.risk_score == 0
                  assert len(result.nodes) == 0
+
+@pytest.mark.asyncio
+async def test_insider_engine_concurrent_tracing_is_deterministic():
+    holders = [{"address": f"addr_{i}"} for i in range(12)]
+
+    async def mock_bf_get(client, path, params=None):
+        # Random latency so lookups resolve out of order
+        await asyncio.sleep(random.uniform(0, 0.01))
+        if "/assets/" in path:
+            return holders
+        if "/transactions" in path:
+            address = path.split("/")[2]
+            return [{"tx_hash": f"tx_{address}"}]
+        if "/utxos" in path:
+            index = int(path.split("_")[-1].split("/")[0])
+            return {"inputs": [{"address": f"funder_{index % 3}"}]}
+        return None
+
+    results = []
+    with patch("packages.backend.src.insider_engine.fetch_bundle", return_value=None):
+        with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+            with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+                with patch("packages.backend.src.insider_engine.upsert_bundle"):
+                    for _ in range(3):
+                        results.append(await analyze_bundle("policy_order"))
+
+    # Same nodes and links, in the same order, as a sequential walk would produce
+    expected_nodes = []
+    for i in range(12):
+        for node in (f"addr_{i}", f"funder_{i % 3}"):
+            if node not in expected_nodes:
+                expected_nodes.append(node)
+    for result in results:
+        assert [n.id for n in result.nodes] == expected_nodes
+        assert [(l.source, l.target) for l in result.links] == [
+            (l.source, l.target) for l in results[0].links
+        ]
+        # 4 holders per funder -> 3 masters
+        assert result.risk_score == 60
+
+@pytest.mark.asyncio
+async def test_insider_engine_coalesces_concurrent_analyses():
+    calls = []
+
+    async def mock_bf_get(client, path, params=None):
+        calls.append(path)
+        await asyncio.sleep(0.01)
+        if "/assets/" in path:
+            return MOCK_HOLDERS
+        if "/transactions" in path:
+            return [{"tx_hash": "tx_gen"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": "master_addr"}]}
+        return None
+
+    metrics.coalesced_hits = 0
+    with patch("packages.backend.src.insider_engine.fetch_bundle", return_value=None):
+        with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+            with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+                with patch("packages.backend.src.insider_engine.upsert_bundle") as upsert:
+                    results = await asyncio.gather(*(analyze_bundle("policy_hot") for _ in range(5)))
+
+    # One fan-out (holders + supply calls, 2 per holder) shared by all five callers
+    assert len(calls) == 2 + 2 * len(MOCK_HOLDERS)
+    assert upsert.call_count == 1
+    assert all(r is results[0] for r in results)
+    assert metrics.coalesced_hits == 4
+
+@pytest.mark.asyncio
+async def test_analyze_bundles_shares_funder_lookups_across_policies():
+    holders = {
+        "policy_a": [{"address": "shared_1"}, {"address": "shared_2"}, {"address": "only_a"}],
+        "policy_b": [{"address": "shared_1"}, {"address": "shared_2"}, {"address": "only_b"}],
+    }
+    calls = []
+    # Hold the funder answers until both policies are tracing, so neither one's
+    # index write can land before the other looks its holders up
+    all_traced = asyncio.Event()
+
+    async def mock_bf_get(client, path, params=None):
+        calls.append(path)
+        await asyncio.sleep(0)
+        if "/assets/" in path:
+            return holders[path.split("/")[2]]
+        if "/transactions" in path:
+            if sum("/transactions" in call for call in calls) == 4:
+                all_traced.set()
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            await all_traced.wait()
+            return {"inputs": [{"address": "deployer"}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine.fetch_bundle", return_value=None):
+        with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+            with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+                with patch("packages.backend.src.insider_engine.upsert_bundle"):
+                    batch = await analyze_bundles(["policy_a", "policy_b"])
+
+    # 2 holder + 2 supply calls + 4 distinct addresses * 2 calls; the shared pair is resolved once
+    assert len(calls) == 4 + 4 * 2
+    assert batch.stats.blockfrost_calls == len(calls)
+    assert batch.stats.calls_saved == 4
+    assert batch.stats.shared_addresses == 2
+    assert [r.policy_id for r in batch.results] == ["policy_a", "policy_b"]
+    for result in batch.results:
+        assert {l.source for l in result.links} == {"deployer"}
+        assert len(result.links) == 3
+
+@pytest.mark.asyncio
+async def test_failed_lookup_in_a_batch_degrades_only_its_policy():
+    from packages.backend.src.blockfrost_client import BlockfrostUnavailable
+    holders = {
+        "policy_a": [{"address": "shared"}, {"address": "only_a"}],
+        "policy_b": [{"address": "shared"}, {"address": "only_b"}],
+    }
+    failed = asyncio.Event()
+
+    async def mock_bf_get(client, path, params=None):
+        await asyncio.sleep(0)
+        if "/assets/" in path:
+            return holders[path.split("/")[2]]
+        if path == "/addresses/only_a/transactions":
+            failed.set()
+            raise BlockfrostUnavailable("retries exhausted")
+        if "/transactions" in path:
+            # Still running when policy_a gives up on its other lookups
+            await failed.wait()
+            await asyncio.sleep(0.01)
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": "deployer"}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine.fetch_bundle", return_value=None):
+        with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+            with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+                with patch("packages.backend.src.insider_engine.upsert_bundle"):
+                    batch = await analyze_bundles(["policy_a", "policy_b"])
+
+    policy_a, policy_b = batch.results
+    assert policy_a.degraded and policy_a.links == []
+    assert not policy_b.degraded
+    assert {(l.source, l.target) for l in policy_b.links} == {("deployer", "shared"), ("deployer", "only_b")}
+
+@pytest.mark.asyncio
+async def test_funder_index_removes_repeat_lookups():
+    calls = []
+
+    async def mock_bf_get(client, path, params=None):
+        calls.append(path)
+        if path.endswith("/addresses"):
+            return MOCK_HOLDERS
+        if "/assets/" in path:
+            return {"quantity": "1000"}
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": "master_addr"}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine.fetch_bundle", return_value=None):
+        with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+            with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+                with patch("packages.backend.src.insider_engine.upsert_bundle"):
+                    first = await analyze_bundle("policy_index")
+                    cold_calls = len(calls)
+                    calls.clear()
+                    # Bundle cache expired: only the holder snapshot is re-fetched
+                    second = await analyze_bundle("policy_index")
+
+    assert cold_calls == 2 + 2 * len(MOCK_HOLDERS)
+    assert calls == ["/assets/policy_index/addresses"]
+    assert [(l.source, l.target) for l in second.links] == [(l.source, l.target) for l in first.links]
+    assert second.risk_score == first.risk_score == 20
+
+@pytest.mark.asyncio
+async def test_funder_index_skips_unresolved_lookups():
+    async def mock_bf_get(client, path, params=None):
+        if "/assets/" in path:
+            return MOCK_HOLDERS[:1]
+        return None  # Blockfrost failure: nothing permanent learned
+
+    with patch("packages.backend.src.insider_engine.fetch_bundle", return_value=None):
+        with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+            with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+                with patch("packages.backend.src.insider_engine.upsert_bundle"):
+                    await analyze_bundle("policy_unresolved")
+
+    assert fetch_funders(["addr_1"]) == {}
+
+@pytest.mark.asyncio
+async def test_stale_bundle_is_served_while_one_refresh_runs():
+    from datetime import datetime, timedelta
+    from packages.backend.src.bundle_db_sqlite import upsert_bundle
+    from packages.backend.src.xray_engine import flights
+
+    old = BundleAnalysisResult(policy_id="policy_swr", nodes=[], links=[], risk_score=0, timestamp=datetime.utcnow() - timedelta(hours=30))
+    upsert_bundle(old)
+    holder_calls = []
+
+    async def mock_bf_get(client, path, params=None):
+        if "/assets/" in path:
+            if path.endswith("/addresses"):
+                holder_calls.append(path)
+            await asyncio.sleep(0.01)
+            return MOCK_HOLDERS
+        if "/transactions" in path:
+            return [{"tx_hash": "tx_gen"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": "master_addr"}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            served = await asyncio.gather(*(analyze_bundle("policy_swr") for _ in range(3)))
+            assert all(r.stale and r.risk_score == 0 for r in served)
+            while flights.in_flight(("bundle", "policy_swr")):
+                await asyncio.sleep(0.005)
+            refreshed = await analyze_bundle("policy_swr")
+
+    assert len(holder_calls) == 1
+    assert not refreshed.stale
+    assert refreshed.risk_score == 20
+
+@pytest.mark.asyncio
+async def test_refresh_only_traces_new_holders():
+    holders = list(MOCK_HOLDERS)
+    calls = []
+
+    async def mock_bf_get(client, path, params=None):
+        calls.append(path)
+        if path.endswith("/addresses"):
+            return holders
+        if "/assets/" in path:
+            return {"quantity": "1000"}
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": "master_addr"}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            first = await _analyze_uncached("policy_snap")
+            assert len(calls) == 2 + 2 * len(MOCK_HOLDERS)
+
+            # Stable holder set: one holders call, nothing traced, the stored supply reused
+            calls.clear()
+            steady = await _analyze_uncached("policy_snap")
+            assert calls == ["/assets/policy_snap/addresses"]
+            assert [n.id for n in steady.nodes] == [n.id for n in first.nodes]
+            assert steady.risk_score == 20
+
+            # addr_4 leaves, addr_5 arrives: only addr_5 is traced, and the supply fetched again
+            holders[3] = {"address": "addr_5"}
+            calls.clear()
+            changed = await _analyze_uncached("policy_snap")
+            assert sorted(calls) == sorted(["/assets/policy_snap/addresses", "/assets/policy_snap",
+                                            "/addresses/addr_5/transactions", "/txs/tx_addr_5/utxos"])
+
+    ids = [n.id for n in changed.nodes]
+    assert "addr_4" not in ids and "addr_5" in ids
+    assert changed.risk_score == 20
+
+@pytest.mark.asyncio
+async def test_deep_analysis_pages_holders_and_reports_progress():
+    from packages.backend.src.insider_engine import analyze_bundle_deep
+
+    pages = []
+
+    async def mock_bf_get(client, path, params=None):
+        if path.endswith("/addresses"):
+            pages.append(params["page"])
+            start = (params["page"] - 1) * params["count"]
+            return [{"address": f"addr_{i}"} for i in range(start, min(start + params["count"], 250))]
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            index = int(path.split("_")[-1].split("/")[0])
+            return {"inputs": [{"address": f"funder_{index % 5}"}]}
+        return None
+
+    progress = []
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            result = await analyze_bundle_deep("policy_deep", limit=1000, progress=progress.append)
+            assert pages == [1, 2, 3]
+            assert progress == [100, 200, 250]
+            assert len(result.nodes) == 250 + 5
+            assert len(result.links) == 250
+            # Each funder feeds 50 holders
+            assert result.risk_score == 100
+
+            pages.clear()
+            limited = await analyze_bundle_deep("policy_deep", limit=150)
+            assert pages == [1, 2]
+            assert len(limited.links) == 150
+
+@pytest.mark.asyncio
+async def test_multi_hop_tracing_exposes_ring_behind_intermediaries():
+    # 8 holders <- 4 intermediaries (2 each) <- one boss, who was funded by an intermediary (a cycle)
+    funded_by = {f"holder_{i}": f"mid_{i // 2}" for i in range(8)}
+    funded_by.update({f"mid_{i}": "boss" for i in range(4)})
+    funded_by["boss"] = "mid_0"
+    calls = []
+
+    async def mock_bf_get(client, path, params=None):
+        calls.append(path)
+        if "/assets/" in path:
+            return [{"address": f"holder_{i}"} for i in range(8)]
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": funded_by[path.split("/")[2][len("tx_"):]]}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            one_hop = await _analyze_uncached("policy_ring_1")
+            assert one_hop.risk_score == 0
+
+            with patch("packages.backend.src.insider_engine.BUNDLE_FUNDER_HOPS", 3):
+                calls.clear()
+                result = await _analyze_uncached("policy_ring_3")
+
+    # Holders come from the index now; only the 4 mids and the boss cost calls
+    assert len(calls) == 2 + 2 * 5
+    hops = {n.id: n.hop for n in result.nodes}
+    assert hops["holder_0"] == 0 and hops["mid_0"] == 1 and hops["boss"] == 2
+    boss = next(n for n in result.nodes if n.id == "boss")
+    assert boss.group == "master"
+    assert result.risk_score == 20
+    # The boss's own funder was already visited: the edge is kept, nothing is re-expanded
+    assert {(l.source, l.target, l.hop) for l in result.links if l.hop > 1} == {
+        ("boss", "mid_0", 2), ("boss", "mid_1", 2), ("boss", "mid_2", 2), ("boss", "mid_3", 2), ("mid_0", "boss", 3),
+    }
+
+@pytest.mark.asyncio
+async def test_multi_hop_tracing_respects_call_budget():
+    funded_by = {f"holder_{i}": f"mid_{i}" for i in range(4)}
+    funded_by.update({f"mid_{i}": f"top_{i}" for i in range(4)})
+
+    async def mock_bf_get(client, path, params=None):
+        if "/assets/" in path:
+            return [{"address": f"holder_{i}"} for i in range(4)]
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            return {"inputs": [{"address": funded_by[path.split("/")[2][len("tx_"):]]}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            with patch("packages.backend.src.insider_engine.BUNDLE_FUNDER_HOPS", 2), \
+                 patch("packages.backend.src.insider_engine.BUNDLE_HOP_CALL_BUDGET", 4):
+                result = await _analyze_uncached("policy_budget")
+
+    # Budget of 4 calls covers two of the four intermediaries
+    assert [l.source for l in result.links if l.hop == 2] == ["top_0", "top_1"]
+
+@pytest.mark.asyncio
+async def test_cluster_share_is_of_the_total_supply():
+    from datetime import timedelta
+    from packages.backend.src.blockfrost_client import BlockfrostUnavailable
+    from packages.backend.src.bundle_db_sqlite import fetch_bundle
+    # Two of the top holders share a funder (an exchange hot wallet, say)
+    holders = [{"address": "addr_1", "quantity": "600"}, {"address": "addr_2", "quantity": "300"},
+               {"address": "addr_3", "quantity": "100"}]
+    supply = {"quantity": "100000"}
+
+    async def mock_bf_get(client, path, params=None):
+        if path.endswith("/addresses"):
+            return holders
+        if "/assets/" in path:
+            if isinstance(supply, Exception):
+                raise supply
+            return supply
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path:
+            funder = "exchange" if "addr_3" not in path else "someone"
+            return {"inputs": [{"address": funder}]}
+        return None
+
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            spread = await _analyze_uncached("policy_exchange")
+            # 900 of 100k: negligible, although it is 90% of what the top holders hold
+            assert spread.clusters[0].supply_share == 0.009
+            assert spread.risk_score == 1
+
+            supply = {"quantity": "1000"}
+            concentrated = await _analyze_uncached("policy_concentrated")
+            assert concentrated.risk_score == 90
+
+            # Supply unknown: shares are of the analyzed holders, capped in the score
+            supply = None
+            unknown = await _analyze_uncached("policy_unknown")
+            assert unknown.clusters[0].supply_share == 0.9
+            assert unknown.risk_score == 40
+
+            # The supply lookup failing doesn't degrade the analysis: it is scored the same way
+            supply = BlockfrostUnavailable("retries exhausted")
+            failed = await _analyze_uncached("policy_failed")
+            assert not failed.degraded and failed.risk_score == 40
+            assert fetch_bundle("policy_failed").risk_score == 40
+
+            # Stored with the snapshot: a refresh of the same holders reuses it
+            supply = {"quantity": "1000"}
+            assert (await _analyze_uncached("policy_exchange")).risk_score == 1
+            # The failed lookup is retried on the next refresh
+            assert (await _analyze_uncached("policy_failed")).risk_score == 90
+
+            # Older than BUNDLE_SUPPLY_MAX_AGE: fetched again
+            with patch("packages.backend.src.insider_engine.BUNDLE_SUPPLY_MAX_AGE", timedelta(0)):
+                assert (await _analyze_uncached("policy_exchange")).risk_score == 90
+
+@pytest.mark.asyncio
+async def test_failed_lookup_degrades_instead_of_caching_a_partial_graph():
+    from datetime import datetime, timedelta
+    from packages.backend.src.blockfrost_client import BlockfrostUnavailable
+    from packages.backend.src.bundle_db_sqlite import upsert_bundle, fetch_bundle
+
+    old = BundleAnalysisResult(policy_id="policy_outage", nodes=[], links=[], risk_score=60,
+                               timestamp=datetime.utcnow() - timedelta(hours=30))
+    upsert_bundle(old)
+
+    async def mock_bf_get(client, path, params=None):
+        if "/assets/" in path:
+            return MOCK_HOLDERS
+        if "/transactions" in path:
+            return [{"tx_hash": f"tx_{path.split('/')[2]}"}]
+        if "/utxos" in path and "addr_3" in path:
+            # The breaker opens while the funders are being traced
+            raise BlockfrostUnavailable("circuit open")
+        return {"inputs": [{"address": "master_addr"}]}
+
+    with patch("packages.backend.src.insider_engine._bf_get", side_effect=mock_bf_get):
+        with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+            result = await _analyze_uncached("policy_outage")
+
+    # The last stored bundle, flagged, and still the stored one
+    assert result.degraded and result.stale and result.risk_score == 60
+    stored = fetch_bundle("policy_outage")
+    assert stored.risk_score == 60 and stored.timestamp == old.timestamp
+    # Lookups that did complete are kept in the funder index
+    assert fetch_funders(["addr_1", "addr_3"]) == {"addr_1": "master_addr"}
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from packages.backend.src.memory_cache import TTLCache
+from packages.backend.src.models import BundleAnalysisResult
+from packages.backend.src.bundle_db_sqlite import upsert_bundle, bundle_cache
+from packages.backend.src.insider_engine import analyze_bundle
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache("test", maxsize=2, ttl=timedelta(hours=1))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recent
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+def test_ttl_follows_row_timestamp():
+    cache = TTLCache("test", maxsize=10, ttl=timedelta(hours=24))
+    cache.set("old", "x", datetime.utcnow() - timedelta(hours=25))
+    assert cache.get("old") is None  # already stale, never stored
+
+    cache.set("aging", "y", datetime.utcnow() - timedelta(hours=23))
+    assert cache.get("aging") == "y"
+    with patch("packages.backend.src.memory_cache.datetime") as fake_dt:
+        fake_dt.utcnow.return_value = datetime.utcnow() + timedelta(hours=2)
+        assert cache.get("aging") is None
+    assert cache.expirations == 1
+
+@pytest.mark.asyncio
+async def test_upsert_bundle_writes_through_to_memory():
+    bundle_cache.clear()
+    result = BundleAnalysisResult(policy_id="policy_memory", nodes=[], links=[], risk_score=40)
+    upsert_bundle(result)
+
+    # Served from memory: neither SQLite nor Blockfrost is touched
+    with patch("packages.backend.src.insider_engine.fetch_bundle") as fetch:
+        with patch("packages.backend.src.insider_engine._bf_get") as bf_get:
+            cached = await analyze_bundle("policy_memory")
+    assert cached is result
+    fetch.assert_not_called()
+    bf_get.assert_not_called()
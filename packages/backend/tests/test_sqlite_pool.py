@@ -0,0 +1,126 @@
+import asyncio
+import sqlite3
+import threading
+import pytest
+from packages.backend.src.sqlite_pool import ConnectionPool
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), readers=2)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)")
+    yield pool
+    pool.close()
+
+def test_pool_enables_wal_and_reuses_connections(pool):
+    with pool.writer() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        first_writer = conn
+    with pool.writer() as conn:
+        assert conn is first_writer
+
+    with pool.reader() as conn:
+        first_reader = conn
+    with pool.reader() as conn:
+        assert conn is first_reader
+
+def test_readers_are_read_only(pool):
+    with pool.reader() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO kv VALUES ('a', 1)")
+
+def test_writer_rolls_back_on_error(pool):
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO kv VALUES ('a', 1)")
+            raise RuntimeError("boom")
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] == 0
+
+def test_concurrent_readers_and_writer(pool):
+    errors = []
+
+    def write(n):
+        for i in range(50):
+            with pool.writer() as conn:
+                conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?)", (f"{n}-{i}", i))
+
+    def read():
+        try:
+            for _ in range(100):
+                with pool.reader() as conn:
+                    conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(3)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] == 150
+
+@pytest.mark.asyncio
+async def test_async_writes_commit_in_batches_and_fail_independently(pool):
+    def insert(k, v):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO kv VALUES (?, ?)", (k, v))
+        return v
+
+    results = await asyncio.gather(
+        *(pool.write(insert, f"k{i}", i) for i in range(50)),
+        pool.write(insert, "k0", -1),  # duplicate key: only this write fails
+        return_exceptions=True,
+    )
+
+    assert results[:50] == list(range(50))
+    assert isinstance(results[50], sqlite3.IntegrityError)
+    assert pool.batched_writes == 51 and pool.batches < 51
+    assert await pool.read(lambda: _count(pool)) == 50
+
+@pytest.mark.asyncio
+async def test_async_reads_run_off_the_event_loop(pool):
+    def where():
+        with pool.reader() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return threading.current_thread().name
+
+    assert (await pool.read(where)).startswith("sqlite-pool-read")
+
+def _count(pool):
+    with pool.reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+def test_migrations_run_once_and_record_the_version(tmp_path):
+    path = str(tmp_path / "migrated.db")
+    calls = []
+    migrations = [
+        ["CREATE TABLE a (x INTEGER)"],
+        lambda conn: calls.append(conn.execute("INSERT INTO a VALUES (1)")),
+    ]
+    first = ConnectionPool(path, migrations=migrations)
+    assert first.migrate() == 2
+    first.close()
+
+    again = ConnectionPool(path, migrations=migrations + [["ALTER TABLE a ADD COLUMN y TEXT"]])
+    with again.reader() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(*) FROM a").fetchone()[0] == 1
+    assert len(calls) == 1 and again.schema_version == 3
+    again.close()
+
+def test_failed_migration_leaves_previous_version(tmp_path):
+    path = str(tmp_path / "failed.db")
+    ConnectionPool(path, migrations=[["CREATE TABLE a (x INTEGER)"]]).migrate()
+
+    broken = ConnectionPool(path, migrations=[["CREATE TABLE a (x INTEGER)"], ["CREATE TABLE b (x)", "SELECT nope FROM a"]])
+    with pytest.raises(sqlite3.OperationalError):
+        broken.migrate()
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'b'").fetchone() is None
+    conn.close()
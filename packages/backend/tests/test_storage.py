@@ -0,0 +1,164 @@
+import time
+import sqlite3
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from packages.backend.src import storage
+from packages.backend.src.sqlite_pool import ConnectionPool
+from packages.backend.src import mpm_db
+from packages.backend.src.mpm_db import upsert_mpm, fetch_mpm, fetch_top_mpm
+from packages.backend.src.masumi_naughty import db as naughty_db
+
+# mpm_metrics as db.js creates it: no breakdown column
+NODE_MPM_TABLE = """
+CREATE TABLE mpm_metrics (
+    policy_id TEXT PRIMARY KEY, token_symbol TEXT, window_min INTEGER NOT NULL, mpm REAL NOT NULL,
+    sentiment TEXT NOT NULL, sample_size INTEGER NOT NULL, last_updated TEXT NOT NULL
+)
+"""
+
+def test_audit_migrations_upgrade_a_node_created_database(tmp_path):
+    path = str(tmp_path / "audit.db")
+    conn = sqlite3.connect(path)
+    conn.execute(NODE_MPM_TABLE)
+    conn.close()
+
+    pool = ConnectionPool(path, migrations=storage.AUDIT_MIGRATIONS)
+    assert pool.migrate() == len(storage.AUDIT_MIGRATIONS)
+    with pool.reader() as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(mpm_metrics)")}
+        assert "breakdown" in columns
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'naughty_wallets'").fetchone()
+    pool.close()
+
+def test_helpers_run_no_schema_statements_per_call():
+    storage.migrate()
+    record = {"policyId": "p1", "tokenSymbol": "TEST", "windowMinutes": 5, "mpm": 4.2,
+              "sentiment": "bullish", "sampleSize": 3, "breakdown": [{"text": "gm"}]}
+    with patch.object(storage.audit, "_migrate") as migrate:
+        upsert_mpm(record)
+        mpm_db.pending.flush()
+        assert fetch_mpm("p1")["breakdown"] == [{"text": "gm"}]
+    migrate.assert_not_called()
+
+def _stored(pool, sql, *params):
+    with pool.reader() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def test_write_behind_batches_rows_and_serves_pending_ones(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "wb.db"), migrations=[["CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)"]])
+    buffer = pool.write_behind("kv", ("k", "v"), ("k",), batch_size=1000, interval=60)
+    for i in range(300):
+        buffer.put((f"k{i % 100}", i))
+
+    # Not stored yet, but readable; later rows for a key replaced earlier ones
+    assert _stored(pool, "SELECT COUNT(*) FROM kv")[0][0] == 0
+    assert buffer.get(("k5",)) == {"k": "k5", "v": 205}
+    assert buffer.pending == 100
+
+    pool.close()
+    assert _stored(pool, "SELECT COUNT(*) FROM kv")[0][0] == 100
+    assert buffer.flushes == 1 and buffer.rows_written == 100
+    assert buffer.get(("k5",)) is None
+    pool.close()
+
+def test_write_behind_flushes_when_the_batch_fills(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "wb.db"), migrations=[["CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)"]])
+    buffer = pool.write_behind("kv", ("k", "v"), ("k",), batch_size=10, interval=60)
+    for i in range(10):
+        buffer.put((f"k{i}", i))
+    for _ in range(200):
+        if buffer.flushes:
+            break
+        buffer._thread.join(timeout=0.01)
+    assert buffer.flushes == 1 and _stored(pool, "SELECT COUNT(*) FROM kv")[0][0] == 10
+    pool.close()
+
+@pytest.mark.asyncio
+async def test_zero_interval_puts_never_write_on_the_event_loop(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "wb.db"), migrations=[["CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)"]])
+    buffer = pool.write_behind("kv", ("k", "v"), ("k",), batch_size=1000, interval=0)
+    pool.migrate()
+    busy, release = threading.Event(), threading.Event()
+
+    def long_write():
+        with pool.writer():
+            busy.set()
+            release.wait(5)
+
+    writer = threading.Thread(target=long_write)
+    writer.start()
+    busy.wait()
+    # The writer is busy: a put that wrote itself would block here until it is released
+    start = time.perf_counter()
+    buffer.put(("k", 1))
+    assert time.perf_counter() - start < 0.5
+    assert buffer.get(("k",)) == {"k": "k", "v": 1}
+
+    release.set()
+    writer.join()
+    for _ in range(200):
+        if not buffer.pending:
+            break
+        await asyncio.sleep(0.01)
+    assert _stored(pool, "SELECT v FROM kv WHERE k = 'k'")[0][0] == 1
+    pool.close()
+
+def test_naughty_wallets_read_their_writes_and_update_buffered_rows():
+    record = {"wallet": "addr_w", "policy_id": "p1", "classification": "insider", "sass_score": 80,
+              "evidence": {"funded_by": "addr_m"}, "decision_hash": "h", "onchain_tx": "SIMULATED", "timestamp": "t"}
+    naughty_db.upsert_naughty_wallet(record)
+    assert naughty_db.fetch_naughty_wallet("addr_w", "p1")["evidence"] == {"funded_by": "addr_m"}
+
+    assert naughty_db.update_onchain_tx("addr_w", "p1", "tx_real")
+    assert naughty_db.pending.pending == 1
+    assert naughty_db.fetch_naughty_wallet("addr_w", "p1")["onchain_tx"] == "tx_real"
+
+    # Once stored, the UPDATE finds the row in the table
+    naughty_db.pending.flush()
+    assert naughty_db.update_onchain_tx("addr_w", "p1", "tx_final")
+    assert naughty_db.fetch_naughty_wallet("addr_w", "p1")["onchain_tx"] == "tx_final"
+    assert not naughty_db.update_onchain_tx("addr_unknown", "p1", "tx")
+
+@pytest.mark.asyncio
+async def test_confirm_tx_write_job_never_waits_on_the_flusher():
+    record = {"wallet": "addr_c", "policy_id": "p1", "classification": "insider", "sass_score": 80,
+              "evidence": {}, "decision_hash": "h", "onchain_tx": "SIMULATED", "timestamp": "t"}
+    naughty_db.upsert_naughty_wallet(record)
+    # A flush in progress holds the flush lock while it waits for the writer the job runs under
+    with naughty_db.pending._flush_lock:
+        updated = await asyncio.wait_for(
+            storage.audit.write(naughty_db.update_onchain_tx, "addr_c", "p1", "tx_real"), timeout=5,
+        )
+    assert updated
+
+    storage.close()
+    assert _stored(storage.audit, "SELECT onchain_tx FROM naughty_wallets WHERE wallet = 'addr_c'")[0][0] == "tx_real"
+
+def test_flushing_inside_a_write_batch_is_refused(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "wb.db"), migrations=[["CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)"]])
+    buffer = pool.write_behind("kv", ("k", "v"), ("k",), batch_size=1000, interval=60)
+    buffer.put(("k", 1))
+
+    async def flush_in_job():
+        return await pool.write(buffer.flush)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(flush_in_job())
+    assert buffer.get(("k",)) == {"k": "k", "v": 1}
+    pool.close()
+
+def test_pending_mpm_rows_count_for_top_mpm_without_a_flush():
+    upsert_mpm({"policyId": "hot", "tokenSymbol": "HOT", "windowMinutes": 5, "mpm": 1e9,
+                "sentiment": "bullish", "sampleSize": 1})
+    upsert_mpm({"policyId": "warm", "tokenSymbol": "WRM", "windowMinutes": 5, "mpm": 5e8,
+                "sentiment": "bullish", "sampleSize": 1})
+    mpm_db.pending.flush()
+    # A buffered rewrite pushes "warm" past "hot" before it is stored
+    upsert_mpm({"policyId": "warm", "tokenSymbol": "WRM", "windowMinutes": 5, "mpm": 2e9,
+                "sentiment": "bullish", "sampleSize": 1})
+    with patch.object(mpm_db.pending, "flush") as flush:
+        assert fetch_top_mpm(2) == [("warm", 2e9), ("hot", 1e9)]
+    flush.assert_not_called()
+    assert mpm_db.pending.pending == 1
@@ -0,0 +1,81 @@
+import re
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from packages.backend.src.telemetry import Registry, endpoint_template
+
+def _sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.histogram("demo_seconds", "demo", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        hist.labels("/x").observe(value)
+    text = registry.render()
+
+    assert "# TYPE demo_seconds histogram" in text
+    assert _sample(text, 'demo_seconds_bucket{route="/x",le="0.1"}') == 1
+    assert _sample(text, 'demo_seconds_bucket{route="/x",le="1"}') == 3
+    assert _sample(text, 'demo_seconds_bucket{route="/x",le="+Inf"}') == 4
+    assert _sample(text, 'demo_seconds_count{route="/x"}') == 4
+    assert _sample(text, 'demo_seconds_sum{route="/x"}') == 6.05
+
+def test_counter_is_safe_across_threads():
+    registry = Registry()
+    counter = registry.counter("demo_events", "demo", ("kind",))
+
+    def work():
+        child = counter.labels("a")
+        for _ in range(10_000):
+            child.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _sample(registry.render(), 'demo_events_total{kind="a"}') == 80_000
+
+def test_endpoint_template_hides_ids():
+    policy = "a" * 56
+    assert endpoint_template(f"/api/v0/scripts/{policy}/json") == "/api/v0/scripts/{id}/json"
+    assert endpoint_template("/addresses/addr_test1qz2fxv2umyhttkxyxp8x0dlpdt3k6cwng5pxj3jhsydzer3jcu5d8ps7zex2k2xt3uqxgjqnnj83ws8lhrn648jjxtwq2ytjqp/transactions") \
+        == "/addresses/{id}/transactions"
+    assert endpoint_template("/health") == "/health"
+
+def test_metrics_route_exposes_route_latency_and_cache_tiers():
+    from fastapi.testclient import TestClient
+    from packages.backend.src.main import app
+
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', None):
+        with TestClient(app) as client:
+            for _ in range(3):
+                assert client.get("/xray/metrics_policy").status_code == 200
+            resp = client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    text = resp.text
+    # Labelled by route template, not by the policy id in the path
+    assert _sample(text, 'nexguard_http_request_seconds_count{method="GET",route="/xray/{policy_id}",status="200"}') >= 3
+    assert "metrics_policy" not in text
+    assert _sample(text, 'nexguard_cache_lookups_total{engine="xray",tier="sqlite",result="miss"}') >= 3
+    assert re.search(r'^nexguard_blockfrost_breaker_state 0$', text, re.M)
+    assert 'nexguard_memory_cache_entries{cache="xray"}' in text
+    assert 'nexguard_sqlite_seconds_count{db="bundles",mode="read"}' in text
+
+@pytest.mark.asyncio
+async def test_flights_gauge_counts_running_analyses_by_engine():
+    from packages.backend.src.xray_engine import flights, _flight_counts
+    release = asyncio.Event()
+    assert flights.start(("bundle", "gauge_policy"), release.wait)
+    assert _flight_counts() == {("bundle",): 1}
+    release.set()
+    while flights.in_flight(("bundle", "gauge_policy")):
+        await asyncio.sleep(0)
+    assert _flight_counts() == {}
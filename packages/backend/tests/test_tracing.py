@@ -0,0 +1,81 @@
+import json
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from packages.backend.src import tracing
+from packages.backend.src.main import app
+
+POLICY = "ab" * 28
+
+def _blockfrost(request):
+    path = request.url.path
+    if path.endswith("/addresses"):
+        return httpx.Response(200, json=[{"address": f"addr_{i}", "quantity": "10"} for i in range(4)])
+    if path.endswith("/transactions"):
+        return httpx.Response(200, json=[{"tx_hash": "tx_gen"}])
+    if path.endswith("/utxos"):
+        return httpx.Response(200, json={"inputs": [{"address": "master_addr"}]})
+    return httpx.Response(404)
+
+def _names(node):
+    yield node["name"]
+    for child in node.get("children", []):
+        yield from _names(child)
+
+def test_debug_flag_returns_span_tree_and_server_timing():
+    client_under_test = httpx.AsyncClient(transport=httpx.MockTransport(_blockfrost))
+    with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"), \
+         patch("packages.backend.src.insider_engine.get_client", return_value=client_under_test):
+        with TestClient(app) as client:
+            plain = client.get(f"/analyze/bundle/{POLICY}")
+            # Off unless TRACE_DEBUG_PARAM=1
+            refused = client.get(f"/analyze/bundle/{POLICY}?trace=1")
+            with patch.object(tracing, "TRACE_DEBUG_PARAM", True):
+                traced = client.get(f"/analyze/bundle/{POLICY}?trace=1")
+
+    for resp in (plain, refused):
+        assert "_trace" not in resp.json()
+        assert "server-timing" not in resp.headers
+
+    body = traced.json()
+    root = body["_trace"]
+    assert root["name"] == "GET /analyze/bundle/{policy_id}"
+    # Second request is served from the cache the first one filled
+    analysis = root["children"][0]
+    assert analysis["name"] == "analyze_bundle" and analysis["attributes"]["cache"] == "hit"
+    assert "bundle.cache_read" in set(_names(root))
+    assert "analyze_bundle;dur=" in traced.headers["server-timing"]
+
+def test_uncached_analysis_spans_cover_each_stage():
+    client_under_test = httpx.AsyncClient(transport=httpx.MockTransport(_blockfrost))
+    with patch("packages.backend.src.insider_engine.BLOCKFROST_PROJECT_ID", "fake_key"), \
+         patch("packages.backend.src.insider_engine.get_client", return_value=client_under_test):
+        with TestClient(app) as client, patch.object(tracing, "TRACE_DEBUG_PARAM", True):
+            root = client.get(f"/analyze/bundle/{'cd' * 28}?trace=1").json()["_trace"]
+
+    names = list(_names(root))
+    for stage in ("bundle.cache_read", "bundle.trace_funders", "bundle.score_graph",
+                  "sqlite.fetch_snapshot", "sqlite.upsert_bundle", "blockfrost.get"):
+        assert stage in names
+    # Holders and supply calls + 2 calls per holder
+    assert names.count("blockfrost.get") == 10
+
+def test_traces_export_as_otlp_json(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.FileExporter(str(path))
+    with patch("packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID", None), \
+         patch.object(tracing, "exporter", exporter):
+        with TestClient(app) as client:
+            client.get("/xray/otlp_policy")
+    exporter.close()
+
+    request = json.loads(path.read_text().splitlines()[0])
+    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_id = {s["spanId"]: s for s in spans}
+    root = next(s for s in spans if "parentSpanId" not in s)
+    assert root["name"] == "GET /xray/{policy_id}" and root["kind"] == tracing.SERVER
+    policy_span = next(s for s in spans if s["name"] == "analyze_policy")
+    assert by_id[policy_span["parentSpanId"]] is root
+    assert {"key": "policy_id", "value": {"stringValue": "otlp_policy"}} in policy_span["attributes"]
+    assert len({s["traceId"] for s in spans}) == 1
+    assert all(int(s["endTimeUnixNano"]) >= int(s["startTimeUnixNano"]) for s in spans)
@@ -0,0 +1,58 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from packages.backend.src.blockfrost_client import scheduler
+from packages.backend.src.bundle_db_sqlite import CACHE_TTL
+from packages.backend.src.warmup import WarmupScheduler, XRAY, BUNDLE
+
+@pytest.mark.asyncio
+async def test_queue_ranks_by_request_heat_and_mpm():
+    warm = WarmupScheduler(top_n=3)
+    for _ in range(3):
+        warm.record(XRAY, "policy_hot")
+    warm.record(XRAY, "policy_warm")
+    warm.record(BUNDLE, "policy_cold")
+
+    with patch("packages.backend.src.warmup.fetch_top_mpm", return_value=[("policy_trending", 10.0)]):
+        queue = await warm.queue()
+
+    # mpm 10 * weight 0.5 = 5 for both engines, ahead of 3 requests
+    assert {(engine, policy_id) for _, engine, policy_id in queue[:2]} == {
+        (BUNDLE, "policy_trending"), (XRAY, "policy_trending"),
+    }
+    assert queue[2][1:] == (XRAY, "policy_hot")
+
+@pytest.mark.asyncio
+async def test_run_once_refreshes_aging_entries_within_budget():
+    warm = WarmupScheduler(calls_per_minute=5, top_n=10)
+    now = datetime.utcnow()
+    ages = {
+        "policy_missing": None,
+        "policy_aging": now - CACHE_TTL * 0.9,
+        "policy_fresh": now - timedelta(minutes=5),
+        "policy_over_budget": None,
+    }
+    for heat, policy_id in enumerate(ages):
+        for _ in range(10 - heat):
+            warm.record(XRAY, policy_id)
+
+    refreshed = []
+
+    async def refresh(policy_id):
+        refreshed.append(policy_id)
+        scheduler.calls += 3  # what the analysis would have spent
+
+    async def cached_at(policy_id):
+        return ages.get(policy_id)
+
+    warm.cached_at = {XRAY: cached_at}
+    warm.refreshers = {XRAY: refresh}
+    with patch("packages.backend.src.warmup.fetch_top_mpm", return_value=[]), \
+         patch("packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID", "fake_key"):
+        count = await warm.run_once()
+
+    # Fresh entry skipped; budget of 5 calls covers two 3-call refreshes
+    assert refreshed == ["policy_missing", "policy_aging"]
+    assert count == 2
+    assert warm.skipped_budget == 1
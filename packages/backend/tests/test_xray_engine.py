@@ -1,7 +1,11 @@
 import pytest
 import asyncio
+import json
 from unittest.mock import patch, MagicMock
-from packages.backend.src.xray_engine import analyze_policy, metrics
+from packages.backend.src.xray_engine import (
+    analyze_policy, analyze_policies, cache_result, cache_results, get_cached_results, get_cached_result,
+    metrics, xray_cache, rescore_catalogue, SCORING_VERSION,
+)
 
 @pytest.mark.asyncio
 async def test_analyze_policy_fallback():
@@ -37,19 +41,13 @@ async def test_analyze_policy_cache_hit():
 
 @pytest.mark.asyncio
 async def test_analyze_policy_timeout():
-    # Mock fetch_blockfrost to raise TimeoutError
-    
-    async def mock_fetch_timeout(*args, **kwargs):
-        # Simulate delay longer than timeout (though we mock the wait_for usually)
-        # Here we just raise the error directly to simulate what wait_for would do
-        raise asyncio.TimeoutError()
-    
+    # Blockfrost hangs past the timeout: the real wait_for cancels the fetch
+    async def mock_fetch_hangs(*args, **kwargs):
+        await asyncio.sleep(10)
+
     with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', "mock_key"):
-        # We need to patch asyncio.wait_for to raise TimeoutError, OR patch fetch_blockfrost and let wait_for handle it.
-        # Since we use asyncio.wait_for(fetch_blockfrost(...)), if fetch_blockfrost hangs, wait_for raises.
-        # To test the exception handling in analyze_policy, we can just mock wait_for to raise TimeoutError.
-        
-        with patch('asyncio.wait_for', side_effect=asyncio.TimeoutError):
+        with patch('packages.backend.src.xray_engine.fetch_blockfrost', side_effect=mock_fetch_hangs), \
+             patch('packages.backend.src.xray_engine.TIMEOUT_SECONDS', 0.01):
              with patch('packages.backend.src.xray_engine.get_cached_result', return_value=None):
                  result = await analyze_policy("test_policy")
                  assert result["type"] == "Error"
@@ -70,3 +68,184 @@ async def test_analyze_policy_plutus():
                     result = await analyze_policy("test_policy")
                     assert result["type"] == "Plutus Smart Contract"
                     assert result["risk_level"] == "HIGH"
+
+@pytest.mark.asyncio
+async def test_analyze_policy_coalesces_concurrent_misses():
+    calls = []
+
+    async def mock_fetch(endpoint):
+        calls.append(endpoint)
+        await asyncio.sleep(0.01)
+        return {"type": "plutusV2", "script_hash": "hot_policy"}
+
+    metrics.coalesced_hits = 0
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', "mock_key"):
+        with patch('packages.backend.src.xray_engine.fetch_blockfrost', side_effect=mock_fetch):
+            with patch('packages.backend.src.xray_engine.get_cached_result', return_value=None):
+                with patch('packages.backend.src.xray_engine.cache_result') as cache:
+                    results = await asyncio.gather(*(analyze_policy("hot_policy") for _ in range(8)))
+
+    assert calls == ["/scripts/hot_policy"]
+    assert cache.call_count == 1
+    assert all(r["type"] == "Plutus Smart Contract" for r in results)
+    assert metrics.coalesced_hits == 7
+
+@pytest.mark.asyncio
+async def test_analyze_policies_matches_single_path_and_batches_cache():
+    scripts = {
+        "/scripts/batch_plutus": {"type": "plutusV2", "script_hash": "batch_plutus"},
+        "/scripts/batch_native": None,
+    }
+
+    async def mock_fetch(endpoint):
+        return scripts[endpoint]
+
+    await cache_result("batch_cached", {
+        "policy_id": "batch_cached", "type": "Native Asset", "risk_level": "LOW", "scoring_version": SCORING_VERSION,
+    })
+    xray_cache.clear()  # force the SQLite IN (...) path
+
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', "mock_key"):
+        with patch('packages.backend.src.xray_engine.fetch_blockfrost', side_effect=mock_fetch):
+            with patch('packages.backend.src.xray_engine.cache_results', wraps=cache_results) as bulk_write:
+                batch = [r async for r in analyze_policies(
+                    ["batch_cached", "batch_plutus", "batch_native", "batch_plutus"])]
+            xray_cache.clear()
+            with patch('packages.backend.src.xray_engine.get_cached_result', return_value=None):
+                with patch('packages.backend.src.xray_engine.cache_result'):
+                    single = {p: await analyze_policy(p) for p in ("batch_plutus", "batch_native")}
+
+    by_id = {r["policy_id"]: r for r in batch}
+    assert len(batch) == 3
+    assert batch[0]["policy_id"] == "batch_cached" and batch[0]["cached"] is True
+
+    def strip(r):
+        return {k: v for k, v in r.items() if k != "timestamp"}
+    for policy_id, result in single.items():
+        assert strip(by_id[policy_id]) == strip(result)
+
+    # Both misses written back in one call, and now served from cache
+    bulk_write.assert_called_once()
+    assert {r["policy_id"] for r in bulk_write.call_args.args[0]} == {"batch_plutus", "batch_native"}
+    assert set(await get_cached_results(["batch_plutus", "batch_native"])) == {"batch_plutus", "batch_native"}
+
+def test_xray_batch_route_streams_ndjson():
+    from fastapi.testclient import TestClient
+    from packages.backend.src.main import app
+
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', None):
+        with TestClient(app) as client:
+            resp = client.post("/xray/batch", json={"policy_ids": ["route_a", "route_b"]})
+            assert resp.status_code == 200
+            assert resp.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in resp.text.splitlines()]
+            assert [l["policy_id"] for l in lines] == ["route_a", "route_b"]
+
+            assert client.post("/xray/batch", json={"policy_ids": []}).status_code == 400
+
+@pytest.mark.asyncio
+async def test_script_metadata_is_cached_permanently_and_rescored_offline():
+    calls = []
+
+    async def mock_fetch(endpoint):
+        calls.append(endpoint)
+        if endpoint.endswith("/json"):
+            return {"type": "all", "scripts": []}
+        return {"type": "timelock", "script_hash": "script_policy"}
+
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', "mock_key"):
+        with patch('packages.backend.src.xray_engine.fetch_blockfrost', side_effect=mock_fetch):
+            first = await analyze_policy("script_policy")
+            assert calls == ["/scripts/script_policy", "/scripts/script_policy/json"]
+            assert first["type"] == "Multi-Sig Script"
+
+            # Scoring rules change: cached results are stale, script metadata is not
+            with patch('packages.backend.src.xray_engine.SCORING_VERSION', SCORING_VERSION + 1):
+                xray_cache.clear()
+                assert await get_cached_result("script_policy") is None
+                rescored = await analyze_policy("script_policy")
+                assert rescored["scoring_version"] == SCORING_VERSION + 1
+
+                assert rescore_catalogue() == 1
+                assert (await get_cached_result("script_policy"))["type"] == "Multi-Sig Script"
+
+    # Neither the re-analysis nor the catalogue re-score touched Blockfrost
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_stale_result_is_served_while_one_refresh_runs():
+    import datetime
+    from packages.backend.src.bundle_db_sqlite import pool, UPSERT_XRAY_SQL
+    from packages.backend.src.xray_engine import flights
+
+    old = {"policy_id": "swr_policy", "type": "Native Script", "risk_level": "LOW", "scoring_version": SCORING_VERSION}
+    written = (datetime.datetime.utcnow() - datetime.timedelta(hours=30)).isoformat()
+    with pool.writer() as conn:
+        conn.execute(UPSERT_XRAY_SQL, ("swr_policy", json.dumps(old), written))
+    calls = []
+
+    async def mock_fetch(endpoint):
+        calls.append(endpoint)
+        await asyncio.sleep(0.01)
+        return {"type": "plutusV2", "script_hash": "swr_policy"}
+
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', "mock_key"):
+        with patch('packages.backend.src.xray_engine.fetch_blockfrost', side_effect=mock_fetch):
+            served = await asyncio.gather(*(analyze_policy("swr_policy") for _ in range(3)))
+            assert all(r["stale"] and r["type"] == "Native Script" for r in served)
+            while flights.in_flight(("xray", "swr_policy")):
+                await asyncio.sleep(0.005)
+            refreshed = await analyze_policy("swr_policy")
+
+    assert calls == ["/scripts/swr_policy"]
+    assert "stale" not in refreshed
+    assert refreshed["type"] == "Plutus Smart Contract"
+
+@pytest.mark.asyncio
+async def test_open_breaker_serves_last_known_result_without_calling_blockfrost():
+    import datetime
+    from packages.backend.src.bundle_db_sqlite import pool, UPSERT_XRAY_SQL
+    from packages.backend.src.blockfrost_client import CircuitBreaker
+
+    old = {"policy_id": "cb_policy", "type": "Native Script", "risk_level": "LOW", "scoring_version": SCORING_VERSION}
+    # Past both the fresh and the max-stale window
+    written = (datetime.datetime.utcnow() - datetime.timedelta(days=5)).isoformat()
+    with pool.writer() as conn:
+        conn.execute(UPSERT_XRAY_SQL, ("cb_policy", json.dumps(old), written))
+    breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+    breaker.record_failure()
+
+    async def mock_fetch(endpoint):
+        raise AssertionError("Blockfrost must not be called while the circuit is open")
+
+    with patch('packages.backend.src.xray_engine.BLOCKFROST_PROJECT_ID', "mock_key"), \
+         patch('packages.backend.src.xray_engine.breaker', breaker), \
+         patch('packages.backend.src.xray_engine.fetch_blockfrost', side_effect=mock_fetch):
+        served = await analyze_policy("cb_policy")
+        unknown = [r async for r in analyze_policies(["never_seen"])]
+
+    assert served["type"] == "Native Script" and served["stale"] and served["degraded"]
+    assert unknown[0]["type"] == "Unknown" and unknown[0]["degraded"]
+
+@pytest.mark.asyncio
+async def test_rescore_command_covers_native_assets_and_keeps_their_age():
+    import datetime
+    from packages.backend.src import rescore
+    from packages.backend.src.bundle_db_sqlite import pool, upsert_script, UPSERT_SCRIPT_SQL
+
+    upsert_script("timelock_policy", {"type": "timelock"}, {"type": "sig"})
+    checked = (datetime.datetime.utcnow() - datetime.timedelta(hours=30)).isoformat()
+    with pool.writer() as conn:
+        conn.execute(UPSERT_SCRIPT_SQL, ("native_policy", None, None, checked))
+
+    with patch('packages.backend.src.xray_engine.SCORING_VERSION', SCORING_VERSION + 1), \
+         patch('packages.backend.src.xray_engine.fetch_blockfrost') as fetch:
+        xray_cache.clear()
+        assert rescore.main() == 2
+        timelock = await get_cached_result("timelock_policy")
+        native = await get_cached_result("native_policy")
+    fetch.assert_not_called()
+
+    assert timelock["type"] == "Native Timelock Script" and not timelock.get("stale")
+    # Served as stale (so refreshed) from the age of the 404 it was derived from
+    assert native["type"] == "Native Asset" and native["stale"]